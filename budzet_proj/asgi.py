@@ -0,0 +1,19 @@
+"""
+ASGI config for budzet_proj project.
+
+It exposes the ASGI callable as a module-level variable named ``application``,
+run it with an ASGI server, e.g. ``uvicorn budzet_proj.asgi:application``.
+
+Django 1.11 has no async views, the WSGI application runs in asgiref's thread
+pool and slow exports, reports and imports are moved off the request threads
+by wydatki.tasks.
+"""
+
+import os
+
+from asgiref.wsgi import WsgiToAsgi
+from django.core.wsgi import get_wsgi_application
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "budzet_proj.settings")
+
+application = WsgiToAsgi(get_wsgi_application())
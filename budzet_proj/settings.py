@@ -27,6 +27,9 @@ DEBUG = True
 
 ALLOWED_HOSTS = []
 
+# Addresses allowed to scrape /metrics/ and to request profiles without logging in as staff.
+INTERNAL_IPS = ['127.0.0.1', '::1']
+
 
 # Application definition
 
@@ -48,6 +51,7 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'wydatki.middleware.InstrumentationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -93,6 +97,114 @@ DATABASES = {
 ##     }
 ## }
 
+# Cache
+# https://docs.djangoproject.com/en/1.11/topics/cache/
+#
+# BUDZET_CACHE=file uses a file-based cache in BASE_DIR/cache, BUDZET_CACHE=redis://host:port/db
+# uses django-redis (pip install django-redis, bound it with maxmemory-policy allkeys-lru),
+# the default is a per-process LRU memory cache.
+
+BUDZET_CACHE = os.environ.get('BUDZET_CACHE', '')
+
+if BUDZET_CACHE == 'file':
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.path.join(BASE_DIR, 'cache'),
+            'OPTIONS': {'MAX_ENTRIES': 10000},
+        }
+    }
+elif BUDZET_CACHE.startswith('redis://'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django_redis.cache.RedisCache',
+            'LOCATION': BUDZET_CACHE,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'wydatki.cache_backends.LRULocMemCache',
+            'LOCATION': 'budzet',
+            'OPTIONS': {'MAX_ENTRIES': 10000, 'CULL_FREQUENCY': 10},
+        }
+    }
+
+# Reminders are mailed by `manage.py run_reminders`, BUDZET_EMAIL_BACKEND picks where they go
+# (e.g. django.core.mail.backends.smtp.EmailBackend), the default prints them to the console.
+# Addresses the server refuses mark the reminder failed. When the worker dies mid-batch, the
+# reminders it already sent are mailed again, so one may arrive twice.
+
+EMAIL_BACKEND = os.environ.get('BUDZET_EMAIL_BACKEND', 'django.core.mail.backends.console.EmailBackend')
+
+EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_mail')
+
+DEFAULT_FROM_EMAIL = 'budzet@localhost'
+
+# Request instrumentation, see wydatki.middleware. Per view timings are served at /metrics/,
+# BUDZET_SERVER_TIMING=1 adds a Server-Timing header to every response and requests sent with
+# "X-Profile: 1" are profiled into WYDATKI_PROFILE_DIR (open the dumps with pstats or snakeviz).
+
+WYDATKI_SERVER_TIMING = os.environ.get('BUDZET_SERVER_TIMING') == '1'
+
+WYDATKI_SLOW_REQUEST = 1.0
+
+WYDATKI_PROFILE_DIR = os.path.join(BASE_DIR, 'profiles')
+
+WYDATKI_PROFILE_SAMPLE_RATE = float(os.environ.get('BUDZET_PROFILE_SAMPLE_RATE', '1.0'))
+
+# Exports, reports and imports run on a bounded pool of WYDATKI_TASK_WORKERS threads per process,
+# see wydatki.tasks. A request waits WYDATKI_TASK_WAIT seconds for its task, then the browser polls
+# its progress; above WYDATKI_TASK_QUEUE running and waiting tasks new ones are refused with 503.
+# Task state lives in the Job table, result files in WYDATKI_TASK_DIR, which has to be shared by
+# the worker processes.
+# The task threads share the GIL with the request threads, `manage.py loadtest` shows the effect
+# of more than one on the CRUD pages.
+
+WYDATKI_TASK_WORKERS = int(os.environ.get('BUDZET_TASK_WORKERS', '1'))
+
+WYDATKI_TASK_QUEUE = int(os.environ.get('BUDZET_TASK_QUEUE', '10'))
+
+WYDATKI_TASK_WAIT = 2.0
+
+WYDATKI_TASK_DIR = os.path.join(BASE_DIR, 'task_files')
+
+# Jobs queued in the database (wydatki.jobs, e.g. deleting an account or a category) are run by
+# `manage.py run_jobs`. Each owner runs at most WYDATKI_JOB_PER_OWNER jobs at a time, a failed job
+# is retried after WYDATKI_JOB_RETRY_DELAY seconds, doubled on every attempt, and a running job that
+# reported no progress for WYDATKI_JOB_TIMEOUT seconds is taken over by another worker.
+
+WYDATKI_JOB_PER_OWNER = 1
+
+WYDATKI_JOB_RETRY_DELAY = 60
+
+WYDATKI_JOB_TIMEOUT = 600
+
+# Logging
+# https://docs.djangoproject.com/en/1.11/topics/logging/
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'default': {
+            'format': '%(asctime)s %(levelname)s %(name)s: %(message)s',
+        },
+    },
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+            'formatter': 'default',
+        },
+    },
+    'loggers': {
+        'wydatki': {
+            'handlers': ['console'],
+            'level': os.environ.get('BUDZET_LOG_LEVEL', 'INFO'),
+        },
+    },
+}
+
 # Password validation
 # https://docs.djangoproject.com/en/1.11/ref/settings/#auth-password-validators
 
@@ -113,9 +225,12 @@ AUTH_PASSWORD_VALIDATORS = [
 
 AUTHENTICATION_BACKENDS = (
     'django.contrib.auth.backends.ModelBackend', # this is default
-    'guardian.backends.ObjectPermissionBackend',
+    'wydatki.backends.OwnerPermissionBackend',
 )
 
+# Object permissions are granted by ownership, guardian's backend is not used.
+SILENCED_SYSTEM_CHECKS = ['guardian.W001']
+
 
 # Internationalization
 # https://docs.djangoproject.com/en/1.11/topics/i18n/
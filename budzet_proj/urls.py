@@ -18,11 +18,15 @@ from django.conf.urls.static import static
 
 from django.conf.urls import url, include
 from django.contrib import admin
+from wydatki.admin import cache_stats
+from wydatki.metrics import metrics_view
 from wydatki.views import UserDetailView, UserCreateView, ProfileDeleteView
 
 
 urlpatterns = [
+    url(r'^admin/cache/$', admin.site.admin_view(cache_stats), name='cache-stats'),
     url(r'^admin/', admin.site.urls),
+    url(r'^metrics/$', metrics_view, name='metrics'),
     url(r'^user/(?P<pk>[\d]+)/', UserDetailView.as_view(), name='user-detail'),
     url(r'^register/', UserCreateView.as_view(), name='user-add'),
     url(r'^delete/(?P<pk>[\d]+)/', ProfileDeleteView.as_view(), name='user-delete'),
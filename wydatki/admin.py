@@ -1,5 +1,9 @@
+from django.conf import settings
 from django.contrib import admin
-from .models import Category, Reminder, IncomeSource, Income, Pocket, Place, Expense
+from django.shortcuts import render
+
+from .cache import stats
+from .models import Category, Reminder, IncomeSource, Income, Pocket, Place, Expense, RecurringExpense, Job
 
 admin.site.register(Category)
 admin.site.register(Reminder)
@@ -8,3 +12,19 @@ admin.site.register(Income)
 admin.site.register(Pocket)
 admin.site.register(Place)
 admin.site.register(Expense)
+admin.site.register(RecurringExpense)
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'kind', 'owner', 'status', 'attempts', 'progress', 'total', 'created', 'finished')
+    list_filter = ('status', 'kind')
+
+
+def cache_stats(request):
+    return render(request, 'admin/cache_stats.html', dict(
+        admin.site.each_context(request),
+        title='Cache',
+        stats=stats(),
+        backend=settings.CACHES['default']['BACKEND'],
+    ))
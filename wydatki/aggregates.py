@@ -0,0 +1,107 @@
+from django.db import transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncMonth
+
+from wydatki.models import Expense, Income, Pocket, ExpenseTotal, IncomeTotal, PocketSpend
+
+
+def expense_totals_queryset(owner, group_by='category', date_from=None, date_to=None, pocket=None):
+    expenses = Expense.objects.filter(owner=owner)
+    if date_from is not None:
+        expenses = expenses.filter(exp_date__gte=date_from)
+    if date_to is not None:
+        expenses = expenses.filter(exp_date__lte=date_to)
+    if pocket is not None:
+        expenses = expenses.filter(pocket=pocket)
+    return expenses.order_by().values(group_by).annotate(total=Sum('base_price'))
+
+
+def expense_totals(owner, group_by='category', date_from=None, date_to=None, pocket=None):
+    if group_by in ('category', 'pocket') and date_from is None and date_to is None:
+        rows = ExpenseTotal.objects.filter(owner=owner, count__gt=0)
+        if pocket is not None:
+            rows = rows.filter(pocket=pocket)
+        rows = rows.order_by().values(group_by).annotate(total=Sum('total'))
+    else:
+        rows = expense_totals_queryset(owner, group_by, date_from, date_to, pocket)
+    return {row[group_by]: row['total'] for row in rows}
+
+
+def expense_sum(owner):
+    return ExpenseTotal.objects.filter(owner=owner).aggregate(sum=Sum('total'))['sum']
+
+
+def income_sum(owner):
+    return IncomeTotal.objects.filter(owner=owner).aggregate(sum=Sum('total'))['sum']
+
+
+def expense_count(owner):
+    return ExpenseTotal.objects.filter(owner=owner).aggregate(count=Sum('count'))['count'] or 0
+
+
+def income_count(owner):
+    return IncomeTotal.objects.filter(owner=owner).aggregate(count=Sum('count'))['count'] or 0
+
+
+def _monthly_rows(queryset, date_field, value_field, keys):
+    return queryset.order_by().annotate(month=TruncMonth(date_field)).values(*keys + ('month',)).annotate(
+        total=Sum(value_field), rows=Count('id'))
+
+
+def rebuild_totals(owner=None, owners=None):
+    """Rebuilds the running totals of ``owner``, of the ``owners`` ids or, without either, of everyone."""
+    expenses, incomes = Expense.objects.all(), Income.objects.all()
+    expense_totals, income_totals = ExpenseTotal.objects.all(), IncomeTotal.objects.all()
+    if owner is not None:
+        expenses, incomes = expenses.filter(owner=owner), incomes.filter(owner=owner)
+        expense_totals, income_totals = expense_totals.filter(owner=owner), income_totals.filter(owner=owner)
+    if owners is not None:
+        expenses, incomes = expenses.filter(owner__in=owners), incomes.filter(owner__in=owners)
+        expense_totals, income_totals = expense_totals.filter(owner__in=owners), income_totals.filter(owner__in=owners)
+
+    with transaction.atomic():
+        expense_totals.delete()
+        income_totals.delete()
+        created_expense_totals = ExpenseTotal.objects.bulk_create([
+            ExpenseTotal(owner_id=row['owner'], pocket_id=row['pocket'], category_id=row['category'],
+                         month=row['month'], total=row['total'], count=row['rows'])
+            for row in _monthly_rows(expenses, 'exp_date', 'base_price', ('owner', 'pocket', 'category'))
+        ], batch_size=500)
+        created_income_totals = IncomeTotal.objects.bulk_create([
+            IncomeTotal(owner_id=row['owner'], source_id=row['source'], month=row['month'],
+                        total=row['total'], count=row['rows'])
+            for row in _monthly_rows(incomes, 'income_date', 'base_amount', ('owner', 'source'))
+        ], batch_size=500)
+    return len(created_expense_totals), len(created_income_totals)
+
+
+def rebuild_pocket_spends(owner=None):
+    expenses, spends = Expense.objects.all(), PocketSpend.objects.all()
+    if owner is not None:
+        expenses, spends = expenses.filter(owner=owner), spends.filter(pocket__owner=owner)
+
+    with transaction.atomic():
+        spends.delete()
+        return len(PocketSpend.objects.bulk_create([
+            PocketSpend(pocket_id=row['pocket'], month=row['month'], total=row['total'], count=row['rows'])
+            for row in _monthly_rows(expenses, 'exp_date', 'price', ('pocket',))
+        ], batch_size=500))
+
+
+def reconcile_pockets(owner=None, fix=False):
+    """Compares each pocket's spent counter with the sum of its expenses, returns the mismatches."""
+    expenses, pockets = Expense.objects.all(), Pocket.objects.all()
+    if owner is not None:
+        expenses, pockets = expenses.filter(owner=owner), pockets.filter(owner=owner)
+    sums = dict(expenses.order_by().values_list('pocket').annotate(Sum('price')))
+
+    mismatches = []
+    for pk, name, spent in pockets.order_by('pk').values_list('pk', 'name', 'spent').iterator():
+        actual = sums.get(pk) or 0
+        if spent != actual:
+            mismatches.append((pk, name, spent, actual))
+    if fix:
+        with transaction.atomic():
+            for pk, name, spent, actual in mismatches:
+                Pocket.objects.filter(pk=pk).update(funds=F('funds') - (actual - spent), spent=actual)
+    return mismatches
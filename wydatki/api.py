@@ -0,0 +1,232 @@
+import base64
+import binascii
+import hashlib
+import json
+from collections import OrderedDict
+from datetime import date
+
+from django.contrib.auth import authenticate
+from django.db import transaction
+from django.forms.models import modelform_factory, model_to_dict
+from django.http import Http404, JsonResponse
+from django.middleware.csrf import CsrfViewMiddleware
+from django.utils.decorators import method_decorator
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import condition
+from django.views.generic.base import View
+
+from wydatki.cache import data_version
+from wydatki.forms import check_rate
+from wydatki.models import Expense, Income, Category, Pocket, Place, Reminder, IncomeSource
+from wydatki.pagination import KeysetPaginator, InvalidCursor
+from wydatki.signals import bulk_create
+
+
+class Resource(object):
+
+    def __init__(self, model, fields, writable=None, ordering=('id',)):
+        self.model = model
+        self.fields = ('id',) + fields
+        self.writable = writable or fields
+        self.ordering = ordering
+
+    def get_form_class(self, owner):
+        form_class = modelform_factory(self.model, fields=self.writable)
+
+        class OwnerForm(form_class):
+            def __init__(self, *args, **kwargs):
+                super(OwnerForm, self).__init__(*args, **kwargs)
+                # Related objects must belong to the same owner.
+                for field in self.fields.values():
+                    queryset = getattr(field, 'queryset', None)
+                    if queryset is not None and hasattr(queryset.model, 'owner'):
+                        field.queryset = queryset.filter(owner=owner)
+
+            def clean(self):
+                cleaned_data = super(OwnerForm, self).clean()
+                # Expenses are in the currency of their pocket, both need a rate for the day, pockets for today.
+                currency = cleaned_data.get('currency') or getattr(cleaned_data.get('pocket'), 'currency', None)
+                day = cleaned_data.get('exp_date') or cleaned_data.get('income_date') or date.today()
+                if currency and day:
+                    check_rate(currency, day)
+                return cleaned_data
+
+        return OwnerForm
+
+
+RESOURCES = {
+    'expenses': Resource(Expense, ('name', 'exp_date', 'category', 'price', 'currency', 'base_price', 'pocket', 'place'),
+                         writable=('name', 'exp_date', 'category', 'price', 'pocket', 'place'),
+                         ordering=('exp_date', 'id')),
+    'incomes': Resource(Income, ('name', 'source', 'amount', 'currency', 'base_amount', 'income_date'),
+                        writable=('name', 'source', 'amount', 'currency', 'income_date'),
+                        ordering=('income_date', 'id')),
+    'categories': Resource(Category, ('name',)),
+    'pockets': Resource(Pocket, ('name', 'currency', 'limit', 'funds', 'spent'),
+                        writable=('name', 'currency', 'limit', 'funds')),
+    'places': Resource(Place, ('name',)),
+    'reminders': Resource(Reminder, ('name', 'remind_date', 'as_before', 'message', 'importance', 'status', 'sent_at'),
+                          writable=('name', 'remind_date', 'as_before', 'message', 'importance'),
+                          ordering=('remind_date', 'id')),
+    'incomesources': Resource(IncomeSource, ('name', 'type_of_income', 'permanent', 'amount', 'currency', 'frequency',
+                                             'interval', 'starts_on', 'ends_on')),
+}
+
+
+def api_etag(request, *args, **kwargs):
+    # Any write by the owner bumps the data version, so unchanged data answers If-None-Match with a 304.
+    version = data_version(request.user.pk)
+    return hashlib.md5(('%s:%s' % (version, request.get_full_path())).encode()).hexdigest()
+
+
+def basic_auth_user(request):
+    try:
+        method, credentials = request.META['HTTP_AUTHORIZATION'].split(' ', 1)
+        username, password = base64.b64decode(credentials).decode().split(':', 1)
+    except (KeyError, ValueError, binascii.Error, UnicodeDecodeError):
+        return None
+    if method.lower() != 'basic':
+        return None
+    return authenticate(request, username=username, password=password)
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class ApiView(View):
+    """JSON access to the owner's objects, authenticated with the session or HTTP Basic auth."""
+    page_size = 100
+    max_page_size = 1000
+
+    def dispatch(self, request, *args, **kwargs):
+        if 'HTTP_AUTHORIZATION' in request.META:
+            user = basic_auth_user(request)
+            if user is None:
+                return self.error('Invalid credentials', 401)
+            request.user = user
+        elif not request.user.is_authenticated:
+            return self.error('Authentication required', 401)
+        elif request.method not in ('GET', 'HEAD', 'OPTIONS'):
+            # Session clients carry cookies, so their writes still need the CSRF token.
+            rejected = CsrfViewMiddleware().process_view(request, None, (), {})
+            if rejected:
+                return rejected
+        try:
+            self.resource = RESOURCES[kwargs['resource']]
+        except KeyError:
+            return self.error('Unknown resource', 404)
+        return super(ApiView, self).dispatch(request, *args, **kwargs)
+
+    def error(self, message, status=400, **extra):
+        return JsonResponse(dict(extra, error=message), status=status)
+
+    def get_queryset(self):
+        return self.resource.model.objects.filter(owner=self.request.user)
+
+    def get_fields(self):
+        fields = self.request.GET.get('fields')
+        if not fields:
+            return self.resource.fields
+        fields = tuple(field for field in fields.split(',') if field)
+        unknown = set(fields) - set(self.resource.fields)
+        if unknown:
+            raise ValueError('Unknown fields: %s' % ', '.join(sorted(unknown)))
+        return fields
+
+
+class ApiListView(ApiView):
+
+    @method_decorator(condition(etag_func=api_etag))
+    def get(self, request, resource):
+        try:
+            fields = self.get_fields()
+            limit = min(int(request.GET.get('limit', self.page_size)), self.max_page_size)
+        except ValueError as e:
+            return self.error(str(e))
+        # Ordering columns are read for the cursors and only returned when asked for.
+        columns = fields + tuple(field for field in self.resource.ordering if field not in fields)
+        paginator = KeysetPaginator(self.get_queryset().values(*columns), self.resource.ordering, max(limit, 1))
+        try:
+            page = paginator.page(request.GET.get('cursor'))
+        except InvalidCursor:
+            return self.error('Invalid cursor')
+        return JsonResponse(OrderedDict([
+            ('results', [OrderedDict((field, row[field]) for field in fields) for row in page]),
+            ('next', page.next_cursor),
+            ('previous', page.previous_cursor),
+        ]))
+
+
+class ApiDetailView(ApiView):
+
+    @method_decorator(condition(etag_func=api_etag))
+    def get(self, request, resource, pk):
+        try:
+            fields = self.get_fields()
+        except ValueError as e:
+            return self.error(str(e))
+        row = self.get_queryset().filter(pk=pk).values(*fields).first()
+        if row is None:
+            raise Http404
+        return JsonResponse(OrderedDict((field, row[field]) for field in fields))
+
+
+class ApiBatchView(ApiView):
+    """Creates (objects without "id") and updates (partial objects with "id") up to max_batch rows at once.
+
+    Everything is validated first and written in one transaction, any invalid row rejects the whole batch.
+    """
+    max_batch = 1000
+
+    def post(self, request, resource):
+        try:
+            objects = json.loads(request.body.decode())
+        except ValueError:
+            return self.error('Invalid JSON')
+        if isinstance(objects, dict):
+            objects = objects.get('objects')
+        if not isinstance(objects, list) or not all(isinstance(obj, dict) for obj in objects):
+            return self.error('Expected a list of objects')
+        if len(objects) > self.max_batch:
+            return self.error('At most %d objects per batch' % self.max_batch, 413)
+
+        invalid = {i: {'id': ['Expected an integer']} for i, obj in enumerate(objects)
+                   if obj.get('id') is not None and (not isinstance(obj['id'], int) or isinstance(obj['id'], bool))}
+        if invalid:
+            return self.error('Invalid ids', errors=invalid)
+
+        form_class = self.resource.get_form_class(request.user)
+        existing = self.get_queryset().in_bulk([obj['id'] for obj in objects if obj.get('id') is not None])
+        forms, errors = [], {}
+        for i, obj in enumerate(objects):
+            instance = None
+            if obj.get('id') is not None:
+                instance = existing.get(obj['id'])
+                if instance is None:
+                    errors[i] = {'id': ['Not found']}
+                    continue
+            data = model_to_dict(instance, self.resource.writable) if instance else {}
+            data.update((key, value) for key, value in obj.items() if key in self.resource.writable)
+            form = form_class(data, instance=instance)
+            if form.is_valid():
+                forms.append(form)
+            else:
+                errors[i] = form.errors
+        if errors:
+            return self.error('Invalid objects', errors=errors)
+
+        created, updated = [], []
+        with transaction.atomic():
+            for form in forms:
+                obj = form.save(commit=False)
+                if obj.pk:
+                    obj.save()
+                    updated.append(obj)
+                else:
+                    obj.owner = request.user
+                    created.append(obj)
+            if created:
+                bulk_create(self.resource.model, created)
+        return JsonResponse(OrderedDict([
+            ('created', len(created)),
+            ('updated', len(updated)),
+            ('ids', [obj.pk for obj in created]),
+        ]), status=201 if created else 200)
@@ -3,3 +3,7 @@ from django.apps import AppConfig
 
 class WydatkiConfig(AppConfig):
     name = 'wydatki'
+
+    def ready(self):
+        from . import search  # noqa: connects the search index receivers
+        from . import rates  # noqa: connects the currency conversion receivers
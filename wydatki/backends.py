@@ -0,0 +1,14 @@
+class OwnerPermissionBackend(object):
+    """Grants every permission on a wydatki object to the user who owns it."""
+
+    def authenticate(self, request, **credentials):
+        return None
+
+    def has_perm(self, user_obj, perm, obj=None):
+        if obj is None or not user_obj.is_active:
+            return False
+        app_label, _, codename = perm.partition('.')
+        if app_label != obj._meta.app_label or not codename.endswith('_' + obj._meta.model_name):
+            return False
+        owner_id = getattr(obj, 'owner_id', None)
+        return owner_id is not None and owner_id == user_obj.pk
@@ -0,0 +1,78 @@
+import hashlib
+import time
+
+from django.core.cache import cache, caches
+from django.db import transaction
+
+VERSION_KEY = 'wydatki:version:%s:%s'
+STATS_KEYS = {True: 'wydatki:stats:hits', False: 'wydatki:stats:misses'}
+
+
+def _new_version():
+    # Time based, so a version evicted from the cache is never reused.
+    return int(time.time() * 1000000)
+
+
+def data_version(owner_id, scope='data'):
+    key = VERSION_KEY % (owner_id, scope)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, _new_version(), None)
+        version = cache.get(key)
+    return version
+
+
+def bump_version(owner_id, scope='data'):
+    try:
+        cache.incr(VERSION_KEY % (owner_id, scope))
+    except ValueError:
+        cache.set(VERSION_KEY % (owner_id, scope), _new_version(), None)
+
+
+def bump_version_on_commit(owner_id, scope='data'):
+    """Bumps the version now and again when the current transaction commits.
+
+    A reader on another connection may compute from the not yet committed data after the first bump
+    and cache the result under the new version, the second bump makes that entry unreachable.
+    """
+    bump_version(owner_id, scope)
+    transaction.on_commit(lambda: bump_version(owner_id, scope))
+
+
+def _count(hit):
+    try:
+        cache.incr(STATS_KEYS[hit])
+    except ValueError:
+        cache.set(STATS_KEYS[hit], 1, None)
+
+
+def _key(owner_id, name, scope):
+    return 'wydatki:%s:%s:%s:%s' % (owner_id, scope, data_version(owner_id, scope),
+                                    hashlib.md5(name.encode()).hexdigest())
+
+
+def peek(owner_id, name, scope='data'):
+    """The value cached() holds for ``name``, None when it would have to be computed."""
+    return cache.get(_key(owner_id, name, scope))
+
+
+def cached(owner_id, name, compute, timeout=None, scope='data'):
+    """Returns compute() cached for the owner until any of the owner's data in ``scope`` changes."""
+    key = _key(owner_id, name, scope)
+    value = cache.get(key)
+    _count(value is not None)
+    if value is None:
+        value = compute()
+        cache.set(key, value, timeout)
+    return value
+
+
+def stats():
+    hits, misses = cache.get(STATS_KEYS[True], 0), cache.get(STATS_KEYS[False], 0)
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_ratio': hits / (hits + misses) if hits + misses else None,
+        'entries': len(caches['default']) if hasattr(caches['default'], '__len__') else None,
+        'max_entries': getattr(caches['default'], '_max_entries', None),
+    }
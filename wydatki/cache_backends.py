@@ -0,0 +1,42 @@
+from collections import OrderedDict
+from itertools import islice
+
+from django.core.cache.backends import locmem
+
+
+class LRULocMemCache(locmem.LocMemCache):
+    """Local-memory cache evicting the least recently used entries once MAX_ENTRIES is reached."""
+
+    def __init__(self, name, params):
+        locmem._caches.setdefault(name, OrderedDict())
+        super(LRULocMemCache, self).__init__(name, params)
+
+    def _touch(self, key):
+        try:
+            self._cache.move_to_end(key)
+        except KeyError:
+            pass
+
+    def get(self, key, default=None, version=None, acquire_lock=True):
+        value = super(LRULocMemCache, self).get(key, default, version, acquire_lock)
+        # Reordering mutates the dict _cull() iterates, it needs the writer lock like _set().
+        # Without acquire_lock the caller already holds it.
+        if acquire_lock:
+            with self._lock.writer():
+                self._touch(self.make_key(key, version=version))
+        else:
+            self._touch(self.make_key(key, version=version))
+        return value
+
+    def _set(self, key, value, timeout=locmem.DEFAULT_TIMEOUT):
+        super(LRULocMemCache, self)._set(key, value, timeout)
+        self._touch(key)
+
+    def _cull(self):
+        if self._cull_frequency == 0:
+            return self.clear()
+        for key in list(islice(self._cache, max(1, self._max_entries // self._cull_frequency))):
+            self._delete(key)
+
+    def __len__(self):
+        return len(self._cache)
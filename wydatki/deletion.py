@@ -0,0 +1,163 @@
+from collections import defaultdict
+
+from django.apps import apps
+from django.contrib.contenttypes.models import ContentType
+from django.db import transaction
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncMonth
+
+from guardian.models import UserObjectPermission
+
+from wydatki.cache import bump_version
+from wydatki.models import (Expense, Category, Pocket, Place, Reminder, Income, IncomeSource, RecurringExpense,
+                            RunningTotal, ExpenseTotal, IncomeTotal, PocketSpend, LimitBreach, charge_pocket,
+                            add_pocket_spends)
+from wydatki.search import backend as search_backend, kind_of
+
+# Referencing models come before the models they reference.
+OWNED_MODELS = (Expense, ExpenseTotal, IncomeTotal, Income, LimitBreach, RecurringExpense, Reminder, IncomeSource,
+                Category, Place)
+
+
+def delete_in_chunks(queryset, chunk_size=2000, progress=None, done=0, before=None):
+    """Deletes the rows of ``queryset`` with one DELETE per ``chunk_size`` primary keys, each in its own
+    transaction, returns ``done`` plus the number of deleted rows.
+
+    The deletes bypass the collector, so no objects are loaded and no signals are sent: the caller
+    cleans up whatever depends on the rows, before(model, pks) runs in the transaction of each chunk.
+    """
+    model = queryset.model
+    while True:
+        with transaction.atomic():
+            pks = list(queryset.order_by('pk').values_list('pk', flat=True)[:chunk_size])
+            if not pks:
+                return done
+            if before:
+                before(model, pks)
+            model.objects.filter(pk__in=pks)._raw_delete(queryset.db)
+        done += len(pks)
+        if progress:
+            progress(done)
+
+
+def subtract_expenses(pks):
+    """Takes the expenses out of the running totals, pocket balances and pocket spends, the bulk
+    counterpart of the post_delete receiver. Totals are in the base currency, the rest in the pocket's."""
+    rows = Expense.objects.filter(pk__in=pks).order_by().annotate(month=TruncMonth('exp_date')).values(
+        'owner', 'pocket', 'category', 'month').annotate(total=Sum('base_price'), spent=Sum('price'), rows=Count('id'))
+    totals, charges, spends = {}, defaultdict(int), defaultdict(lambda: [0, 0])
+    for row in rows:
+        totals[row['owner'], row['pocket'], row['category'], row['month']] = [-row['total'], -row['rows']]
+        charges[row['pocket']] -= row['spent']
+        spend = spends[row['pocket'], row['month']]
+        spend[0] -= row['spent']
+        spend[1] -= row['rows']
+    ExpenseTotal.add_many(totals)
+    for pocket_id, amount in charges.items():
+        charge_pocket(pocket_id, amount)
+    add_pocket_spends(spends)
+
+
+def subtract_incomes(pks):
+    rows = Income.objects.filter(pk__in=pks).order_by().annotate(month=TruncMonth('income_date')).values(
+        'owner', 'source', 'month').annotate(total=Sum('base_amount'), rows=Count('id'))
+    IncomeTotal.add_many({(row['owner'], row['source'], row['month']): [-row['total'], -row['rows']]
+                          for row in rows})
+
+
+def remove_permissions(model, pks):
+    UserObjectPermission.objects.filter(content_type=ContentType.objects.get_for_model(model),
+                                        object_pk__in=[str(pk) for pk in pks]).delete()
+
+
+def clean_up(model, pks):
+    """Does for the deleted rows what the post_delete receivers would, and removes their guardian rows."""
+    if model is Expense:
+        subtract_expenses(pks)
+    elif model is Income:
+        subtract_incomes(pks)
+    if kind_of(model):
+        search_backend.remove([model(pk=pk) for pk in pks])
+    remove_permissions(model, pks)
+
+
+def merge_totals(model, field, obj, target):
+    """Adds the running totals of ``obj`` to those of ``target`` and removes them."""
+    rows = model.objects.filter(**{field: obj})
+    index = model.key_fields.index(field)
+    deltas = defaultdict(lambda: [0, 0])
+    for row in rows.values_list(*model.key_fields + ('total', 'count')):
+        delta = deltas[row[:index] + (target.pk,) + row[index + 1:-2]]
+        delta[0] += row[-2]
+        delta[1] += row[-1]
+    if model is PocketSpend:
+        # Records the limits of the target crossed by the merge.
+        add_pocket_spends(deltas)
+    else:
+        model.add_many(deltas)
+    rows.delete()
+
+
+def reassign(obj, target):
+    """Moves everything referencing ``obj`` to ``target`` with one UPDATE per model."""
+    with transaction.atomic():
+        for rel in obj._meta.related_objects:
+            model, field = rel.related_model, rel.field.name
+            if issubclass(model, RunningTotal):
+                merge_totals(model, field, obj, target)
+            elif model is not LimitBreach:
+                model.objects.filter(**{field: obj}).update(**{field: target})
+        if isinstance(obj, Pocket):
+            spent = Pocket.objects.filter(pk=obj.pk).values_list('spent', flat=True).get()
+            charge_pocket(obj.pk, -spent)
+            charge_pocket(target.pk, spent)
+    bump_version(obj.owner_id)
+
+
+def delete_object(obj, target=None, chunk_size=2000, progress=None):
+    """Deletes a category, pocket, place or income source. Whatever references it is first moved
+    to ``target`` or, without one, deleted in chunks of ``chunk_size`` rows.
+    """
+    if target is not None:
+        reassign(obj, target)
+    querysets = [rel.related_model.objects.filter(**{rel.field.name: obj}) for rel in obj._meta.related_objects]
+    report = None
+    if progress:
+        total = sum(queryset.count() for queryset in querysets)
+        report = lambda deleted: progress(deleted, total)
+    done = 0
+    for queryset in querysets:
+        done = delete_in_chunks(queryset, chunk_size, report, done, before=clean_up)
+        bump_version(obj.owner_id)
+    with transaction.atomic():
+        remove_permissions(type(obj), [obj.pk])
+        obj.delete()
+
+
+def delete_owned(progress, owner, model, pk, target=None, chunk_size=2000):
+    """Job handler of delete_object: deletes the owner's object ``pk`` of ``model`` ('app_label.model_name'),
+    moving what references it to the object ``target`` of the same model when given."""
+    model = apps.get_model(model)
+    obj = model.objects.filter(owner=owner, pk=pk).first()
+    if obj is None:
+        # Deleted by an earlier attempt or job.
+        return
+    if target is not None:
+        target = model.objects.get(owner=owner, pk=target)
+    delete_object(obj, target, chunk_size, progress)
+
+
+def delete_account(progress, owner, chunk_size=2000):
+    """Deletes the owner's data in chunks, then the account itself."""
+    if owner is None:
+        return
+    querysets = [model.objects.filter(owner=owner) for model in OWNED_MODELS]
+    querysets += [PocketSpend.objects.filter(pocket__owner=owner), Pocket.objects.filter(owner=owner),
+                  UserObjectPermission.objects.filter(user=owner)]
+    total = sum(queryset.count() for queryset in querysets)
+    done = 0
+    for queryset in querysets:
+        done = delete_in_chunks(queryset, chunk_size, lambda deleted: progress(deleted, total), done)
+    # Nothing is left to index, rebuilding drops the owner's entries.
+    search_backend.rebuild(owner)
+    owner.delete()
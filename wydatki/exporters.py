@@ -0,0 +1,43 @@
+import csv
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+from wydatki.pagination import seek_filter
+
+
+class Echo(object):
+
+    def write(self, value):
+        return value
+
+
+def iterate_in_chunks(queryset, ordering, chunk_size=2000):
+    """Yields the rows of a values() queryset, fetching ``chunk_size`` rows per query with a seek condition."""
+    queryset = queryset.order_by(*ordering)
+    chunk = queryset
+    while True:
+        rows = list(chunk[:chunk_size])
+        for row in rows:
+            yield row
+        if len(rows) < chunk_size:
+            return
+        chunk = queryset.filter(seek_filter(ordering, [rows[-1][field.lstrip('-')] for field in ordering]))
+
+
+def csv_lines(rows, columns, header):
+    writer = csv.writer(Echo())
+    yield writer.writerow(header)
+    for row in rows:
+        yield writer.writerow([row[column] for column in columns])
+
+
+def jsonl_lines(rows, columns, header):
+    encoder = DjangoJSONEncoder()
+    for row in rows:
+        yield encoder.encode(dict(zip(header, (row[column] for column in columns)))) + '\n'
+
+
+WRITERS = {
+    'csv': (csv_lines, 'text/csv'),
+    'jsonl': (jsonl_lines, 'application/x-ndjson'),
+}
@@ -0,0 +1,189 @@
+from django import forms
+from django.http import HttpResponseBadRequest
+
+from wydatki.forms import OwnerChoiceField
+from wydatki.models import Expense, Income, Category, Pocket, Place, Reminder, IncomeSource, RecurringExpense
+from wydatki.search import backend as search_backend, kind_of
+
+# Text filters on searchable models go through the search index, which returns at most this many matches,
+# the newest ones. The list then says it is truncated.
+TEXT_MATCHES = 1000
+
+
+def name_prefix(queryset, prefix):
+    """Names starting with ``prefix`` (case sensitive) as a range scan of the (owner, name) index."""
+    return queryset.filter(name__gte=prefix, name__lt=prefix + '\U0010ffff')
+
+
+def supporting_index(model, equal, column):
+    """Name of an index on (owner, *equal in any order, column), or None when there is none."""
+    for index in model._meta.indexes:
+        fields = index.fields
+        if len(fields) > len(equal) + 1 and fields[0] == 'owner' and set(fields[1:len(equal) + 1]) == set(equal) \
+                and fields[len(equal) + 1] == column:
+            return index.name
+    return None
+
+
+class ListFilterForm(forms.Form):
+    """Filters and sorts the owner's rows, accepting only combinations an index can serve.
+
+    Equality filters and the sort column must form a prefix of an index after owner, range filters
+    are only allowed on the sort column, so every query is an index range scan.
+    """
+    model = None
+    date_field = None
+    amount_field = None
+    text = True
+    # (field, label) pairs, the first sort field is the default.
+    equality_fields = ()
+    sort_fields = ()
+    default_sort = None
+    text_matches = TEXT_MATCHES
+    # Set by filter() when the text filter matched more than text_matches rows.
+    truncated = False
+
+    date_from = forms.DateField(label='Od', required=False)
+    date_to = forms.DateField(label='Do', required=False)
+    amount_min = forms.DecimalField(label='Kwota od', required=False)
+    amount_max = forms.DecimalField(label='Kwota do', required=False)
+    q = forms.CharField(label='Szukaj', required=False)
+    sort = forms.ChoiceField(label='Sortuj', required=False)
+
+    def __init__(self, owner, *args, **kwargs):
+        super(ListFilterForm, self).__init__(*args, **kwargs)
+        self.owner = owner
+        if self.date_field is None:
+            del self.fields['date_from'], self.fields['date_to']
+        if self.amount_field is None:
+            del self.fields['amount_min'], self.fields['amount_max']
+        if not self.text:
+            del self.fields['q']
+        for name, label in self.equality_fields:
+            self.fields[name] = OwnerChoiceField(None, label=label, required=False)
+            self.fields[name].set_owner(owner, name)
+        self.fields['sort'].choices = [(prefix + name, '%s %s' % (label, arrow))
+                                       for name, label in self.sort_fields for prefix, arrow in (('', '↑'), ('-', '↓'))]
+
+    def clean(self):
+        cleaned_data = super(ListFilterForm, self).clean()
+        sort = cleaned_data.get('sort') or self.default_sort or self.sort_fields[0][0]
+        cleaned_data['sort'] = sort
+        column = sort.lstrip('-')
+        ranges = set()
+        if cleaned_data.get('date_from') or cleaned_data.get('date_to'):
+            ranges.add(self.date_field)
+        if cleaned_data.get('amount_min') is not None or cleaned_data.get('amount_max') is not None:
+            ranges.add(self.amount_field)
+        if cleaned_data.get('q') and kind_of(self.model) is None:
+            ranges.add('name')
+        if ranges - {column}:
+            raise forms.ValidationError('Zakres można zawęzić tylko po kolumnie sortowania')
+        equal = [name for name, label in self.equality_fields if cleaned_data.get(name) is not None]
+        if supporting_index(self.model, equal, column) is None:
+            raise forms.ValidationError('Nieobsługiwane połączenie filtrów i sortowania')
+        return cleaned_data
+
+    @property
+    def is_filtered(self):
+        return any(value not in (None, '') for name, value in self.cleaned_data.items() if name != 'sort')
+
+    @property
+    def ordering(self):
+        sort = self.cleaned_data['sort']
+        return (sort, '-id' if sort.startswith('-') else 'id')
+
+    def filter(self, queryset):
+        data = self.cleaned_data
+        for name, label in self.equality_fields:
+            if data[name] is not None:
+                queryset = queryset.filter(**{name: data[name]})
+        for name, lookup, field in (('date_from', 'gte', self.date_field), ('date_to', 'lte', self.date_field),
+                                    ('amount_min', 'gte', self.amount_field),
+                                    ('amount_max', 'lte', self.amount_field)):
+            if data.get(name) not in (None, ''):
+                queryset = queryset.filter(**{'%s__%s' % (field, lookup): data[name]})
+        if data.get('q'):
+            kind = kind_of(self.model)
+            if kind is not None:
+                matches = search_backend.search(self.owner, data['q'], self.text_matches + 1)[kind]
+                self.truncated = len(matches) > self.text_matches
+                queryset = queryset.filter(pk__in=[pk for pk, name in matches[:self.text_matches]])
+            else:
+                queryset = name_prefix(queryset, data['q'])
+        return queryset.order_by(*self.ordering)
+
+
+class ExpenseListFilterForm(ListFilterForm):
+    model = Expense
+    date_field = 'exp_date'
+    amount_field = 'price'
+    equality_fields = (('category', 'Kategoria'), ('pocket', 'Portfel'), ('place', 'Miejsce'))
+    sort_fields = (('exp_date', 'Data'), ('price', 'Cena'))
+
+
+class IncomeListFilterForm(ListFilterForm):
+    model = Income
+    date_field = 'income_date'
+    amount_field = 'amount'
+    text = False
+    equality_fields = (('source', 'Źródło'),)
+    sort_fields = (('income_date', 'Data'), ('amount', 'Kwota'))
+
+
+class ReminderListFilterForm(ListFilterForm):
+    model = Reminder
+    date_field = 'remind_date'
+    text = False
+    sort_fields = (('remind_date', 'Data'),)
+    default_sort = '-remind_date'
+
+
+class NameListFilterForm(ListFilterForm):
+    sort_fields = (('name', 'Nazwa'),)
+
+
+class CategoryListFilterForm(NameListFilterForm):
+    model = Category
+
+
+class PocketListFilterForm(NameListFilterForm):
+    model = Pocket
+
+
+class PlaceListFilterForm(NameListFilterForm):
+    model = Place
+
+
+class IncomeSourceListFilterForm(NameListFilterForm):
+    model = IncomeSource
+
+
+class RecurringExpenseListFilterForm(NameListFilterForm):
+    model = RecurringExpense
+
+
+class FilteredListMixin(object):
+    """Validates filter_form_class before listing, invalid combinations are answered with 400.
+
+    get_queryset() passes its queryset through self.filter_form.filter().
+    """
+    filter_form_class = None
+
+    def get(self, request, *args, **kwargs):
+        self.filter_form = self.filter_form_class(request.user, request.GET)
+        if not self.filter_form.is_valid():
+            return HttpResponseBadRequest(self.filter_form.errors.as_text())
+        return super(FilteredListMixin, self).get(request, *args, **kwargs)
+
+    @property
+    def keyset_ordering(self):
+        return self.filter_form.ordering
+
+    def get_context_data(self, **kwargs):
+        context = super(FilteredListMixin, self).get_context_data(**kwargs)
+        query = self.request.GET.copy()
+        query.pop('page', None)
+        query.pop('cursor', None)
+        context.update(filter_form=self.filter_form, filter_query=query.urlencode())
+        return context
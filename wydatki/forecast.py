@@ -0,0 +1,110 @@
+from collections import Counter, OrderedDict
+from datetime import date, timedelta
+from itertools import accumulate
+
+from django.db.models import Sum
+
+from wydatki.models import BASE_CURRENCY, Category, Pocket, Income, ExpenseTotal, IncomeTotal
+from wydatki.rates import to_base, MissingRate
+from wydatki.recurrence import add_months, projected
+from wydatki.reports import ZERO, month_range
+
+
+def column_sums(columns, length):
+    sums = [ZERO] * length
+    for values in columns:
+        sums = [a + b for a, b in zip(sums, values)]
+    return sums
+
+
+class CashFlowForecast(object):
+    """Projects pocket balances `months` ahead from seasonal spending and expected incomes.
+
+    Spending per pocket and category is the average of the same calendar month over the complete months
+    of history, read in one query from the monthly totals table. Incomes come from the recurrence rules
+    of income sources, permanent sources without a rule repeat their average of the last 12 months.
+    Incomes aren't tied to pockets, so pocket balances only subtract spending from the funds, the incomes
+    are part of the net total alone. Everything is in the base currency, pocket funds are converted at
+    today's rate. Pockets in a currency without a rate keep their funds unconverted and get no balance,
+    their missing_rate says why.
+    """
+
+    def __init__(self, owner, months=12, history_months=120, today=None):
+        self.owner = owner
+        self.months = months
+        self.history_months = history_months
+        self.today = today or date.today()
+
+    def get_history(self, first_month):
+        return ExpenseTotal.objects.filter(
+            owner=self.owner, count__gt=0, month__gte=add_months(first_month, -self.history_months),
+            month__lt=first_month).values_list('month', 'pocket', 'category', 'total')
+
+    def seasonal(self, months_column, keys_column, values, years):
+        """{key: [average spend in January, ..., December]}"""
+        averages = {}
+        for month, key, total in zip(months_column, keys_column, values):
+            averages.setdefault(key, [ZERO] * 12)[month.month - 1] += total
+        return {key: [(total / years[i + 1]).quantize(ZERO) if years[i + 1] else ZERO for i, total in enumerate(totals)]
+                for key, totals in averages.items()}
+
+    def project(self, averages, months):
+        return {key: [season[month.month - 1] for month in months] for key, season in averages.items()}
+
+    def get_incomes(self, months):
+        index = {month: i for i, month in enumerate(months)}
+        incomes = [ZERO] * len(months)
+        last_day = add_months(months[-1], 1) - timedelta(days=1)
+        for income in projected(self.owner, months[0], last_day, models=(Income,)):
+            month = income.income_date.replace(day=1)
+            incomes[index[month]] += to_base(income.amount, income.currency, income.income_date)
+        permanent = IncomeTotal.objects.filter(
+            owner=self.owner, source__permanent=True, source__frequency='',
+            month__gte=add_months(months[0], -13), month__lt=add_months(months[0], -1)
+        ).aggregate(total=Sum('total'))['total']
+        if permanent:
+            incomes = [income + (permanent / 12).quantize(ZERO) for income in incomes]
+        return incomes
+
+    def build(self):
+        first_month = add_months(self.today.replace(day=1), 1)
+        months = [add_months(first_month, i) for i in range(self.months)]
+        rows = list(self.get_history(add_months(first_month, -1)))
+        if rows:
+            months_column, pockets_column, categories_column, values = zip(*rows)
+            years = Counter(month.month for month in month_range(min(months_column), max(months_column)))
+        else:
+            months_column = pockets_column = categories_column = values = ()
+            years = Counter()
+
+        pocket_spend = self.project(self.seasonal(months_column, pockets_column, values, years), months)
+        category_spend = self.project(self.seasonal(months_column, categories_column, values, years), months)
+        spend = column_sums(pocket_spend.values(), len(months))
+        incomes = self.get_incomes(months)
+
+        pockets = []
+        for pk, name, funds, currency in Pocket.objects.filter(owner=self.owner).order_by('name').values_list(
+                'pk', 'name', 'funds', 'currency'):
+            pocket = pocket_spend.get(pk, [ZERO] * len(months))
+            try:
+                funds = to_base(funds, currency, self.today)
+            except MissingRate as e:
+                # Without a rate the funds can't be set against spending in the base currency.
+                pockets.append({'id': pk, 'name': name, 'funds': funds, 'currency': currency, 'spend': pocket,
+                                'balance': None, 'missing_rate': str(e)})
+                continue
+            pockets.append({'id': pk, 'name': name, 'funds': funds, 'currency': BASE_CURRENCY, 'spend': pocket,
+                            'balance': [funds - spent for spent in accumulate(pocket)], 'missing_rate': None})
+        names = dict(Category.objects.filter(owner=self.owner, pk__in=category_spend).values_list('pk', 'name'))
+        categories = sorted(({'id': pk, 'name': names.get(pk), 'spend': category}
+                             for pk, category in category_spend.items()), key=lambda row: row['name'] or '')
+
+        return OrderedDict([
+            ('currency', BASE_CURRENCY),
+            ('months', [month.strftime('%Y-%m') for month in months]),
+            ('pockets', pockets),
+            ('categories', categories),
+            ('spend', spend),
+            ('incomes', incomes),
+            ('net', [income - spent for income, spent in zip(incomes, spend)]),
+        ])
@@ -1,9 +1,106 @@
+import codecs
+from datetime import date
+
 from django import forms
 from django.contrib.auth.models import User
-from wydatki.models import Expense, Category, Pocket, Place, Income, IncomeSource
+from django.forms.models import ModelChoiceIterator
+from django.forms.utils import flatatt
+from django.urls import reverse
+from django.utils.html import format_html
+from wydatki.cache import cached
+from wydatki.models import Expense, Category, Pocket, Place, Income, IncomeSource, RecurringExpense
+from wydatki.rates import rate_cache, MissingRate
+
+# Owner's objects offered as form choices, by the name used in their JSON endpoint.
+CHOICE_MODELS = {
+    'category': Category,
+    'pocket': Pocket,
+    'place': Place,
+    'source': IncomeSource,
+}
+
+
+class TypeaheadWidget(forms.Widget):
+    """Text input completed from ``url``, the chosen object's pk is posted in a hidden input."""
+
+    def __init__(self, url, queryset, attrs=None):
+        super(TypeaheadWidget, self).__init__(attrs)
+        self.url = url
+        self.queryset = queryset
+
+    def render(self, name, value, attrs=None, renderer=None):
+        obj = self.queryset.filter(pk=value).first() if value not in (None, '') else None
+        attrs = self.build_attrs(self.attrs, attrs)
+        value_id, list_id = '%s_value' % attrs.get('id', name), '%s_list' % attrs.get('id', name)
+        return format_html(
+            '<input type="hidden" name="{}" id="{}" value="{}">'
+            '<input type="text"{} list="{}" data-typeahead="{}" data-url="{}" value="{}" autocomplete="off">'
+            '<datalist id="{}"></datalist>',
+            name, value_id, obj.pk if obj else '', flatatt(attrs), list_id, value_id, self.url, obj or '', list_id)
+
+
+class OwnerChoiceIterator(ModelChoiceIterator):
+
+    def __iter__(self):
+        if self.field.empty_label is not None:
+            yield ('', self.field.empty_label)
+        for choice in self.field.cached_choices() or ():
+            yield choice
+
+    def __len__(self):
+        return len(list(iter(self)))
+
+
+class OwnerChoiceField(forms.ModelChoiceField):
+    """Choice of the owner's objects, see set_owner().
 
-import logging
-logging.basicConfig(level=logging.DEBUG)
+    The (pk, label) list is cached per owner until one of the CHOICE_MODELS changes. Owners with more than
+    ``limit`` objects get a TypeaheadWidget instead of a select with all of them.
+    """
+    limit = 500
+
+    def set_owner(self, owner, name):
+        self.queryset = CHOICE_MODELS[name].objects.filter(owner=owner).order_by('name')
+        self.owner_id, self.name = getattr(owner, 'pk', owner), name
+        self.iterator = OwnerChoiceIterator
+        self.widget.choices = self.choices
+        if self.cached_choices() is None:
+            self.widget = TypeaheadWidget(reverse('choice-json', args=[name]), self.queryset)
+            self.widget.is_required = self.required
+
+    def cached_choices(self):
+        def compute():
+            objects = list(self.queryset[:self.limit + 1])
+            # None would not be cached.
+            return [(obj.pk, self.label_from_instance(obj)) for obj in objects] if len(objects) <= self.limit else False
+        return cached(self.owner_id, 'choices:%s' % self.name, compute, scope='choices') or None
+
+
+def check_rate(currency, day):
+    """Amounts are converted to the base currency on save, which needs a rate."""
+    try:
+        rate_cache.rate(currency, day)
+    except MissingRate as e:
+        raise forms.ValidationError(str(e))
+
+
+class ReassignForm(forms.Form):
+    """Optional target for whatever references an object about to be deleted."""
+    target = OwnerChoiceField(None, label='Przenieś powiązane wpisy do', required=False,
+                              empty_label='(usuń je razem z nim)')
+
+    def __init__(self, obj, name, *args, **kwargs):
+        super(ReassignForm, self).__init__(*args, **kwargs)
+        self.obj = obj
+        self.fields['target'].set_owner(obj.owner_id, name)
+
+    def clean_target(self):
+        target = self.cleaned_data['target']
+        if target is not None and target.pk == self.obj.pk:
+            raise forms.ValidationError('Nie można przenieść wpisów do usuwanego obiektu')
+        if isinstance(target, Pocket) and target.currency != self.obj.currency:
+            raise forms.ValidationError('Wydatki można przenieść tylko do portfela w tej samej walucie')
+        return target
 
 
 class UserForm(forms.ModelForm):
@@ -16,22 +113,107 @@ class ExpenseForm(forms.ModelForm):
     class Meta:
         model = Expense
         fields = ['name', 'exp_date', 'category', 'price', 'pocket', 'place']  # 'reminder'
+        field_classes = {'category': OwnerChoiceField, 'pocket': OwnerChoiceField, 'place': OwnerChoiceField}
 
     def __init__(self, *args, **kwargs):
         user = kwargs.pop('user_id')
         super(ExpenseForm, self).__init__(*args, **kwargs)
-        self.fields['category'].queryset = Category.objects.filter(owner=user)
-        self.fields['pocket'].queryset = Pocket.objects.filter(owner=user)
-        self.fields['place'].queryset = Place.objects.filter(owner=user)
+        for name in ('category', 'pocket', 'place'):
+            self.fields[name].set_owner(user, name)
+
+    def clean(self):
+        cleaned_data = super(ExpenseForm, self).clean()
+        # The price is in the currency of the pocket.
+        if cleaned_data.get('pocket') and cleaned_data.get('exp_date'):
+            check_rate(cleaned_data['pocket'].currency, cleaned_data['exp_date'])
+        return cleaned_data
 
     
 class IncomeForm(forms.ModelForm):
     class Meta:
         model = Income
-        fields = ['name', 'source', 'amount', 'income_date']
+        fields = ['name', 'source', 'amount', 'currency', 'income_date']
+        field_classes = {'source': OwnerChoiceField}
 
     def __init__(self, *args, **kwargs):
         user = kwargs.pop('user_id')
         super(IncomeForm, self).__init__(*args, **kwargs)
-        self.fields['source'].queryset=IncomeSource.objects.filter(owner=user)
+        self.fields['source'].set_owner(user, 'source')
+
+    def clean(self):
+        cleaned_data = super(IncomeForm, self).clean()
+        if cleaned_data.get('currency') and cleaned_data.get('income_date'):
+            check_rate(cleaned_data['currency'], cleaned_data['income_date'])
+        return cleaned_data
+
+
+class CurrencyRateMixin(object):
+    """Funds and recurring amounts are converted at today's rate, the chosen currency needs one."""
+
+    def clean_currency(self):
+        currency = self.cleaned_data['currency']
+        check_rate(currency, date.today())
+        return currency
+
+
+class PocketForm(CurrencyRateMixin, forms.ModelForm):
+    class Meta:
+        model = Pocket
+        fields = ['name', 'currency', 'limit', 'funds']
+
+    def __init__(self, *args, **kwargs):
+        super(PocketForm, self).__init__(*args, **kwargs)
+        # Prices of the pocket's expenses are in its currency, it can't change under them.
+        if self.instance.has_transactions():
+            self.fields['currency'].disabled = True
+            self.fields['currency'].help_text = 'Portfel ma już wydatki'
+
+
+class IncomeSourceForm(CurrencyRateMixin, forms.ModelForm):
+    class Meta:
+        model = IncomeSource
+        fields = ['name', 'type_of_income', 'permanent', 'amount', 'currency', 'frequency', 'interval', 'starts_on',
+                  'ends_on']
+
+
+class RecurringExpenseForm(forms.ModelForm):
+    class Meta:
+        model = RecurringExpense
+        fields = ['name', 'category', 'price', 'pocket', 'place', 'frequency', 'interval', 'starts_on', 'ends_on']
+        field_classes = {'category': OwnerChoiceField, 'pocket': OwnerChoiceField, 'place': OwnerChoiceField}
+
+    def __init__(self, *args, **kwargs):
+        user = kwargs.pop('user_id')
+        super(RecurringExpenseForm, self).__init__(*args, **kwargs)
+        for name in ('category', 'pocket', 'place'):
+            self.fields[name].set_owner(user, name)
+        self.fields['frequency'].required = self.fields['starts_on'].required = True
+
+
+class ImportForm(forms.Form):
+    FORMATS = (
+        ('csv', 'CSV'),
+        ('ofx', 'OFX'),
+    )
+    file = forms.FileField(label='Plik')
+    file_format = forms.ChoiceField(label='Format', choices=FORMATS)
+    encoding = forms.CharField(label='Kodowanie', initial='utf-8')
+
+    def clean_encoding(self):
+        encoding = self.cleaned_data['encoding']
+        try:
+            codecs.lookup(encoding)
+        except LookupError:
+            raise forms.ValidationError('Nieznane kodowanie')
+        return encoding
+
+
+class ExpenseFilterForm(forms.Form):
+    date_from = forms.DateField(required=False)
+    date_to = forms.DateField(required=False)
+    category = forms.IntegerField(required=False)
+    pocket = forms.IntegerField(required=False)
+
 
+class ForecastForm(forms.Form):
+    months = forms.IntegerField(required=False, min_value=1, max_value=120)
@@ -0,0 +1,213 @@
+import csv
+import re
+import time
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+
+from django.db import transaction
+
+from wydatki.models import BASE_CURRENCY, CURRENCIES, Expense, Category, Pocket, Place, Income, IncomeSource
+from wydatki.rates import rate_cache, MissingRate
+from wydatki.signals import bulk_create
+
+DATE_FORMATS = ('%Y-%m-%d', '%d.%m.%Y', '%d-%m-%Y', '%Y%m%d')
+# Expense.price and Income.amount share these limits.
+AMOUNT_DIGITS = Expense._meta.get_field('price').max_digits
+AMOUNT_PLACES = Expense._meta.get_field('price').decimal_places
+OFX_TAG = re.compile(r'<(\w+)>([^<\r\n]*)')
+
+
+class ImportRowError(ValueError):
+    pass
+
+
+def parse_date(value):
+    value = value.strip()
+    for date_format in DATE_FORMATS:
+        try:
+            return datetime.strptime(value, date_format).date()
+        except ValueError:
+            continue
+    raise ImportRowError('Invalid date: %r' % value)
+
+
+def parse_amount(value):
+    """The amount as a Decimal that fits the amount columns, NaN, infinities and excess digits are errors."""
+    try:
+        amount = Decimal(value.strip().replace(' ', '').replace('\xa0', '').replace(',', '.'))
+    except InvalidOperation:
+        raise ImportRowError('Invalid amount: %r' % value)
+    if not amount.is_finite():
+        raise ImportRowError('Invalid amount: %r' % value)
+    if abs(amount) >= 10 ** (AMOUNT_DIGITS - AMOUNT_PLACES) or amount != round(amount, AMOUNT_PLACES):
+        raise ImportRowError('Amount out of range: %r' % value)
+    return amount
+
+
+def read_csv(lines):
+    """Yields rows of a CSV with a date,name,amount[,currency,category,place,pocket,source] header."""
+    lines = iter(lines)
+    header = next(lines, '')
+    try:
+        dialect = csv.Sniffer().sniff(header, delimiters=',;\t')
+    except csv.Error:
+        # Empty files and single column headers have no delimiter to detect.
+        dialect = csv.excel
+    for row in csv.DictReader(_prepend(header, lines), dialect=dialect):
+        yield {key.strip().lower(): (value or '').strip() for key, value in row.items() if key}
+
+
+def read_ofx(lines):
+    """Yields the <STMTTRN> transactions of an OFX 1.x (SGML) or 2.x (XML) statement."""
+    tags = None
+    for line in lines:
+        for tag, value in OFX_TAG.findall(line):
+            tag = tag.upper()
+            if tag == 'STMTTRN':
+                tags = {}
+            elif tags is not None:
+                tags[tag] = value.strip()
+        if tags is not None and '</STMTTRN>' in line.upper():
+            yield {
+                'date': tags.get('DTPOSTED', '')[:8],
+                'name': tags.get('NAME') or tags.get('MEMO', ''),
+                'amount': tags.get('TRNAMT', ''),
+                'place': tags.get('NAME'),
+            }
+            tags = None
+
+
+def read_rates(lines):
+    """Yields (currency, day, rate) from a CSV with a date,currency,rate header, the rate being the value
+    of one unit of the currency in BASE_CURRENCY."""
+    for line, row in enumerate(csv.DictReader(lines), 2):
+        row = {key.strip().lower(): (value or '').strip() for key, value in row.items() if key}
+        try:
+            yield row.get('currency', '').upper(), parse_date(row.get('date', '')), parse_amount(row.get('rate', ''))
+        except ImportRowError as e:
+            raise ValueError('%d: %s' % (line, e))
+
+
+READERS = {
+    'csv': read_csv,
+    'ofx': read_ofx,
+}
+
+
+def _prepend(first, lines):
+    yield first
+    for line in lines:
+        yield line
+
+
+class LookupCache(object):
+    """Maps the owner's object names to ids, creating missing objects on first use."""
+
+    def __init__(self, model, owner, **defaults):
+        self.model, self.owner, self.defaults = model, owner, defaults
+        self.ids = dict(model.objects.filter(owner=owner).values_list('name', 'pk'))
+
+    def get(self, name):
+        name = name[:self.model._meta.get_field('name').max_length]
+        if name not in self.ids:
+            self.ids[name] = self.model.objects.create(name=name, owner=self.owner, **self.defaults).pk
+        return self.ids[name]
+
+
+class ImportResult(object):
+
+    def __init__(self):
+        self.expenses = self.incomes = 0
+        self.errors = []
+        self.seconds = 0.0
+
+    @property
+    def rows(self):
+        return self.expenses + self.incomes
+
+    @property
+    def rows_per_second(self):
+        return self.rows / self.seconds if self.seconds else 0.0
+
+    def as_dict(self):
+        return {'expenses': self.expenses, 'incomes': self.incomes, 'errors': self.errors,
+                'seconds': self.seconds, 'rows_per_second': self.rows_per_second}
+
+
+class TransactionImporter(object):
+    """Imports bank statement rows for one owner: negative amounts as expenses, positive as incomes.
+
+    Expenses are in the currency of their pocket, incomes in that of the currency column.
+    """
+    max_errors = 100
+
+    def __init__(self, owner, batch_size=1000, pocket='Import', category='Import', place='Nieznane',
+                 source='Import'):
+        self.owner = owner
+        self.batch_size = batch_size
+        self.defaults = {'pocket': pocket, 'category': category, 'place': place, 'source': source}
+        self.categories = LookupCache(Category, owner)
+        self.pockets = LookupCache(Pocket, owner, limit=0, funds=0)
+        # Pockets created by the import are in the base currency.
+        self.currencies = dict(Pocket.objects.filter(owner=owner).values_list('pk', 'currency'))
+        self.places = LookupCache(Place, owner)
+        self.sources = LookupCache(IncomeSource, owner, type_of_income='import', permanent=False)
+
+    def build(self, row):
+        amount, exp_date = parse_amount(row.get('amount', '')), parse_date(row.get('date', ''))
+        name = (row.get('name') or row.get('place') or 'Import')[:40]
+        if not amount:
+            raise ImportRowError('Zero amount')
+        if amount < 0:
+            pocket_id = self.pockets.get(self.value(row, 'pocket'))
+            self.check_rate(self.currencies.get(pocket_id, BASE_CURRENCY), exp_date)
+            return Expense(name=name, exp_date=exp_date, price=-amount, owner=self.owner, pocket_id=pocket_id,
+                           category_id=self.categories.get(self.value(row, 'category')),
+                           place_id=self.places.get(self.value(row, 'place')))
+        currency = (row.get('currency') or BASE_CURRENCY).upper()
+        if currency not in dict(CURRENCIES):
+            raise ImportRowError('Invalid currency: %r' % currency)
+        self.check_rate(currency, exp_date)
+        return Income(name=name, income_date=exp_date, amount=amount, currency=currency, owner=self.owner,
+                      source_id=self.sources.get(self.value(row, 'source')))
+
+    def check_rate(self, currency, day):
+        # Rows are converted to the base currency on insert, a missing rate would fail the whole batch.
+        try:
+            rate_cache.rate(currency, day)
+        except MissingRate as e:
+            raise ImportRowError(str(e))
+
+    def value(self, row, key):
+        return row.get(key) or self.defaults[key]
+
+    def flush(self, model, objects):
+        if objects:
+            bulk_create(model, objects)
+        return []
+
+    def run(self, lines, file_format='csv'):
+        result, started = ImportResult(), time.time()
+        expenses, incomes = [], []
+        with transaction.atomic():
+            for line, row in enumerate(READERS[file_format](lines), 1):
+                try:
+                    obj = self.build(row)
+                except ImportRowError as e:
+                    if len(result.errors) < self.max_errors:
+                        result.errors.append('%d: %s' % (line, e))
+                    continue
+                if isinstance(obj, Expense):
+                    expenses.append(obj)
+                    result.expenses += 1
+                    if len(expenses) >= self.batch_size:
+                        expenses = self.flush(Expense, expenses)
+                else:
+                    incomes.append(obj)
+                    result.incomes += 1
+                    if len(incomes) >= self.batch_size:
+                        incomes = self.flush(Income, incomes)
+            self.flush(Expense, expenses)
+            self.flush(Income, incomes)
+        result.seconds = time.time() - started
+        return result
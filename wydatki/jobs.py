@@ -0,0 +1,125 @@
+import json
+import logging
+import os
+import socket
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from wydatki.models import Job
+
+logger = logging.getLogger(__name__)
+
+# Job kinds and their handlers, called as handler(progress, owner=..., **payload).
+HANDLERS = {
+    'delete_account': 'wydatki.deletion.delete_account',
+    'delete_object': 'wydatki.deletion.delete_owned',
+}
+
+
+def worker_name():
+    return '%s:%d' % (socket.gethostname(), os.getpid())
+
+
+def enqueue(kind, owner=None, max_attempts=3, **payload):
+    if kind not in HANDLERS:
+        raise ValueError('Unknown job kind %r' % kind)
+    return Job.objects.create(kind=kind, owner=owner, max_attempts=max_attempts, payload=json.dumps(payload))
+
+
+class Progress(object):
+    """Passed to the handler, stores how far it got at most every ``interval`` seconds."""
+
+    def __init__(self, job, interval=1.0):
+        self.job = job
+        self.interval = interval
+        self.last = 0.0
+        self.done, self.total = 0, None
+
+    def __call__(self, done, total=None):
+        self.done, self.total = done, total
+        now = time.monotonic()
+        if now - self.last >= self.interval:
+            self.last = now
+            Job.objects.filter(pk=self.job.pk).update(progress=done, total=total, locked_at=timezone.now())
+
+
+def requeue_stale(timeout=None):
+    """Returns jobs whose worker stopped reporting progress to the queue, the lost run counts as an attempt.
+
+    Pool tasks of wydatki.tasks have a single attempt, so a lost one is marked failed.
+    """
+    timeout = timeout or settings.WYDATKI_JOB_TIMEOUT
+    stale = Job.objects.filter(status=Job.RUNNING, locked_at__lt=timezone.now() - timedelta(seconds=timeout))
+    failed = stale.filter(attempts__gte=F('max_attempts')).update(
+        status=Job.FAILED, error='Worker stopped responding', finished=timezone.now())
+    return failed + stale.update(status=Job.PENDING, locked_by='', locked_at=None)
+
+
+def claim(worker, per_owner=None):
+    """Marks the next due job as running by ``worker`` and returns it, None when there is nothing to do.
+
+    Owners already running ``per_owner`` jobs are skipped. The claim is a conditional UPDATE,
+    so workers racing for the same row can't both get it. Rows of wydatki.tasks pool tasks aren't jobs.
+    """
+    per_owner = per_owner or settings.WYDATKI_JOB_PER_OWNER
+    jobs = Job.objects.filter(kind__in=list(HANDLERS))
+    busy = [row['owner'] for row in jobs.filter(status=Job.RUNNING, owner__isnull=False).values(
+        'owner').annotate(running=Count('id')).filter(running__gte=per_owner)]
+    candidates = jobs.filter(status=Job.PENDING, run_after__lte=timezone.now()).exclude(
+        owner__in=busy).order_by('run_after', 'id')
+    for job in candidates[:10]:
+        with transaction.atomic():
+            claimed = Job.objects.filter(pk=job.pk, status=Job.PENDING).update(
+                status=Job.RUNNING, locked_by=worker, locked_at=timezone.now(), attempts=F('attempts') + 1)
+            if not claimed:
+                continue
+            if job.owner_id and jobs.filter(owner=job.owner_id, status=Job.RUNNING).count() > per_owner:
+                # Another worker took a job of the same owner meanwhile.
+                Job.objects.filter(pk=job.pk).update(status=Job.PENDING, locked_by='', locked_at=None,
+                                                     attempts=F('attempts') - 1)
+                continue
+        job.refresh_from_db()
+        return job
+    return None
+
+
+def run(job):
+    """Runs a claimed job, a failed one is retried with exponential backoff until max_attempts."""
+    progress = Progress(job)
+    try:
+        handler = import_string(HANDLERS[job.kind])
+        handler(progress, owner=job.owner, **json.loads(job.payload))
+    except Exception as e:
+        logger.exception('Job %s failed', job)
+        if job.attempts < job.max_attempts:
+            delay = settings.WYDATKI_JOB_RETRY_DELAY * 2 ** (job.attempts - 1)
+            Job.objects.filter(pk=job.pk).update(status=Job.PENDING, locked_by='', locked_at=None, error=repr(e),
+                                                 run_after=timezone.now() + timedelta(seconds=delay))
+        else:
+            Job.objects.filter(pk=job.pk).update(status=Job.FAILED, error=repr(e), finished=timezone.now())
+        return False
+    Job.objects.filter(pk=job.pk).update(status=Job.DONE, error='', finished=timezone.now(), progress=progress.done,
+                                         total=progress.total)
+    return True
+
+
+def work(worker=None, limit=None):
+    """Runs due jobs until there are none left or ``limit`` were run, returns (done, failed)."""
+    worker = worker or worker_name()
+    requeue_stale()
+    done = failed = 0
+    while limit is None or done + failed < limit:
+        job = claim(worker)
+        if job is None:
+            break
+        if run(job):
+            done += 1
+        else:
+            failed += 1
+    return done, failed
@@ -0,0 +1,170 @@
+import json
+import time
+import tracemalloc
+from collections import OrderedDict
+
+import django
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, reset_queries
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from wydatki import urls
+from wydatki.models import Expense
+from wydatki.synthetic import create_user
+
+# Views that only accept POST or need a running task.
+SKIP = {'api-batch', 'task', 'task-json', 'task-download'}
+URL_KWARGS = {'resource': 'expenses', 'file_format': 'csv'}
+QUERY_PARAMS = {'search': {'q': 'zak'}, 'search-json': {'q': 'zak'}}
+# Objects of URLs whose view does not name a model.
+URL_MODELS = {'api-detail': Expense, 'profile-update': User}
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(fraction * (len(values) - 1))))]
+
+
+def url_model(pattern):
+    view_class = getattr(pattern.callback, 'view_class', None)
+    if pattern.name in URL_MODELS:
+        return URL_MODELS[pattern.name]
+    if getattr(view_class, 'model', None) is not None:
+        return view_class.model
+    if getattr(view_class, 'queryset', None) is not None:
+        return view_class.queryset.model
+    return view_class.form_class._meta.model
+
+
+class Command(BaseCommand):
+    help = ('Measures every wydatki URL (p50/p95 latency, query count, peak memory) for users with the given '
+            'numbers of expenses, creating bench-<size> users when missing, and compares with a baseline')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 100000, 1000000],
+                            help='expenses per benchmarked user')
+        parser.add_argument('--repeat', type=int, default=20, help='timed requests per URL')
+        parser.add_argument('--urls', nargs='+', help='only these URL names')
+        parser.add_argument('--output', help='write the results to this JSON file')
+        parser.add_argument('--baseline', help='JSON file of an earlier run to compare with')
+        parser.add_argument('--threshold', type=float, default=0.2,
+                            help='allowed relative p50 slowdown against the baseline')
+
+    def get_user(self, size):
+        username = 'bench-%d' % size
+        user = User.objects.filter(username=username).first()
+        if user is None:
+            self.stdout.write('Creating %s' % username)
+            user = create_user(username, size, size // 20, seed=size)
+        return user
+
+    def get_urls(self, user, names=None):
+        for pattern in urls.urlpatterns:
+            if pattern.name in SKIP or (names and pattern.name not in names):
+                continue
+            kwargs = {name: URL_KWARGS[name] for name in pattern.regex.groupindex if name != 'pk'}
+            if 'pk' in pattern.regex.groupindex:
+                model = url_model(pattern)
+                obj = user if model is User else model.objects.filter(owner=user).order_by('pk').first()
+                if obj is None:
+                    continue
+                kwargs['pk'] = obj.pk
+            yield pattern.name, reverse(pattern.name, kwargs=kwargs), QUERY_PARAMS.get(pattern.name, {})
+
+    def request(self, client, url, params):
+        response = client.get(url, params)
+        if response.streaming:
+            for chunk in response.streaming_content:
+                pass
+        return response
+
+    def measure(self, client, url, params, repeat):
+        self.request(client, url, params)
+        timings = []
+        for i in range(repeat):
+            start = time.perf_counter()
+            self.request(client, url, params)
+            timings.append(time.perf_counter() - start)
+        # The query log is reset when a request starts, capture from an empty one.
+        reset_queries()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.request(client, url, params)
+        query_count = len(queries)
+        tracemalloc.start()
+        self.request(client, url, params)
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        return OrderedDict([
+            ('url', url),
+            ('status', response.status_code),
+            ('p50_ms', round(percentile(timings, 0.5) * 1000, 2)),
+            ('p95_ms', round(percentile(timings, 0.95) * 1000, 2)),
+            ('queries', query_count),
+            ('peak_kb', peak // 1024),
+        ])
+
+    def compare(self, results, baseline, threshold):
+        regressions = []
+        for size, views in results.items():
+            for name, result in views.items():
+                before = baseline.get(size, {}).get(name)
+                if before is None or 'error' in before:
+                    continue
+                if 'error' in result:
+                    regressions.append('%s @ %s: %s' % (name, size, result['error']))
+                    continue
+                # The median is stable over a few dozen requests, the tail is not.
+                if result['p50_ms'] > before['p50_ms'] * (1 + threshold):
+                    regressions.append('%s @ %s: p50 %.2f ms -> %.2f ms' % (
+                        name, size, before['p50_ms'], result['p50_ms']))
+                if result['queries'] > before['queries']:
+                    regressions.append('%s @ %s: %d -> %d queries' % (
+                        name, size, before['queries'], result['queries']))
+        return regressions
+
+    def handle(self, *args, **options):
+        baseline = None
+        if options['baseline']:
+            with open(options['baseline']) as f:
+                baseline = json.load(f)['results']
+
+        results = OrderedDict()
+        # The test client's host name is not in ALLOWED_HOSTS outside of tests.
+        with override_settings(ALLOWED_HOSTS=settings.ALLOWED_HOSTS + ['testserver']):
+            for size in options['sizes']:
+                user = self.get_user(size)
+                client = Client()
+                client.force_login(user)
+                views = results[str(size)] = OrderedDict()
+                for name, url, params in self.get_urls(user, options['urls']):
+                    try:
+                        views[name] = result = self.measure(client, url, params, options['repeat'])
+                    except Exception as e:
+                        views[name] = OrderedDict([('url', url), ('error', repr(e))])
+                        self.stderr.write('%8d %-28s %r' % (size, name, e))
+                        continue
+                    self.stdout.write('%8d %-28s %3d  p50 %8.2f ms  p95 %8.2f ms  %4d queries  %8d kB' % (
+                        size, name, result['status'], result['p50_ms'], result['p95_ms'], result['queries'],
+                        result['peak_kb']))
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(OrderedDict([
+                    ('created', timezone.now().isoformat()),
+                    ('django', django.get_version()),
+                    ('database', connection.vendor),
+                    ('repeat', options['repeat']),
+                    ('results', results),
+                ]), f, indent=2)
+            self.stdout.write('Results written to %s' % options['output'])
+
+        if baseline is not None:
+            regressions = self.compare(results, baseline, options['threshold'])
+            if regressions:
+                raise CommandError('Regressions against %s:\n%s' % (options['baseline'], '\n'.join(regressions)))
+            self.stdout.write('No regressions against %s' % options['baseline'])
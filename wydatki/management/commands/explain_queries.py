@@ -0,0 +1,87 @@
+import re
+from datetime import date, timedelta
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import RequestFactory
+
+from wydatki import views
+from wydatki.aggregates import expense_totals_queryset
+from wydatki.models import Expense, Income, Pocket, ExpenseTotal, IncomeTotal
+
+LIST_VIEWS = (
+    views.ExpenseListView, views.CategoryListView, views.PocketListView, views.PlaceListView,
+    views.ReminderListView, views.IncomeListView, views.IncomeSourceListView, views.RecurringExpenseListView,
+)
+
+EXPLAIN_PREFIX = {
+    'sqlite': 'EXPLAIN QUERY PLAN ',
+    'postgresql': 'EXPLAIN ',
+    'mysql': 'EXPLAIN ',
+}
+
+
+def is_table_scan(line):
+    if connection.vendor == 'sqlite':
+        return re.search(r'\bSCAN\b', line) is not None and 'USING' not in line
+    if connection.vendor == 'postgresql':
+        return 'Seq Scan' in line
+    return "'ALL'" in line
+
+
+class Command(BaseCommand):
+    help = 'Runs EXPLAIN on the list and aggregate queries of the wydatki views and reports table scans'
+
+    def add_arguments(self, parser):
+        parser.add_argument('user', help='username whose queries should be explained')
+
+    def get_queries(self, user):
+        request = RequestFactory().get('/')
+        request.user = user
+        for view_class in LIST_VIEWS:
+            view = view_class()
+            view.request, view.args, view.kwargs = request, (), {}
+            view.filter_form = view.filter_form_class(user, {})
+            view.filter_form.is_valid()
+            queryset = view.get_queryset()
+            yield view_class.__name__, queryset[:view.paginate_by]
+            yield view_class.__name__ + ' (count)', queryset.values('pk')
+
+        month_ago = date.today() - timedelta(days=30)
+        for group_by in ('category', 'pocket', 'place'):
+            yield 'expense totals by %s' % group_by, expense_totals_queryset(user, group_by, date_from=month_ago)
+        pocket = Pocket.objects.filter(owner=user).first()
+        if pocket is not None:
+            yield 'expense totals by category for pocket', expense_totals_queryset(user, pocket=pocket)
+        yield 'expense sum', ExpenseTotal.objects.filter(owner=user).values('total')
+        yield 'income sum', IncomeTotal.objects.filter(owner=user).values('total')
+        yield 'expenses in date range', Expense.objects.filter(owner=user, exp_date__gte=month_ago)
+        yield 'incomes in date range', Income.objects.filter(owner=user, income_date__gte=month_ago)
+
+    def handle(self, *args, **options):
+        if connection.vendor not in EXPLAIN_PREFIX:
+            raise CommandError('EXPLAIN is not supported for the %s backend' % connection.vendor)
+        try:
+            user = User.objects.get(username=options['user'])
+        except User.DoesNotExist:
+            raise CommandError('User "%s" does not exist' % options['user'])
+
+        scans = []
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                # Small tables are cheaper to scan, make the planner show whether an index path exists.
+                cursor.execute('SET enable_seqscan = off')
+            for label, queryset in self.get_queries(user):
+                sql, params = queryset.query.sql_with_params()
+                cursor.execute(EXPLAIN_PREFIX[connection.vendor] + sql, params)
+                plan = [' '.join(str(column) for column in row) for row in cursor.fetchall()]
+                self.stdout.write(label)
+                for line in plan:
+                    self.stdout.write('    ' + line)
+                if any(is_table_scan(line.strip()) for line in plan):
+                    scans.append(label)
+
+        if scans:
+            raise CommandError('Table scans in: ' + ', '.join(scans))
+        self.stdout.write('No table scans found')
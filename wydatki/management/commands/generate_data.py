@@ -0,0 +1,30 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from wydatki.synthetic import create_user
+
+
+class Command(BaseCommand):
+    help = 'Creates users with synthetic categories, pockets, places, expenses and incomes (password = username)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1, help='number of users to create')
+        parser.add_argument('--prefix', default='demo', help='usernames are <prefix>-<n>')
+        parser.add_argument('--expenses', type=int, default=100000, help='expenses per user')
+        parser.add_argument('--incomes', type=int, default=None, help='incomes per user (default: expenses / 20)')
+        parser.add_argument('--years', type=int, default=5, help='the rows are spread over this many past years')
+        parser.add_argument('--batch-size', type=int, default=10000, help='rows inserted per transaction')
+        parser.add_argument('--seed', type=int, default=None)
+
+    def handle(self, *args, **options):
+        incomes = options['incomes'] if options['incomes'] is not None else options['expenses'] // 20
+        usernames = ['%s-%d' % (options['prefix'], i + 1) for i in range(options['users'])]
+        existing = User.objects.filter(username__in=usernames).values_list('username', flat=True)
+        if existing:
+            raise CommandError('Users already exist: %s' % ', '.join(sorted(existing)))
+        for i, username in enumerate(usernames):
+            seed = None if options['seed'] is None else options['seed'] + i
+            create_user(username, options['expenses'], incomes, years=options['years'],
+                        batch_size=options['batch_size'], seed=seed,
+                        stdout=self.stdout if options['verbosity'] > 1 else None)
+            self.stdout.write('Created %s with %d expenses and %d incomes' % (username, options['expenses'], incomes))
@@ -0,0 +1,36 @@
+import io
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from wydatki.importers import TransactionImporter, READERS
+
+
+class Command(BaseCommand):
+    help = 'Imports expenses and incomes from a CSV or OFX bank statement'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--user', required=True, help='username of the owner of the imported rows')
+        parser.add_argument('--format', choices=sorted(READERS), help='file format (default: from the extension)')
+        parser.add_argument('--encoding', default='utf-8')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--pocket', default='Import', help='pocket for rows without one')
+
+    def handle(self, *args, **options):
+        try:
+            owner = User.objects.get(username=options['user'])
+        except User.DoesNotExist:
+            raise CommandError('User "%s" does not exist' % options['user'])
+        file_format = options['format'] or options['path'].rsplit('.', 1)[-1].lower()
+        if file_format not in READERS:
+            raise CommandError('Unknown file format "%s", use --format' % file_format)
+
+        importer = TransactionImporter(owner, batch_size=options['batch_size'], pocket=options['pocket'])
+        with io.open(options['path'], encoding=options['encoding'], newline='') as lines:
+            result = importer.run(lines, file_format)
+
+        for error in result.errors:
+            self.stderr.write(error)
+        self.stdout.write('Imported %d expenses and %d incomes in %.1fs (%d rows/s)' % (
+            result.expenses, result.incomes, result.seconds, result.rows_per_second))
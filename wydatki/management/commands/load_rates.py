@@ -0,0 +1,24 @@
+import io
+
+from django.core.management.base import BaseCommand, CommandError
+
+from wydatki.importers import read_rates
+from wydatki.rates import store_rates
+
+
+class Command(BaseCommand):
+    help = ('Loads daily exchange rates from a CSV with a date,currency,rate header and converts the stored '
+            'amounts they change to the base currency')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--encoding', default='utf-8')
+
+    def handle(self, *args, **options):
+        try:
+            with io.open(options['path'], encoding=options['encoding'], newline='') as lines:
+                stored = store_rates(read_rates(lines))
+        except (OSError, ValueError) as e:
+            raise CommandError(e)
+        for currency, count in sorted(stored.items()):
+            self.stdout.write('%s: %d rates' % (currency, count))
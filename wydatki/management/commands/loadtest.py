@@ -0,0 +1,120 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import resolve, reverse
+
+from wydatki import tasks
+from wydatki.management.commands.benchmark import percentile
+from wydatki.models import Expense
+from wydatki.synthetic import create_user
+
+CRUD_URLS = ('expense-list', 'category-list', 'income-list', 'expense-add')
+PHASES = ('crud', 'sync-exports', 'background-exports')
+
+
+class Command(BaseCommand):
+    help = ('Measures the latency of the CRUD pages alone, while other clients stream exports in their '
+            'requests and while the exports run as background tasks')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--size', type=int, default=100000, help='expenses of the bench-<size> user')
+        parser.add_argument('--clients', type=int, default=4, help='threads requesting CRUD pages')
+        parser.add_argument('--exporters', type=int, default=4, help='threads requesting exports')
+        parser.add_argument('--seconds', type=float, default=20, help='duration of each phase')
+        parser.add_argument('--output', help='write the results to this JSON file')
+
+    def client(self, user):
+        client = Client()
+        client.force_login(user)
+        return client
+
+    def crud(self, user, urls, stop, timings):
+        client = self.client(user)
+        try:
+            while not stop.is_set():
+                for url in urls:
+                    start = time.perf_counter()
+                    client.get(url)
+                    timings.append(time.perf_counter() - start)
+        finally:
+            connection.close()
+
+    def export(self, user, background, stop, exports):
+        client = self.client(user)
+        url = reverse('expense-export', args=['csv'])
+        try:
+            while not stop.is_set():
+                response = client.get(url, {'background': '1'} if background else {})
+                if response.status_code == 503:
+                    time.sleep(1)
+                    continue
+                if background:
+                    # Polls the task like its page does, unless it finished while the request waited.
+                    match = resolve(response.url)
+                    status_url = reverse('task-json', args=[match.kwargs['task_id']])
+                    while match.url_name != 'task-download' and not stop.is_set():
+                        time.sleep(0.5)
+                        if json.loads(client.get(status_url).content.decode())['status'] in tasks.FINISHED:
+                            break
+                    if stop.is_set():
+                        break
+                    response = client.get(reverse('task-download', args=[match.kwargs['task_id']]))
+                    if response.status_code != 200:
+                        continue
+                for chunk in response.streaming_content:
+                    pass
+                exports.append(1)
+        finally:
+            connection.close()
+
+    def run_phase(self, user, urls, exporters, background, seconds):
+        stop, timings, exports = threading.Event(), [], []
+        threads = [threading.Thread(target=self.crud, args=(user, urls, stop, timings))
+                   for i in range(self.options['clients'])]
+        threads += [threading.Thread(target=self.export, args=(user, background, stop, exports))
+                    for i in range(exporters)]
+        for thread in threads:
+            thread.start()
+        time.sleep(seconds)
+        stop.set()
+        for thread in threads:
+            thread.join()
+        return OrderedDict([
+            ('requests', len(timings)),
+            ('p50_ms', round(percentile(timings, 0.5) * 1000, 2)),
+            ('p95_ms', round(percentile(timings, 0.95) * 1000, 2)),
+            ('exports', len(exports)),
+        ])
+
+    def handle(self, *args, **options):
+        self.options = options
+        username = 'bench-%d' % options['size']
+        user = User.objects.filter(username=username).first()
+        if user is None:
+            self.stdout.write('Creating %s' % username)
+            user = create_user(username, options['size'], options['size'] // 20, seed=options['size'])
+        urls = [reverse(name) for name in CRUD_URLS]
+        urls.append(reverse('expense-detail', args=[Expense.objects.filter(owner=user).order_by('pk')[0].pk]))
+
+        results = OrderedDict()
+        with override_settings(ALLOWED_HOSTS=settings.ALLOWED_HOSTS + ['testserver']):
+            for phase in PHASES:
+                exporters = 0 if phase == 'crud' else options['exporters']
+                results[phase] = result = self.run_phase(user, urls, exporters, phase == 'background-exports',
+                                                         options['seconds'])
+                self.stdout.write('%-20s %6d requests  p50 %8.2f ms  p95 %8.2f ms  %4d exports' % (
+                    phase, result['requests'], result['p50_ms'], result['p95_ms'], result['exports']))
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(OrderedDict([('size', options['size']), ('clients', options['clients']),
+                                       ('exporters', options['exporters']), ('results', results)]), f, indent=2)
+            self.stdout.write('Results written to %s' % options['output'])
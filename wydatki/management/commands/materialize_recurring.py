@@ -0,0 +1,22 @@
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from wydatki.recurrence import materialize
+
+
+class Command(BaseCommand):
+    help = 'Creates the incomes and expenses of recurring rules that fell due, run it daily'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date', help='materialize up to this YYYY-MM-DD date (default: today)')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        today = None
+        if options['date']:
+            try:
+                today = datetime.strptime(options['date'], '%Y-%m-%d').date()
+            except ValueError:
+                raise CommandError('Invalid date "%s", use YYYY-MM-DD' % options['date'])
+        self.stdout.write('Created %d occurrences' % materialize(today, options['batch_size']))
@@ -0,0 +1,23 @@
+from django.apps import apps
+from django.contrib.contenttypes.models import ContentType
+from django.core.management.base import BaseCommand
+
+from guardian.models import UserObjectPermission, GroupObjectPermission
+
+
+class Command(BaseCommand):
+    help = ('Removes the per-object guardian permission rows of wydatki models, '
+            'which are no longer needed with owner-based authorization')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='only report how many rows would be removed')
+
+    def handle(self, *args, **options):
+        content_types = ContentType.objects.get_for_models(*apps.get_app_config('wydatki').get_models()).values()
+        for model in (UserObjectPermission, GroupObjectPermission):
+            rows = model.objects.filter(content_type__in=content_types)
+            if options['dry_run']:
+                self.stdout.write('%s: %d rows to remove' % (model.__name__, rows.count()))
+            else:
+                deleted, _ = rows.delete()
+                self.stdout.write('%s: removed %d rows' % (model.__name__, deleted))
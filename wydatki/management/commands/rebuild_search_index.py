@@ -0,0 +1,20 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from wydatki.search import backend
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the search index of category, place and expense names'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help='username whose objects should be reindexed (default: all users)')
+
+    def handle(self, *args, **options):
+        owner = None
+        if options['user']:
+            try:
+                owner = User.objects.get(username=options['user'])
+            except User.DoesNotExist:
+                raise CommandError('User "%s" does not exist' % options['user'])
+        self.stdout.write('Indexed %d objects' % backend.rebuild(owner))
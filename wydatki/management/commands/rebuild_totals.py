@@ -0,0 +1,21 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from wydatki.aggregates import rebuild_totals, rebuild_pocket_spends
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the monthly expense, income and pocket totals from the transaction tables'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help='username whose totals should be rebuilt (default: all users)')
+
+    def handle(self, *args, **options):
+        owner = None
+        if options['user']:
+            try:
+                owner = User.objects.get(username=options['user'])
+            except User.DoesNotExist:
+                raise CommandError('User "%s" does not exist' % options['user'])
+        self.stdout.write('Rebuilt %d expense and %d income totals' % rebuild_totals(owner))
+        self.stdout.write('Rebuilt %d pocket spends' % rebuild_pocket_spends(owner))
@@ -0,0 +1,24 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from wydatki.aggregates import reconcile_pockets
+
+
+class Command(BaseCommand):
+    help = 'Checks pocket balances against the sums of their expenses'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help='username whose pockets should be checked (default: all users)')
+        parser.add_argument('--fix', action='store_true', help='correct the spent counters and funds')
+
+    def handle(self, *args, **options):
+        owner = None
+        if options['user']:
+            try:
+                owner = User.objects.get(username=options['user'])
+            except User.DoesNotExist:
+                raise CommandError('User "%s" does not exist' % options['user'])
+        mismatches = reconcile_pockets(owner, fix=options['fix'])
+        for pk, name, spent, actual in mismatches:
+            self.stdout.write('Pocket %d (%s): spent %s, expenses sum to %s' % (pk, name, spent, actual))
+        self.stdout.write('%d pockets %s' % (len(mismatches), 'fixed' if options['fix'] else 'out of balance'))
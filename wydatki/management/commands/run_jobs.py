@@ -0,0 +1,28 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from wydatki.jobs import work, worker_name
+
+
+class Command(BaseCommand):
+    help = 'Runs queued background jobs, runs until interrupted unless --once is given'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, default=5, help='seconds between polls')
+        parser.add_argument('--once', action='store_true', help='run the due jobs and exit')
+
+    def handle(self, *args, **options):
+        worker = worker_name()
+        while True:
+            done, failed = work(worker)
+            if done or failed or options['once']:
+                self.stdout.write('Ran %d jobs, %d failed' % (done + failed, failed))
+            if options['once']:
+                return
+            close_old_connections()
+            try:
+                time.sleep(options['interval'])
+            except KeyboardInterrupt:
+                return
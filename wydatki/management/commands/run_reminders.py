@@ -0,0 +1,33 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from wydatki.reminders import deliver_due
+
+
+class Command(BaseCommand):
+    help = 'Mails due reminders in batches, runs until interrupted unless --once is given'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--interval', type=float, default=60, help='seconds between polls')
+        parser.add_argument('--once', action='store_true', help='deliver what is due and exit')
+
+    def handle(self, *args, **options):
+        while True:
+            try:
+                sent, failed, expired = deliver_due(batch_size=options['batch_size'])
+            except Exception as e:
+                # What the batch sent is kept, the rest is retried on the next poll.
+                self.stderr.write('Delivery failed: %s' % e)
+                if options['once']:
+                    raise
+            else:
+                if sent or failed or expired or options['once']:
+                    self.stdout.write('Sent %d reminders, %d failed, %d expired' % (sent, failed, expired))
+            if options['once']:
+                return
+            try:
+                time.sleep(options['interval'])
+            except KeyboardInterrupt:
+                return
@@ -0,0 +1,90 @@
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.http import HttpResponse
+from django.core.exceptions import PermissionDenied
+
+# Upper bounds in seconds of the request duration histogram buckets.
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+class ViewStats(object):
+
+    def __init__(self):
+        self.requests = 0
+        self.buckets = [0] * len(BUCKETS)
+        self.seconds = 0.0
+        self.queries = 0
+        self.sql_seconds = 0.0
+        self.template_seconds = 0.0
+        self.statuses = defaultdict(int)
+
+
+class Registry(object):
+    """Per process request statistics by view, each worker process is scraped separately."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.views = defaultdict(ViewStats)
+
+    def observe(self, view, method, status, seconds, queries=0, sql_seconds=0.0, template_seconds=0.0):
+        with self.lock:
+            stats = self.views[view, method]
+            stats.requests += 1
+            stats.seconds += seconds
+            for i, bound in enumerate(BUCKETS):
+                if seconds <= bound:
+                    stats.buckets[i] += 1
+            stats.queries += queries
+            stats.sql_seconds += sql_seconds
+            stats.template_seconds += template_seconds
+            stats.statuses[status] += 1
+
+    def reset(self):
+        with self.lock:
+            self.views.clear()
+
+    def render(self):
+        """The statistics in the Prometheus text exposition format."""
+        lines = [
+            '# HELP wydatki_requests_total Requests by view, method and status.',
+            '# TYPE wydatki_requests_total counter',
+        ]
+        with self.lock:
+            views = sorted(self.views.items())
+            for (view, method), stats in views:
+                for status, count in sorted(stats.statuses.items()):
+                    lines.append('wydatki_requests_total{view="%s",method="%s",status="%s"} %d'
+                                 % (view, method, status, count))
+            lines += [
+                '# HELP wydatki_request_duration_seconds Wall time of the requests.',
+                '# TYPE wydatki_request_duration_seconds histogram',
+            ]
+            for (view, method), stats in views:
+                labels = 'view="%s",method="%s"' % (view, method)
+                for bound, count in zip(BUCKETS, stats.buckets):
+                    lines.append('wydatki_request_duration_seconds_bucket{%s,le="%s"} %d' % (labels, bound, count))
+                lines += [
+                    'wydatki_request_duration_seconds_bucket{%s,le="+Inf"} %d' % (labels, stats.requests),
+                    'wydatki_request_duration_seconds_sum{%s} %.6f' % (labels, stats.seconds),
+                    'wydatki_request_duration_seconds_count{%s} %d' % (labels, stats.requests),
+                ]
+            for name, attr, kind, help_text in (
+                    ('wydatki_sql_queries_total', 'queries', '%d', 'SQL queries run by the requests.'),
+                    ('wydatki_sql_seconds_total', 'sql_seconds', '%.6f', 'Time spent in SQL queries.'),
+                    ('wydatki_template_seconds_total', 'template_seconds', '%.6f', 'Time spent rendering templates.')):
+                lines += ['# HELP %s %s' % (name, help_text), '# TYPE %s counter' % name]
+                for (view, method), stats in views:
+                    lines.append(('%s{view="%s",method="%s"} ' + kind) % (name, view, method, getattr(stats, attr)))
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+
+def metrics_view(request):
+    # Scrapers connect from INTERNAL_IPS, staff can look at it from a browser.
+    if request.META.get('REMOTE_ADDR') not in settings.INTERNAL_IPS and not request.user.is_staff:
+        raise PermissionDenied
+    return HttpResponse(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
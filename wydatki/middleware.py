@@ -0,0 +1,86 @@
+import cProfile
+import logging
+import os
+import random
+import time
+
+from django.conf import settings
+from django.db import connections
+
+from .metrics import registry
+
+logger = logging.getLogger(__name__)
+
+
+class InstrumentationMiddleware(object):
+    """Records wall, SQL and template time of every request by view.
+
+    The numbers go to wydatki.metrics.registry and, with WYDATKI_SERVER_TIMING, to a Server-Timing
+    header. A request sent with "X-Profile: 1" by staff or from INTERNAL_IPS is profiled with cProfile
+    in WYDATKI_PROFILE_SAMPLE_RATE of the cases and the dump is written to WYDATKI_PROFILE_DIR.
+    Must come after AuthenticationMiddleware.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.view_name = 'unresolved'
+        request.template_seconds = 0.0
+        profiler = cProfile.Profile() if self.should_profile(request) else None
+
+        # Query logging is normally only on with DEBUG, a CaptureQueriesContext may already have it on.
+        databases = [(db, db.force_debug_cursor, len(db.queries_log)) for db in connections.all()]
+        for db, forced, logged in databases:
+            db.force_debug_cursor = True
+        start = time.perf_counter()
+        try:
+            response = profiler.runcall(self.get_response, request) if profiler else self.get_response(request)
+        finally:
+            seconds = time.perf_counter() - start
+            queries = []
+            for db, forced, logged in databases:
+                queries += list(db.queries_log)[logged:]
+                db.force_debug_cursor = forced
+                if not forced and not settings.DEBUG:
+                    db.queries_log.clear()
+        sql_seconds = sum(float(query['time']) for query in queries)
+
+        registry.observe(request.view_name, request.method, response.status_code, seconds, len(queries),
+                         sql_seconds, request.template_seconds)
+        if seconds > getattr(settings, 'WYDATKI_SLOW_REQUEST', 1.0):
+            logger.warning('Slow request %s %s (%s): %.3fs, %d queries in %.3fs', request.method, request.path,
+                           request.view_name, seconds, len(queries), sql_seconds)
+        if getattr(settings, 'WYDATKI_SERVER_TIMING', False):
+            response['Server-Timing'] = 'app;dur=%.1f, db;dur=%.1f;desc="%d queries", tpl;dur=%.1f' % (
+                seconds * 1000, sql_seconds * 1000, len(queries), request.template_seconds * 1000)
+        if profiler:
+            response['X-Profile'] = self.dump(profiler, request.view_name)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.view_name = request.resolver_match.view_name or 'unnamed'
+
+    def process_template_response(self, request, response):
+        # The response is rendered right after the template response middleware.
+        start = time.perf_counter()
+
+        def rendered(response):
+            request.template_seconds += time.perf_counter() - start
+
+        response.add_post_render_callback(rendered)
+        return response
+
+    def should_profile(self, request):
+        if not getattr(settings, 'WYDATKI_PROFILE_DIR', None) or request.META.get('HTTP_X_PROFILE') != '1':
+            return False
+        if request.META.get('REMOTE_ADDR') not in settings.INTERNAL_IPS and not request.user.is_staff:
+            return False
+        return random.random() < getattr(settings, 'WYDATKI_PROFILE_SAMPLE_RATE', 1.0)
+
+    def dump(self, profiler, view_name):
+        os.makedirs(settings.WYDATKI_PROFILE_DIR, exist_ok=True)
+        name = '%s-%d.prof' % (view_name.replace(':', '-'), time.time() * 1000000)
+        profiler.dump_stats(os.path.join(settings.WYDATKI_PROFILE_DIR, name))
+        logger.debug('Profile of %s written to %s', view_name, name)
+        return name
@@ -0,0 +1,173 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.7 on 2026-10-18 18:21
+from __future__ import unicode_literals
+
+import datetime
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Category',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=40)),
+                ('owner', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'permissions': (('view_category', 'View category'),),
+            },
+        ),
+        migrations.CreateModel(
+            name='Expense',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=40)),
+                ('exp_date', models.DateField(default=datetime.date.today)),
+                ('price', models.DecimalField(decimal_places=2, max_digits=9)),
+                ('category', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='wydatki.Category')),
+                ('owner', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'permissions': (('view_expense', 'View expense'),),
+            },
+        ),
+        migrations.CreateModel(
+            name='ExpenseTotal',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField()),
+                ('total', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('count', models.IntegerField(default=0)),
+                ('category', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='wydatki.Category')),
+                ('owner', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Income',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=40)),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=9)),
+                ('income_date', models.DateField(default=datetime.date.today)),
+                ('owner', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'permissions': (('view_income', 'View income'),),
+            },
+        ),
+        migrations.CreateModel(
+            name='IncomeSource',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=40)),
+                ('type_of_income', models.CharField(max_length=20)),
+                ('permanent', models.BooleanField()),
+                ('owner', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'permissions': (('view_incomesource', 'View income source'),),
+            },
+        ),
+        migrations.CreateModel(
+            name='IncomeTotal',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField()),
+                ('total', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('count', models.IntegerField(default=0)),
+                ('owner', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+                ('source', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='wydatki.IncomeSource')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Place',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=40)),
+                ('owner', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'permissions': (('view_place', 'View place'),),
+            },
+        ),
+        migrations.CreateModel(
+            name='Pocket',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=40)),
+                ('limit', models.DecimalField(decimal_places=2, max_digits=9)),
+                ('funds', models.DecimalField(decimal_places=2, max_digits=9)),
+                ('owner', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'permissions': (('view_pocket', 'View pocket'),),
+            },
+        ),
+        migrations.CreateModel(
+            name='Profile',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('picture', models.ImageField(default='wydatki/default.jpg', upload_to='profile_pictures')),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='user_profile', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Reminder',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=30)),
+                ('remind_date', models.DateField()),
+                ('as_before', models.DateField()),
+                ('message', models.CharField(max_length=100)),
+                ('importance', models.CharField(choices=[('BW', 'Bardzo ważny'), ('W', 'Ważny'), ('M', 'Mało ważny')], max_length=2)),
+                ('owner', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'permissions': (('view_reminder', 'View reminder'), ('update_reminder', 'Update reminder')),
+            },
+        ),
+        migrations.AddField(
+            model_name='income',
+            name='source',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='wydatki.IncomeSource'),
+        ),
+        migrations.AddField(
+            model_name='expensetotal',
+            name='pocket',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='wydatki.Pocket'),
+        ),
+        migrations.AddField(
+            model_name='expense',
+            name='place',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='wydatki.Place'),
+        ),
+        migrations.AddField(
+            model_name='expense',
+            name='pocket',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='wydatki.Pocket'),
+        ),
+        migrations.AddField(
+            model_name='expense',
+            name='reminder',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, to='wydatki.Reminder'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='incometotal',
+            unique_together=set([('owner', 'source', 'month')]),
+        ),
+        migrations.AlterUniqueTogether(
+            name='expensetotal',
+            unique_together=set([('owner', 'pocket', 'category', 'month')]),
+        ),
+    ]
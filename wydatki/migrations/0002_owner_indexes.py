@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.7 on 2026-10-18 18:21
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wydatki', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='category',
+            index=models.Index(fields=['owner', 'name'], name='category_owner_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='expense',
+            index=models.Index(fields=['owner', 'exp_date'], name='expense_owner_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='expense',
+            index=models.Index(fields=['owner', 'category', 'exp_date'], name='expense_owner_category_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='expense',
+            index=models.Index(fields=['owner', 'pocket', 'exp_date'], name='expense_owner_pocket_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='expense',
+            index=models.Index(fields=['owner', 'place', 'exp_date'], name='expense_owner_place_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='income',
+            index=models.Index(fields=['owner', 'income_date'], name='income_owner_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='income',
+            index=models.Index(fields=['owner', 'source', 'income_date'], name='income_owner_source_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='incomesource',
+            index=models.Index(fields=['owner', 'name'], name='incomesource_owner_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='place',
+            index=models.Index(fields=['owner', 'name'], name='place_owner_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pocket',
+            index=models.Index(fields=['owner', 'name'], name='pocket_owner_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='reminder',
+            index=models.Index(fields=['owner', 'remind_date'], name='reminder_owner_date_idx'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.7 on 2026-10-18 18:44
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+def compute_spent(apps, schema_editor):
+    Expense = apps.get_model('wydatki', 'Expense')
+    Pocket = apps.get_model('wydatki', 'Pocket')
+    # Existing funds are kept as entered, only the spent counter is backfilled.
+    for row in Expense.objects.order_by().values('pocket').annotate(spent=models.Sum('price')):
+        Pocket.objects.filter(pk=row['pocket']).update(spent=row['spent'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wydatki', '0003_place_price_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pocket',
+            name='spent',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=12),
+        ),
+        migrations.RunPython(compute_spent, migrations.RunPython.noop),
+    ]
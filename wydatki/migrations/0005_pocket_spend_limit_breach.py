@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.7 on 2026-10-18 18:46
+from __future__ import unicode_literals
+
+from django.conf import settings
+from collections import defaultdict
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def compute_pocket_spends(apps, schema_editor):
+    Expense = apps.get_model('wydatki', 'Expense')
+    PocketSpend = apps.get_model('wydatki', 'PocketSpend')
+    spends = defaultdict(lambda: [0, 0])
+    rows = Expense.objects.order_by().values('pocket', 'exp_date').annotate(
+        total=models.Sum('price'), rows=models.Count('id'))
+    for row in rows.iterator():
+        spend = spends[row['pocket'], row['exp_date'].replace(day=1)]
+        spend[0] += row['total']
+        spend[1] += row['rows']
+    PocketSpend.objects.bulk_create([
+        PocketSpend(pocket_id=pocket_id, month=month, total=total, count=count)
+        for (pocket_id, month), (total, count) in spends.items()
+    ], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('wydatki', '0004_pocket_spent'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LimitBreach',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField()),
+                ('limit', models.DecimalField(decimal_places=2, max_digits=9)),
+                ('spent', models.DecimalField(decimal_places=2, max_digits=14)),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('owner', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+                ('pocket', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='breaches', to='wydatki.Pocket')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='PocketSpend',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField()),
+                ('total', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('count', models.IntegerField(default=0)),
+                ('pocket', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='spends', to='wydatki.Pocket')),
+            ],
+        ),
+        migrations.AlterUniqueTogether(
+            name='pocketspend',
+            unique_together=set([('pocket', 'month')]),
+        ),
+        migrations.AddIndex(
+            model_name='limitbreach',
+            index=models.Index(fields=['pocket', 'month'], name='limitbreach_pocket_month_idx'),
+        ),
+        migrations.RunPython(compute_pocket_spends, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,29 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.7 on 2026-10-18 18:48
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wydatki', '0005_pocket_spend_limit_breach'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='reminder',
+            name='sent_at',
+            field=models.DateTimeField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='reminder',
+            name='status',
+            field=models.CharField(choices=[('N', 'Oczekuje'), ('S', 'Wysłano'), ('E', 'Po terminie')], default='N', editable=False, max_length=1),
+        ),
+        migrations.AddIndex(
+            model_name='reminder',
+            index=models.Index(fields=['status', 'remind_date', 'as_before'], name='reminder_due_idx'),
+        ),
+    ]
@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.7 on 2026-10-18 18:50
+from __future__ import unicode_literals
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('wydatki', '0006_reminder_delivery'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecurringExpense',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('frequency', models.CharField(blank=True, choices=[('', 'Brak'), ('W', 'Co tydzień'), ('M', 'Co miesiąc'), ('Y', 'Co rok')], default='', max_length=1)),
+                ('interval', models.PositiveSmallIntegerField(default=1)),
+                ('starts_on', models.DateField(blank=True, null=True)),
+                ('ends_on', models.DateField(blank=True, null=True)),
+                ('materialized_until', models.DateField(editable=False, null=True)),
+                ('name', models.CharField(max_length=40)),
+                ('price', models.DecimalField(decimal_places=2, max_digits=9)),
+                ('category', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='wydatki.Category')),
+                ('owner', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+                ('place', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='wydatki.Place')),
+                ('pocket', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='wydatki.Pocket')),
+            ],
+            options={
+                'permissions': (('view_recurringexpense', 'View recurring expense'),),
+            },
+        ),
+        migrations.AddField(
+            model_name='incomesource',
+            name='amount',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=9, null=True),
+        ),
+        migrations.AddField(
+            model_name='incomesource',
+            name='ends_on',
+            field=models.DateField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='incomesource',
+            name='frequency',
+            field=models.CharField(blank=True, choices=[('', 'Brak'), ('W', 'Co tydzień'), ('M', 'Co miesiąc'), ('Y', 'Co rok')], default='', max_length=1),
+        ),
+        migrations.AddField(
+            model_name='incomesource',
+            name='interval',
+            field=models.PositiveSmallIntegerField(default=1),
+        ),
+        migrations.AddField(
+            model_name='incomesource',
+            name='materialized_until',
+            field=models.DateField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='incomesource',
+            name='starts_on',
+            field=models.DateField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='recurringexpense',
+            index=models.Index(fields=['owner', 'name'], name='recurringexpense_owner_idx'),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.7 on 2026-10-18 20:12
+from __future__ import unicode_literals
+
+from django.db import migrations, OperationalError
+
+
+def create_search_table(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    try:
+        schema_editor.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS wydatki_search USING fts5("
+            "name, kind, owner, tokenize='unicode61 remove_diacritics 2', prefix='1 2 3')")
+    except OperationalError:
+        # SQLite built without FTS5, search falls back to scanning the tables.
+        return
+    for kind, code, table in (('category', 0, 'wydatki_category'), ('place', 1, 'wydatki_place'),
+                              ('expense', 2, 'wydatki_expense')):
+        schema_editor.execute(
+            "INSERT INTO wydatki_search (rowid, name, kind, owner) "
+            "SELECT id * 3 + %d, name, '%s', 'u' || owner_id FROM %s" % (code, kind, table))
+
+
+def drop_search_table(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute('DROP TABLE IF EXISTS wydatki_search')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wydatki', '0007_recurrence'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_table, drop_search_table),
+    ]
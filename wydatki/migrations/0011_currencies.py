@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.7 on 2026-10-18 19:42
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+def copy_amounts(apps, schema_editor):
+    # Everything stored so far is in the base currency.
+    apps.get_model('wydatki', 'Expense').objects.update(base_price=models.F('price'))
+    apps.get_model('wydatki', 'Income').objects.update(base_amount=models.F('amount'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wydatki', '0010_jobs'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExchangeRate',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('currency', models.CharField(choices=[('PLN', 'PLN'), ('EUR', 'EUR'), ('USD', 'USD')], max_length=3)),
+                ('day', models.DateField()),
+                ('rate', models.DecimalField(decimal_places=6, max_digits=12)),
+            ],
+        ),
+        migrations.RemoveIndex(
+            model_name='expense',
+            name='expense_place_price_idx',
+        ),
+        migrations.AddField(
+            model_name='expense',
+            name='base_price',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=12),
+        ),
+        migrations.AddField(
+            model_name='expense',
+            name='currency',
+            field=models.CharField(choices=[('PLN', 'PLN'), ('EUR', 'EUR'), ('USD', 'USD')], default='PLN', editable=False, max_length=3),
+        ),
+        migrations.AddField(
+            model_name='income',
+            name='base_amount',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=12),
+        ),
+        migrations.AddField(
+            model_name='income',
+            name='currency',
+            field=models.CharField(choices=[('PLN', 'PLN'), ('EUR', 'EUR'), ('USD', 'USD')], default='PLN', max_length=3),
+        ),
+        migrations.AddField(
+            model_name='incomesource',
+            name='currency',
+            field=models.CharField(choices=[('PLN', 'PLN'), ('EUR', 'EUR'), ('USD', 'USD')], default='PLN', max_length=3),
+        ),
+        migrations.AddField(
+            model_name='pocket',
+            name='currency',
+            field=models.CharField(choices=[('PLN', 'PLN'), ('EUR', 'EUR'), ('USD', 'USD')], default='PLN', max_length=3),
+        ),
+        migrations.RunPython(copy_amounts, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='expense',
+            index=models.Index(fields=['owner', 'place', 'exp_date', 'base_price'], name='expense_place_base_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='exchangerate',
+            unique_together=set([('currency', 'day')]),
+        ),
+    ]
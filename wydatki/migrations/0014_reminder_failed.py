@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.7 on 2026-10-18 20:24
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wydatki', '0013_recurrence_interval'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='reminder',
+            name='status',
+            field=models.CharField(choices=[('N', 'Oczekuje'), ('S', 'Wysłano'), ('E', 'Po terminie'), ('F', 'Nie doręczono')], default='N', editable=False, max_length=1),
+        ),
+    ]
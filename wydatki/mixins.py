@@ -0,0 +1,12 @@
+from django.contrib.auth.mixins import LoginRequiredMixin
+from django.core.exceptions import PermissionDenied
+
+
+class OwnerPermissionRequiredMixin(LoginRequiredMixin):
+    permission_required = None
+
+    def get_object(self, queryset=None):
+        obj = super(OwnerPermissionRequiredMixin, self).get_object(queryset)
+        if not self.request.user.has_perm(self.permission_required, obj):
+            raise PermissionDenied
+        return obj
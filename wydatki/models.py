@@ -1,17 +1,31 @@
+from collections import defaultdict
 from datetime import date
 
 from django.contrib.auth.models import User
-from django.db import models
+from django.core.exceptions import ValidationError
+from django.core.validators import MinValueValidator
+from django.db import models, connection, transaction, IntegrityError
+from django.db.models import F
 from django.urls import reverse, reverse_lazy
-from django.db.models.signals import post_save
+from django.utils import timezone
+from django.db.models.signals import pre_save, post_save, post_delete
 from django.dispatch import receiver
 
-from guardian.shortcuts import assign_perm
+from .cache import bump_version_on_commit
+from .signals import bulk_created
 
 
 # import logging
 # logging.basicConfig(level=logging.DEBUG)
 
+# Running totals and reports are kept in BASE_CURRENCY, see wydatki.rates.
+BASE_CURRENCY = 'PLN'
+CURRENCIES = (
+    ('PLN', 'PLN'),
+    ('EUR', 'EUR'),
+    ('USD', 'USD'),
+)
+
 
 class Profile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='user_profile')
@@ -26,6 +40,9 @@ class Category(models.Model):
         permissions = (
             ('view_category', 'View category'),
         )
+        indexes = [
+            models.Index(fields=['owner', 'name'], name='category_owner_name_idx'),
+        ]
 
 
 
@@ -42,11 +59,20 @@ class Reminder(models.Model):
         ('W', 'Ważny'),
         ('M', 'Mało ważny'),
     )
+    PENDING, SENT, EXPIRED, FAILED = 'N', 'S', 'E', 'F'
+    STATUSES = (
+        (PENDING, 'Oczekuje'),
+        (SENT, 'Wysłano'),
+        (EXPIRED, 'Po terminie'),
+        (FAILED, 'Nie doręczono'),
+    )
     name = models.CharField(max_length=30)
     remind_date = models.DateField()
     as_before= models.DateField()
     message= models.CharField(max_length=100)
     importance= models.CharField(max_length=2, choices=PRIORITIES)
+    status = models.CharField(max_length=1, choices=STATUSES, default=PENDING, editable=False)
+    sent_at = models.DateTimeField(null=True, editable=False)
     owner = models.ForeignKey(User, on_delete=models.CASCADE)
 
     class Meta:
@@ -54,6 +80,10 @@ class Reminder(models.Model):
             ('view_reminder', 'View reminder'),
             ('update_reminder', 'Update reminder'),
         )
+        indexes = [
+            models.Index(fields=['owner', 'remind_date'], name='reminder_owner_date_idx'),
+            models.Index(fields=['status', 'remind_date', 'as_before'], name='reminder_due_idx'),
+        ]
 
     def __str__(self):
         return self.name
@@ -62,16 +92,43 @@ class Reminder(models.Model):
         return reverse('reminder-detail', args=[str(self.pk)])
 
 
-class IncomeSource(models.Model):
+class Recurrence(models.Model):
+    """Repeats every `interval` weeks, months or years from starts_on, optionally until ends_on.
+
+    Occurrences up to materialized_until are stored rows, later ones are computed on read.
+    """
+    WEEKLY, MONTHLY, YEARLY = 'W', 'M', 'Y'
+    FREQUENCIES = (
+        ('', 'Brak'),
+        (WEEKLY, 'Co tydzień'),
+        (MONTHLY, 'Co miesiąc'),
+        (YEARLY, 'Co rok'),
+    )
+    frequency = models.CharField(max_length=1, choices=FREQUENCIES, blank=True, default='')
+    interval = models.PositiveSmallIntegerField(default=1, validators=[MinValueValidator(1)])
+    starts_on = models.DateField(null=True, blank=True)
+    ends_on = models.DateField(null=True, blank=True)
+    materialized_until = models.DateField(null=True, editable=False)
+
+    class Meta:
+        abstract = True
+
+
+class IncomeSource(Recurrence):
     name = models.CharField(max_length=40)
     type_of_income = models.CharField(max_length=20)
     permanent = models.BooleanField()
+    amount = models.DecimalField(max_digits=9, decimal_places=2, null=True, blank=True)
+    currency = models.CharField(max_length=3, choices=CURRENCIES, default=BASE_CURRENCY)
     owner = models.ForeignKey(User, on_delete=models.CASCADE)
 
     class Meta:
         permissions = (
             ('view_incomesource', 'View income source'),
         )
+        indexes = [
+            models.Index(fields=['owner', 'name'], name='incomesource_owner_name_idx'),
+        ]
 
     def __str__(self):
         return self.name + ' - ' + self.type_of_income
@@ -84,6 +141,9 @@ class Income(models.Model):
     name = models.CharField(max_length=40)
     source = models.ForeignKey(IncomeSource, on_delete=models.CASCADE)
     amount = models.DecimalField(max_digits=9, decimal_places=2)
+    currency = models.CharField(max_length=3, choices=CURRENCIES, default=BASE_CURRENCY)
+    # The amount in BASE_CURRENCY at the rate of income_date.
+    base_amount = models.DecimalField(max_digits=12, decimal_places=2, default=0, editable=False)
     income_date = models.DateField(default=date.today)
     owner = models.ForeignKey(User, on_delete=models.CASCADE)
 
@@ -91,6 +151,11 @@ class Income(models.Model):
         permissions = (
             ('view_income', 'View income'),
         )
+        indexes = [
+            models.Index(fields=['owner', 'income_date'], name='income_owner_date_idx'),
+            models.Index(fields=['owner', 'source', 'income_date'], name='income_owner_source_idx'),
+            models.Index(fields=['owner', 'amount'], name='income_owner_amount_idx'),
+        ]
 
     def __str__(self):
         return self.name
@@ -99,17 +164,27 @@ class Income(models.Model):
     def get_absolute_url(self):
         return reverse('income-detail', args=[str(self.pk)])
 
+    def save(self, *args, **kwargs):
+        with transaction.atomic():
+            super(Income, self).save(*args, **kwargs)
+
 
 class Pocket(models.Model):
     name = models.CharField(max_length=40)
     limit = models.DecimalField(max_digits=9, decimal_places=2)
     funds= models.DecimalField(max_digits=9, decimal_places=2)
+    spent = models.DecimalField(max_digits=12, decimal_places=2, default=0, editable=False)
+    # Funds, limit, spent and the prices of the pocket's expenses are in this currency.
+    currency = models.CharField(max_length=3, choices=CURRENCIES, default=BASE_CURRENCY)
     owner = models.ForeignKey(User, on_delete=models.CASCADE)
 
     class Meta:
         permissions = (
             ('view_pocket', 'View pocket'),
         )
+        indexes = [
+            models.Index(fields=['owner', 'name'], name='pocket_owner_name_idx'),
+        ]
 
     def __str__(self):
         return self.name
@@ -117,6 +192,40 @@ class Pocket(models.Model):
     def get_absolute_url(self):
         return reverse('pocket-detail', args=[str(self.pk)])
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        pocket = super(Pocket, cls).from_db(db, field_names, values)
+        if 'funds' in field_names:
+            pocket._loaded_funds = pocket.funds
+        return pocket
+
+    def refresh_from_db(self, using=None, fields=None):
+        super(Pocket, self).refresh_from_db(using, fields)
+        if fields is None or 'funds' in fields:
+            self._loaded_funds = self.funds
+
+    def save(self, *args, **kwargs):
+        """Updates of a loaded pocket leave spent alone and apply the edit of funds as a difference, so
+        charge_pocket() updates made since the pocket was read are kept."""
+        loaded_funds = getattr(self, '_loaded_funds', None)
+        if self._state.adding or loaded_funds is None or kwargs.get('update_fields') is not None:
+            return super(Pocket, self).save(*args, **kwargs)
+        with transaction.atomic():
+            super(Pocket, self).save(*args, update_fields=['name', 'limit', 'currency', 'owner'], **kwargs)
+            if self.funds != loaded_funds:
+                Pocket.objects.filter(pk=self.pk).update(funds=F('funds') + (self.funds - loaded_funds))
+            self.funds, self.spent = Pocket.objects.filter(pk=self.pk).values_list('funds', 'spent').get()
+            self._loaded_funds = self.funds
+
+    def has_transactions(self):
+        return bool(self.pk) and (Expense.objects.filter(owner=self.owner_id, pocket=self.pk).exists() or
+                                  RecurringExpense.objects.filter(pocket=self.pk).exists())
+
+    def clean(self):
+        if self.pk and self.has_transactions() and \
+                Pocket.objects.filter(pk=self.pk).exclude(currency=self.currency).exists():
+            raise ValidationError({'currency': 'Nie można zmienić waluty portfela, który ma wydatki'})
+
 class Place(models.Model):
     name= models.CharField(max_length=40)
     owner = models.ForeignKey(User, on_delete=models.CASCADE)
@@ -125,6 +234,9 @@ class Place(models.Model):
         permissions = (
             ('view_place', 'View place'),
         )
+        indexes = [
+            models.Index(fields=['owner', 'name'], name='place_owner_name_idx'),
+        ]
 
     def __str__(self):
         return self.name
@@ -138,6 +250,10 @@ class Expense(models.Model):
     exp_date = models.DateField(default=date.today)
     category = models.ForeignKey(Category, on_delete=models.CASCADE)
     price = models.DecimalField(max_digits=9, decimal_places=2)
+    # Always the currency of the pocket, copied on save.
+    currency = models.CharField(max_length=3, choices=CURRENCIES, default=BASE_CURRENCY, editable=False)
+    # The price in BASE_CURRENCY at the rate of exp_date.
+    base_price = models.DecimalField(max_digits=12, decimal_places=2, default=0, editable=False)
     pocket = models.ForeignKey(Pocket, on_delete=models.CASCADE)
     place = models.ForeignKey(Place, on_delete=models.CASCADE)
     reminder = models.ForeignKey(Reminder, on_delete=models.CASCADE, null=True)
@@ -147,6 +263,13 @@ class Expense(models.Model):
         permissions = (
             ('view_expense', 'View expense'),
         )
+        indexes = [
+            models.Index(fields=['owner', 'exp_date'], name='expense_owner_date_idx'),
+            models.Index(fields=['owner', 'category', 'exp_date'], name='expense_owner_category_idx'),
+            models.Index(fields=['owner', 'pocket', 'exp_date'], name='expense_owner_pocket_idx'),
+            models.Index(fields=['owner', 'place', 'exp_date', 'base_price'], name='expense_place_base_idx'),
+            models.Index(fields=['owner', 'price'], name='expense_owner_price_idx'),
+        ]
 
     def __str__(self):
         return self.name
@@ -154,56 +277,308 @@ class Expense(models.Model):
     def get_absolute_url(self):
         return reverse('expense-detail', args=[str(self.pk)])
 
+    def save(self, *args, **kwargs):
+        # Keeps the running totals and pocket balance updates in the same transaction.
+        with transaction.atomic():
+            super(Expense, self).save(*args, **kwargs)
+
+
+class RecurringExpense(Recurrence):
+    name = models.CharField(max_length=40)
+    category = models.ForeignKey(Category, on_delete=models.CASCADE)
+    price = models.DecimalField(max_digits=9, decimal_places=2)
+    pocket = models.ForeignKey(Pocket, on_delete=models.CASCADE)
+    place = models.ForeignKey(Place, on_delete=models.CASCADE)
+    owner = models.ForeignKey(User, on_delete=models.CASCADE)
+
+    class Meta:
+        permissions = (
+            ('view_recurringexpense', 'View recurring expense'),
+        )
+        indexes = [
+            models.Index(fields=['owner', 'name'], name='recurringexpense_owner_idx'),
+        ]
+
+    def __str__(self):
+        return self.name
+
+
+def supports_upsert():
+    if connection.vendor == 'sqlite':
+        return connection.Database.sqlite_version_info >= (3, 24)
+    return connection.vendor == 'postgresql' and connection.pg_version >= 90500
+
+
+class RunningTotal(models.Model):
+    month = models.DateField()
+    total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        abstract = True
+
+    @classmethod
+    def add(cls, amount, count, **key):
+        key['month'] = key['month'].replace(day=1)
+        changes = {'total': F('total') + amount, 'count': F('count') + count}
+        if cls.objects.filter(**key).update(**changes) or count <= 0:
+            return
+        try:
+            with transaction.atomic():
+                cls.objects.create(total=amount, count=count, **key)
+        except IntegrityError:
+            cls.objects.filter(**key).update(**changes)
+
+    @classmethod
+    def add_many(cls, deltas):
+        """Applies {(key_fields values, first day of month): [amount, count]} in one batched upsert."""
+        if not supports_upsert():
+            attnames = [cls._meta.get_field(field).attname for field in cls.key_fields]
+            for key, (amount, count) in deltas.items():
+                cls.add(amount, count, **dict(zip(attnames, key)))
+            return
+        quote = connection.ops.quote_name
+        table = quote(cls._meta.db_table)
+        columns = [quote(cls._meta.get_field(field).column) for field in cls.key_fields]
+        sql = ('INSERT INTO {table} ({columns}, total, {count}) VALUES ({values}) ON CONFLICT ({columns}) '
+               'DO UPDATE SET total = {table}.total + excluded.total, {count} = {table}.{count} + excluded.{count}'
+               ).format(table=table, columns=', '.join(columns), count=quote('count'),
+                        values=', '.join(['%s'] * (len(columns) + 2)))
+        params = [key + (amount, count) for key, (amount, count) in deltas.items()]
+        with connection.cursor() as cursor:
+            cursor.executemany(sql, params)
+
+
+class ExpenseTotal(RunningTotal):
+    owner = models.ForeignKey(User, on_delete=models.CASCADE)
+    pocket = models.ForeignKey(Pocket, on_delete=models.CASCADE)
+    category = models.ForeignKey(Category, on_delete=models.CASCADE)
+
+    key_fields = ('owner', 'pocket', 'category', 'month')
+
+    class Meta:
+        unique_together = ('owner', 'pocket', 'category', 'month')
+
+
+class IncomeTotal(RunningTotal):
+    owner = models.ForeignKey(User, on_delete=models.CASCADE)
+    source = models.ForeignKey(IncomeSource, on_delete=models.CASCADE)
+
+    key_fields = ('owner', 'source', 'month')
+
+    class Meta:
+        unique_together = ('owner', 'source', 'month')
+
+
+class PocketSpend(RunningTotal):
+    """Per pocket, per month spending counter the pocket limit is checked against."""
+    pocket = models.ForeignKey(Pocket, on_delete=models.CASCADE, related_name='spends')
 
+    key_fields = ('pocket', 'month')
+
+    class Meta:
+        unique_together = ('pocket', 'month')
+
+
+class LimitBreach(models.Model):
+    pocket = models.ForeignKey(Pocket, on_delete=models.CASCADE, related_name='breaches')
+    owner = models.ForeignKey(User, on_delete=models.CASCADE)
+    month = models.DateField()
+    limit = models.DecimalField(max_digits=9, decimal_places=2)
+    spent = models.DecimalField(max_digits=14, decimal_places=2)
+    created = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['pocket', 'month'], name='limitbreach_pocket_month_idx'),
+        ]
+
+    def __str__(self):
+        return '%s %s' % (self.pocket_id, self.month.strftime('%Y-%m'))
+
+
+class ExchangeRate(models.Model):
+    """Value of one unit of ``currency`` in BASE_CURRENCY on ``day``, loaded by `manage.py load_rates`."""
+    currency = models.CharField(max_length=3, choices=CURRENCIES)
+    day = models.DateField()
+    rate = models.DecimalField(max_digits=12, decimal_places=6)
+
+    class Meta:
+        unique_together = ('currency', 'day')
+
+    def __str__(self):
+        return '%s %s %s' % (self.currency, self.day, self.rate)
+
+
+class Job(models.Model):
+    """Background work run by `manage.py run_jobs`, see wydatki.jobs."""
+    PENDING, RUNNING, DONE, FAILED = 'P', 'R', 'D', 'F'
+    STATUSES = (
+        (PENDING, 'Oczekuje'),
+        (RUNNING, 'W toku'),
+        (DONE, 'Zakończone'),
+        (FAILED, 'Błąd'),
+    )
+    kind = models.CharField(max_length=40)
+    # JSON encoded keyword arguments of the handler.
+    payload = models.TextField(default='{}')
+    # Kept when the owner is deleted, the account deletion job outlives its owner.
+    owner = models.ForeignKey(User, null=True, blank=True, on_delete=models.SET_NULL)
+    status = models.CharField(max_length=1, choices=STATUSES, default=PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField(default=3)
+    run_after = models.DateTimeField(default=timezone.now)
+    locked_by = models.CharField(max_length=100, blank=True)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    progress = models.PositiveIntegerField(default=0)
+    total = models.PositiveIntegerField(null=True, blank=True)
+    error = models.TextField(blank=True)
+    # JSON encoded return value of a wydatki.tasks pool task.
+    result = models.TextField(blank=True)
+    created = models.DateTimeField(auto_now_add=True)
+    finished = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'run_after'], name='job_status_run_after_idx'),
+        ]
+
+    def __str__(self):
+        return '%s #%s (%s)' % (self.kind, self.pk, self.get_status_display())
+
+
+def add_expense_to_totals(expense, sign):
+    ExpenseTotal.add(sign * expense['base_price'], sign, owner_id=expense['owner'], pocket_id=expense['pocket'],
+                     category_id=expense['category'], month=expense['exp_date'])
+
+
+def charge_pocket(pocket_id, amount):
+    if amount:
+        Pocket.objects.filter(pk=pocket_id).update(funds=F('funds') - amount, spent=F('spent') + amount)
+
+
+def add_pocket_spends(deltas):
+    """Applies {(pocket_id, first day of month): [amount, count]} and records the limits crossed by it."""
+    deltas = {key: delta for key, delta in deltas.items() if any(delta)}
+    if not deltas:
+        return
+    if len(deltas) == 1:
+        ((pocket_id, month), (amount, count)), = deltas.items()
+        PocketSpend.add(amount, count, pocket_id=pocket_id, month=month)
+    else:
+        PocketSpend.add_many(deltas)
+    for (pocket_id, month), (amount, count) in deltas.items():
+        if amount > 0:
+            check_limit(pocket_id, month, amount)
+
+
+def check_limit(pocket_id, month, amount):
+    row = PocketSpend.objects.filter(pocket_id=pocket_id, month=month).values_list(
+        'total', 'pocket__limit', 'pocket__owner').first()
+    if row is None:
+        return
+    total, limit, owner_id = row
+    # A zero limit means the pocket has no limit set.
+    if 0 < limit < total and total - amount <= limit:
+        LimitBreach.objects.create(pocket_id=pocket_id, owner_id=owner_id, month=month, limit=limit, spent=total)
+
+
+def add_income_to_totals(income, sign):
+    IncomeTotal.add(sign * income['base_amount'], sign, owner_id=income['owner'], source_id=income['source'],
+                    month=income['income_date'])
+
+
+def expense_values(expense):
+    return {'owner': expense.owner_id, 'pocket': expense.pocket_id, 'category': expense.category_id,
+            'exp_date': expense.exp_date, 'price': expense.price, 'base_price': expense.base_price}
+
+
+def income_values(income):
+    return {'owner': income.owner_id, 'source': income.source_id, 'income_date': income.income_date,
+            'amount': income.amount, 'base_amount': income.base_amount}
+
+
+@receiver(pre_save, sender=Expense)
+def expense_pre_save(sender, instance, **kwargs):
+    instance._previous = None
+    if instance.pk:
+        instance._previous = Expense.objects.select_for_update().filter(pk=instance.pk).values(
+            'owner', 'pocket', 'category', 'exp_date', 'price', 'base_price').first()
 
 @receiver(post_save, sender=Expense)
 def expense_post_save(sender, **kwargs):
-    expense, user = kwargs['instance'], kwargs['instance'].owner
-    assign_perm('view_expense', user, expense)
-    assign_perm('change_expense', user, expense)
-    assign_perm('delete_expense', user, expense)
-
-@receiver(post_save, sender=Category)
-def category_post_save(sender, **kwargs):
-    category, user = kwargs['instance'], kwargs['instance'].owner
-    assign_perm('view_category', user, category)
-    assign_perm('change_category', user, category)
-    assign_perm('delete_category', user, category)
-
-@receiver(post_save, sender=Reminder)
-def reminder_post_save(sender, **kwargs):
-    reminder, user = kwargs['instance'], kwargs['instance'].owner
-    assign_perm('view_reminder', user, reminder)
-    assign_perm('change_reminder', user, reminder)
-    assign_perm('delete_reminder', user, reminder)
-
-@receiver(post_save, sender=IncomeSource)
-def income_source_post_save(sender, **kwargs):
-    income_source, user = kwargs['instance'], kwargs['instance'].owner
-    assign_perm('view_incomesource', user, income_source)
-    assign_perm('change_incomesource', user, income_source)
-    assign_perm('delete_incomesource', user, income_source)
+    expense, previous = kwargs['instance'], getattr(kwargs['instance'], '_previous', None)
+    if previous:
+        add_expense_to_totals(previous, -1)
+    add_expense_to_totals(expense_values(expense), 1)
+    if previous and previous['pocket'] == expense.pocket_id:
+        charge_pocket(expense.pocket_id, expense.price - previous['price'])
+    else:
+        if previous:
+            charge_pocket(previous['pocket'], -previous['price'])
+        charge_pocket(expense.pocket_id, expense.price)
+    spends = defaultdict(lambda: [0, 0])
+    if previous:
+        spend = spends[previous['pocket'], previous['exp_date'].replace(day=1)]
+        spend[0] -= previous['price']
+        spend[1] -= 1
+    spend = spends[expense.pocket_id, expense.exp_date.replace(day=1)]
+    spend[0] += expense.price
+    spend[1] += 1
+    add_pocket_spends(spends)
+
+@receiver(post_delete, sender=Expense)
+def expense_post_delete(sender, instance, **kwargs):
+    add_expense_to_totals(expense_values(instance), -1)
+    charge_pocket(instance.pocket_id, -instance.price)
+    add_pocket_spends({(instance.pocket_id, instance.exp_date.replace(day=1)): [-instance.price, -1]})
+
+@receiver(bulk_created, sender=Expense)
+def expense_bulk_created(sender, instances, **kwargs):
+    # Running totals are in the base currency, pocket balances and spends in the pocket's.
+    deltas, spends = defaultdict(lambda: [0, 0]), defaultdict(lambda: [0, 0])
+    for expense in instances:
+        month = expense.exp_date.replace(day=1)
+        delta = deltas[expense.owner_id, expense.pocket_id, expense.category_id, month]
+        delta[0] += expense.base_price
+        delta[1] += 1
+        spend = spends[expense.pocket_id, month]
+        spend[0] += expense.price
+        spend[1] += 1
+    ExpenseTotal.add_many(deltas)
+    charges = defaultdict(int)
+    for (pocket_id, month), (amount, count) in spends.items():
+        charges[pocket_id] += amount
+    for pocket_id, amount in charges.items():
+        charge_pocket(pocket_id, amount)
+    add_pocket_spends(spends)
+
+@receiver(pre_save, sender=Income)
+def income_pre_save(sender, instance, **kwargs):
+    instance._previous = None
+    if instance.pk:
+        instance._previous = Income.objects.select_for_update().filter(pk=instance.pk).values(
+            'owner', 'source', 'income_date', 'amount', 'base_amount').first()
 
 @receiver(post_save, sender=Income)
 def income_post_save(sender, **kwargs):
-    income, user = kwargs['instance'], kwargs['instance'].owner
-    assign_perm('view_income', user, income)
-    assign_perm('change_income', user, income)
-    assign_perm('delete_income', user, income)
-
-@receiver(post_save, sender=Pocket)
-def pocket_post_save(sender, **kwargs):
-    pocket, user = kwargs['instance'], kwargs['instance'].owner
-    assign_perm('view_pocket', user, pocket)
-    assign_perm('change_pocket', user, pocket)
-    assign_perm('delete_pocket', user, pocket)
-
-@receiver(post_save, sender=Place)
-def place_post_save(sender, **kwargs):
-    place, user = kwargs['instance'], kwargs['instance'].owner
-    assign_perm('view_place', user, place)
-    assign_perm('change_place', user, place)
-    assign_perm('delete_place', user, place)
+    income = kwargs['instance']
+    if getattr(income, '_previous', None):
+        add_income_to_totals(income._previous, -1)
+    add_income_to_totals(income_values(income), 1)
+
+@receiver(post_delete, sender=Income)
+def income_post_delete(sender, instance, **kwargs):
+    add_income_to_totals(income_values(instance), -1)
+
+@receiver(bulk_created, sender=Income)
+def income_bulk_created(sender, instances, **kwargs):
+    deltas = defaultdict(lambda: [0, 0])
+    for income in instances:
+        delta = deltas[income.owner_id, income.source_id, income.income_date.replace(day=1)]
+        delta[0] += income.base_amount
+        delta[1] += 1
+    IncomeTotal.add_many(deltas)
 
 @receiver(post_save, sender=User)
 def create_user_profile(sender, instance, created, **kwargs):
@@ -213,3 +588,24 @@ def create_user_profile(sender, instance, created, **kwargs):
 @receiver(post_save, sender=User)
 def save_user_profile(sender, instance, **kwargs):
     instance.user_profile.save()
+
+
+def bump_data_version(sender, instance=None, instances=(), **kwargs):
+    for owner_id in {obj.owner_id for obj in instances} if instances else [instance.owner_id]:
+        bump_version_on_commit(owner_id)
+
+for model in (Expense, Income, Category, Pocket, Place, IncomeSource, Reminder, RecurringExpense):
+    post_save.connect(bump_data_version, sender=model, dispatch_uid='bump_data_version')
+    post_delete.connect(bump_data_version, sender=model, dispatch_uid='bump_data_version')
+    bulk_created.connect(bump_data_version, sender=model, dispatch_uid='bump_data_version')
+
+
+def bump_choices_version(sender, instance=None, instances=(), **kwargs):
+    # Form choice lists only change with the models offered as choices, not with every expense.
+    for owner_id in {obj.owner_id for obj in instances} if instances else [instance.owner_id]:
+        bump_version_on_commit(owner_id, 'choices')
+
+for model in (Category, Pocket, Place, IncomeSource):
+    post_save.connect(bump_choices_version, sender=model, dispatch_uid='bump_choices_version')
+    post_delete.connect(bump_choices_version, sender=model, dispatch_uid='bump_choices_version')
+    bulk_created.connect(bump_choices_version, sender=model, dispatch_uid='bump_choices_version')
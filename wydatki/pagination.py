@@ -0,0 +1,105 @@
+from django.core import signing
+from django.db.models import Q
+from django.http import Http404
+
+
+class InvalidCursor(Exception):
+    pass
+
+
+def seek_filter(ordering, values, forward=True):
+    """Q selecting the rows after (or before) ``values`` in ``ordering``, e.g. ('exp_date', 'id')."""
+    condition, equal = Q(), {}
+    for field, value in zip(ordering, values):
+        name = field.lstrip('-')
+        after = field.startswith('-') != forward
+        condition |= Q(**equal) & Q(**{'%s__%s' % (name, 'gt' if after else 'lt'): value})
+        equal[name] = value
+    return condition
+
+
+class KeysetPage(object):
+
+    def __init__(self, object_list, next_cursor, previous_cursor):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class KeysetPaginator(object):
+    """Seek pagination over a unique, non-null ``ordering``; page N costs the same as page 1."""
+    salt = 'wydatki.pagination'
+
+    def __init__(self, queryset, ordering, per_page, count=None):
+        self.queryset = queryset.order_by(*ordering)
+        self.ordering = ordering
+        self.per_page = per_page
+        self._count = count
+
+    @property
+    def count(self):
+        if callable(self._count):
+            self._count = self._count()
+        return self._count
+
+    def encode(self, obj, forward):
+        get = obj.get if isinstance(obj, dict) else lambda name: getattr(obj, name)
+        values = [str(get(field.lstrip('-'))) for field in self.ordering]
+        return signing.dumps([forward, values], salt=self.salt, compress=True)
+
+    def decode(self, cursor):
+        try:
+            forward, values = signing.loads(cursor, salt=self.salt)
+            fields = [self.queryset.model._meta.get_field(field.lstrip('-')) for field in self.ordering]
+            return forward, [field.to_python(value) for field, value in zip(fields, values)]
+        except Exception:
+            raise InvalidCursor(cursor)
+
+    def page(self, cursor=None):
+        forward, queryset = True, self.queryset
+        if cursor:
+            forward, values = self.decode(cursor)
+            queryset = queryset.filter(seek_filter(self.ordering, values, forward))
+        if not forward:
+            queryset = queryset.reverse()
+        rows = list(queryset[:self.per_page + 1])
+        more, rows = len(rows) > self.per_page, rows[:self.per_page]
+        if not forward:
+            rows.reverse()
+
+        # Coming from a cursor means there is a page in the opposite direction.
+        has_next, has_previous = (more, bool(cursor)) if forward else (True, more)
+        next_cursor = self.encode(rows[-1], True) if rows and has_next else None
+        previous_cursor = self.encode(rows[0], False) if rows and has_previous else None
+        return KeysetPage(rows, next_cursor, previous_cursor)
+
+
+class KeysetPaginationMixin(object):
+    keyset_ordering = None
+    cursor_kwarg = 'cursor'
+
+    def get_approximate_count(self):
+        return None
+
+    def paginate_queryset(self, queryset, page_size):
+        paginator = KeysetPaginator(queryset, self.keyset_ordering, page_size, count=self.get_approximate_count)
+        try:
+            page = paginator.page(self.request.GET.get(self.cursor_kwarg))
+        except InvalidCursor:
+            raise Http404('Invalid cursor')
+        return paginator, page, page.object_list, page.has_other_pages()
@@ -0,0 +1,166 @@
+import time
+from bisect import bisect_right
+from collections import defaultdict
+from decimal import Decimal, ROUND_HALF_UP
+
+from django.db import connection, transaction
+from django.db.models import Min
+from django.db.models.signals import pre_save
+from django.dispatch import receiver
+
+from wydatki.aggregates import rebuild_totals
+from wydatki.cache import data_version, bump_version
+from wydatki.models import BASE_CURRENCY, CURRENCIES, Expense, Income, IncomeSource, Pocket, ExchangeRate
+from wydatki.signals import bulk_creating
+
+ONE, CENT = Decimal(1), Decimal('0.01')
+# Rates are shared by all owners, their version is kept under this owner id.
+RATES_OWNER = 'all'
+# Models with a BASE_CURRENCY copy of their amount: (date field, amount field, base amount field).
+CONVERTED = {
+    Expense: ('exp_date', 'price', 'base_price'),
+    Income: ('income_date', 'amount', 'base_amount'),
+}
+
+
+class MissingRate(ValueError):
+    pass
+
+
+class RateCache(object):
+    """All exchange rates held in memory, so a conversion is a bisect instead of a query.
+
+    The rates are reloaded when store_rates() bumps their version, which is checked at most
+    every ``interval`` seconds.
+    """
+
+    def __init__(self, interval=1.0):
+        self.interval = interval
+        self.checked = None
+        self.version = None
+        self.days, self.rates = {}, {}
+
+    def refresh(self, force=False):
+        now = time.monotonic()
+        if not force and self.checked is not None and now - self.checked < self.interval:
+            return
+        self.checked = now
+        version = data_version(RATES_OWNER, 'rates')
+        if version == self.version:
+            return
+        days, rates = defaultdict(list), defaultdict(list)
+        for currency, day, rate in ExchangeRate.objects.order_by('currency', 'day').values_list(
+                'currency', 'day', 'rate').iterator():
+            days[currency].append(day)
+            rates[currency].append(rate)
+        self.days, self.rates, self.version = dict(days), dict(rates), version
+
+    def rate(self, currency, day):
+        """Rate of the latest day on or before ``day``, raises MissingRate when there is none."""
+        if currency == BASE_CURRENCY:
+            return ONE
+        self.refresh()
+        i = bisect_right(self.days.get(currency, ()), day)
+        if not i:
+            raise MissingRate('Brak kursu %s z dnia %s lub wcześniejszego' % (currency, day))
+        return self.rates[currency][i - 1]
+
+    def to_base(self, amount, currency, day):
+        return (amount * self.rate(currency, day)).quantize(CENT, ROUND_HALF_UP)
+
+
+rate_cache = RateCache()
+to_base = rate_cache.to_base
+
+
+@receiver(bulk_creating, sender=Expense)
+def convert_expenses(sender, instances, **kwargs):
+    """Copies the pocket currency to the expenses and converts their prices, one query for all of them."""
+    currencies = dict(Pocket.objects.filter(pk__in={expense.pocket_id for expense in instances}).values_list(
+        'pk', 'currency'))
+    for expense in instances:
+        expense.currency = currencies[expense.pocket_id]
+        expense.base_price = to_base(expense.price, expense.currency, expense.exp_date)
+
+
+@receiver(bulk_creating, sender=Income)
+def convert_incomes(sender, instances, **kwargs):
+    for income in instances:
+        income.base_amount = to_base(income.amount, income.currency, income.income_date)
+
+
+@receiver(pre_save, sender=Expense)
+def convert_expense(sender, instance, **kwargs):
+    convert_expenses(sender, [instance])
+
+
+@receiver(pre_save, sender=Income)
+def convert_income(sender, instance, **kwargs):
+    convert_incomes(sender, [instance])
+
+
+def convert_stored(model, currency, date_from=None, owner=None):
+    """Converts the stored amounts of the model's rows in ``currency`` dated ``date_from`` or later again,
+    with one UPDATE joined to the rates table, and returns the number of updated rows.
+
+    Rows dated before the first rate of the currency are left as they are.
+    """
+    date_field, amount_field, base_field = CONVERTED[model]
+    quote = connection.ops.quote_name
+    table, rates = quote(model._meta.db_table), quote(ExchangeRate._meta.db_table)
+    if currency == BASE_CURRENCY:
+        sql, params = 'UPDATE {table} SET {base} = {amount} WHERE currency = %s', [currency]
+    else:
+        first = ExchangeRate.objects.filter(currency=currency).aggregate(first=Min('day'))['first']
+        if first is None:
+            return 0
+        sql = ('UPDATE {table} SET {base} = ROUND({amount} * ('
+               'SELECT {rates}.rate FROM {rates} WHERE {rates}.currency = {table}.currency '
+               'AND {rates}.day <= {table}.{date} ORDER BY {rates}.day DESC LIMIT 1), 2) '
+               'WHERE currency = %s AND {date} >= %s')
+        params = [currency, max(date_from or first, first)]
+    if owner is not None:
+        sql += ' AND owner_id = %s'
+        params.append(getattr(owner, 'pk', owner))
+    sql = sql.format(table=table, rates=rates, base=quote(base_field), amount=quote(amount_field),
+                     date=quote(date_field))
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.rowcount
+
+
+def store_rates(rows, batch_size=500):
+    """Saves (currency, day, rate) rows over the rates stored for the same days, converts the amounts
+    they change again and rebuilds the running totals of their owners, ``batch_size`` owners at a time.
+    Cached data is dropped for them and for owners of pockets and income sources in the currencies, whose
+    forecasts convert at the latest rate. Returns {currency: rates stored}.
+    """
+    by_currency = defaultdict(dict)
+    for currency, day, rate in rows:
+        if currency not in dict(CURRENCIES) or currency == BASE_CURRENCY:
+            raise ValueError('Unsupported currency %r' % currency)
+        by_currency[currency][day] = rate
+
+    owners = set()
+    with transaction.atomic():
+        for currency, rates in by_currency.items():
+            days = sorted(rates)
+            for start in range(0, len(days), batch_size):
+                ExchangeRate.objects.filter(currency=currency, day__in=days[start:start + batch_size]).delete()
+            ExchangeRate.objects.bulk_create([ExchangeRate(currency=currency, day=day, rate=rates[day])
+                                              for day in days], batch_size)
+            for model, (date_field, amount_field, base_field) in CONVERTED.items():
+                affected = model.objects.filter(currency=currency, **{date_field + '__gte': days[0]})
+                owners.update(affected.order_by().values_list('owner', flat=True).distinct())
+                convert_stored(model, currency, days[0])
+        rebuilt = sorted(owners)
+        for start in range(0, len(rebuilt), batch_size):
+            rebuild_totals(owners=rebuilt[start:start + batch_size])
+    bump_version(RATES_OWNER, 'rates')
+    rate_cache.refresh(force=True)
+    for model in (Pocket, IncomeSource):
+        owners.update(model.objects.filter(currency__in=list(by_currency)).order_by().values_list(
+            'owner', flat=True).distinct())
+    for owner_id in owners:
+        bump_version(owner_id)
+    return {currency: len(rates) for currency, rates in by_currency.items()}
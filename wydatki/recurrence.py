@@ -0,0 +1,120 @@
+from calendar import monthrange
+from datetime import date, timedelta
+
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from wydatki.models import Recurrence, IncomeSource, Income, RecurringExpense, Expense
+from wydatki.signals import bulk_create
+
+STEP_MONTHS = {Recurrence.MONTHLY: 1, Recurrence.YEARLY: 12}
+
+
+def add_months(day, months):
+    month = day.month - 1 + months
+    year, month = day.year + month // 12, month % 12 + 1
+    return day.replace(year=year, month=month, day=min(day.day, monthrange(year, month)[1]))
+
+
+def nth_occurrence(rule, n):
+    # Always counted from starts_on, so a rule starting on the 31st stays on the last day of shorter months.
+    if rule.frequency == Recurrence.WEEKLY:
+        return rule.starts_on + timedelta(weeks=n * rule.interval)
+    return add_months(rule.starts_on, n * rule.interval * STEP_MONTHS[rule.frequency])
+
+
+def first_index(rule, date_from):
+    if date_from is None or date_from <= rule.starts_on:
+        return 0
+    if rule.frequency == Recurrence.WEEKLY:
+        return (date_from - rule.starts_on).days // (7 * rule.interval)
+    months = (date_from.year - rule.starts_on.year) * 12 + date_from.month - rule.starts_on.month
+    return months // (rule.interval * STEP_MONTHS[rule.frequency])
+
+
+def occurrences(rule, date_from=None, date_to=None):
+    """Lazily yields the rule's dates in [date_from, date_to], endless when neither date_to nor ends_on is set."""
+    # An interval of 0 would repeat starts_on forever, rules saved before it was validated yield nothing.
+    if not rule.frequency or rule.starts_on is None or rule.interval < 1:
+        return
+    last = min(day for day in (date_to, rule.ends_on, date.max) if day is not None)
+    n = first_index(rule, date_from)
+    while True:
+        try:
+            day = nth_occurrence(rule, n)
+        except (ValueError, OverflowError):
+            return
+        if day > last:
+            return
+        if date_from is None or day >= date_from:
+            yield day
+        n += 1
+
+
+def pending_from(rule, date_from):
+    """The first date not yet materialized for the rule, no earlier than date_from."""
+    if rule.materialized_until is None:
+        return date_from
+    return max(date_from, rule.materialized_until + timedelta(days=1))
+
+
+def build_income(source, day):
+    return Income(name=source.name, source=source, amount=source.amount, currency=source.currency, income_date=day,
+                  owner_id=source.owner_id)
+
+
+def build_expense(rule, day):
+    return Expense(name=rule.name, exp_date=day, price=rule.price, category_id=rule.category_id,
+                   pocket_id=rule.pocket_id, place_id=rule.place_id, owner_id=rule.owner_id)
+
+
+RULES = (
+    (Income, IncomeSource.objects.filter(amount__isnull=False), build_income),
+    (Expense, RecurringExpense.objects.all(), build_expense),
+)
+
+
+def projected(owner, date_from, date_to, models=(Income, Expense)):
+    """Yields unsaved incomes and expenses the owner's rules produce in [date_from, date_to].
+
+    Only dates after materialized_until are projected, earlier ones are already stored.
+    """
+    for model, rules, build in RULES:
+        if model not in models:
+            continue
+        for rule in rules.filter(owner=owner).exclude(frequency='').filter(starts_on__lte=date_to):
+            for day in occurrences(rule, pending_from(rule, date_from), date_to):
+                yield build(rule, day)
+
+
+def materialize(today=None, batch_size=1000):
+    """Stores the occurrences of all rules up to today, returns the number of rows created.
+
+    Each rule is advanced in its own transaction with materialized_until, so repeated runs never duplicate rows.
+    """
+    today = today or timezone.localdate()
+    created = 0
+    for model, rules, build in RULES:
+        due = rules.exclude(frequency='').filter(starts_on__lte=today).filter(
+            Q(materialized_until__isnull=True) | Q(materialized_until__lt=today))
+        for pk in due.values_list('pk', flat=True).iterator():
+            with transaction.atomic():
+                rule = rules.select_for_update().get(pk=pk)
+                if rule.materialized_until is not None and rule.materialized_until >= today:
+                    continue
+                objects = []
+                for day in occurrences(rule, pending_from(rule, rule.starts_on), today):
+                    objects.append(build(rule, day))
+                    if len(objects) >= batch_size:
+                        created += flush(objects)
+                        objects = []
+                created += flush(objects)
+                rules.filter(pk=pk).update(materialized_until=today)
+    return created
+
+
+def flush(objects):
+    if not objects:
+        return 0
+    return len(bulk_create(type(objects[0]), objects))
@@ -0,0 +1,86 @@
+import logging
+import smtplib
+
+from django.core.mail import EmailMessage, get_connection
+from django.db import connection, transaction
+from django.utils import timezone
+
+from wydatki.models import Reminder
+
+logger = logging.getLogger(__name__)
+
+
+def due_reminders(today):
+    """Pending reminders whose date has come, read through the (status, remind_date, as_before) index."""
+    reminders = Reminder.objects.filter(status=Reminder.PENDING, remind_date__lte=today)
+    if connection.features.has_select_for_update_skip_locked:
+        reminders = reminders.select_for_update(skip_locked=True)
+    return reminders.select_related('owner').only(
+        'name', 'remind_date', 'as_before', 'message', 'importance', 'owner__email'
+    ).order_by('remind_date', 'as_before', 'id')
+
+
+def build_message(reminder):
+    return EmailMessage(
+        subject='Przypomnienie: %s (%s)' % (reminder.name, reminder.get_importance_display()),
+        body='%s\n\nTermin: %s' % (reminder.message, reminder.as_before),
+        to=[reminder.owner.email],
+    )
+
+
+def is_permanent(error):
+    """Whether retrying the send can't help, e.g. the server refused the recipient's address."""
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return True
+    return isinstance(error, smtplib.SMTPResponseException) and error.smtp_code >= 500
+
+
+def deliver_batch(today=None, batch_size=500, mail_connection=None):
+    """Sends one batch of due reminders, returns (sent, failed, expired).
+
+    Each reminder is mailed on its own and marked right after its send, the marks commit with the
+    batch. A permanent error marks the reminder failed and the batch goes on, any other error commits
+    what was sent so far and is raised, the rest of the batch is retried on the next run. Delivery is
+    at least once: when the process dies or the commit fails after mail went out, the retry mails
+    those reminders again. Reminders past their as_before date are not sent.
+    """
+    today = today or timezone.localdate()
+    mail_connection = mail_connection or get_connection()
+    sent = failed = 0
+    error = None
+    with transaction.atomic():
+        batch = list(due_reminders(today)[:batch_size])
+        expired = [reminder.pk for reminder in batch if reminder.as_before < today]
+        Reminder.objects.filter(pk__in=expired).update(status=Reminder.EXPIRED)
+        for reminder in batch:
+            if reminder.as_before < today:
+                continue
+            # Owners without an email address have nowhere to be notified, their reminders are closed as sent.
+            if reminder.owner.email:
+                try:
+                    mail_connection.send_messages([build_message(reminder)])
+                except Exception as e:
+                    if not is_permanent(e):
+                        error = e
+                        break
+                    logger.warning('Reminder %s not delivered: %s', reminder.pk, e)
+                    Reminder.objects.filter(pk=reminder.pk).update(status=Reminder.FAILED)
+                    failed += 1
+                    continue
+            Reminder.objects.filter(pk=reminder.pk).update(status=Reminder.SENT, sent_at=timezone.now())
+            sent += 1
+    if error is not None:
+        raise error
+    return sent, failed, len(expired)
+
+
+def deliver_due(today=None, batch_size=500):
+    """Delivers batches until no due reminder is left, returns (sent, failed, expired)."""
+    mail_connection = get_connection()
+    totals = [0, 0, 0]
+    with mail_connection:
+        while True:
+            counts = deliver_batch(today, batch_size, mail_connection)
+            totals = [total + count for total, count in zip(totals, counts)]
+            if sum(counts) < batch_size:
+                return tuple(totals)
@@ -0,0 +1,123 @@
+from collections import OrderedDict
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db.models import Q, Sum
+from django.db.models.functions import TruncMonth
+
+from wydatki.aggregates import expense_totals_queryset
+from wydatki.models import BASE_CURRENCY, Category, Pocket, Place, Expense, ExpenseTotal
+from wydatki.recurrence import add_months
+
+ZERO = Decimal('0.00')
+
+
+def month_range(first, last):
+    months, month = [], first
+    while month <= last:
+        months.append(month)
+        month = month.replace(year=month.year + month.month // 12, month=month.month % 12 + 1)
+    return months
+
+
+def moving_average(values, window):
+    averages, running = [], ZERO
+    for i, value in enumerate(values):
+        running += value
+        if i >= window:
+            running -= values[i - window]
+        averages.append((running / min(i + 1, window)).quantize(ZERO))
+    return averages
+
+
+def deltas(values):
+    return [None] + [current - previous for previous, current in zip(values, values[1:])]
+
+
+class SpendingReport(object):
+    """Month x category and month x pocket pivots built from the monthly totals table.
+
+    Pivots and the monthly series have month granularity. Whole months of the date range are read from
+    the totals table, the months it starts or ends inside of from the expenses, so they only count the
+    days in range. All amounts are in BASE_CURRENCY, converted when the expenses were stored.
+    """
+
+    def __init__(self, owner, date_from=None, date_to=None, category=None, pocket=None, top_places=10, window=3):
+        self.owner = owner
+        self.date_from, self.date_to = date_from, date_to
+        self.category, self.pocket = category, pocket
+        self.top_places = top_places
+        self.window = window
+
+    def get_totals(self):
+        totals = ExpenseTotal.objects.filter(owner=self.owner, count__gt=0)
+        expenses = Expense.objects.filter(owner=self.owner)
+        partial = set()
+        if self.date_from:
+            totals = totals.filter(month__gte=self.date_from.replace(day=1))
+            expenses = expenses.filter(exp_date__gte=self.date_from)
+            if self.date_from.day > 1:
+                partial.add(self.date_from.replace(day=1))
+        if self.date_to:
+            totals = totals.filter(month__lte=self.date_to)
+            expenses = expenses.filter(exp_date__lte=self.date_to)
+            if (self.date_to + timedelta(days=1)).day > 1:
+                partial.add(self.date_to.replace(day=1))
+        if self.category is not None:
+            totals = totals.filter(category=self.category)
+            expenses = expenses.filter(category=self.category)
+        if self.pocket is not None:
+            totals = totals.filter(pocket=self.pocket)
+            expenses = expenses.filter(pocket=self.pocket)
+        rows = list(totals.exclude(month__in=partial).values_list('month', 'category', 'pocket', 'total'))
+        if partial:
+            # Ranges over exp_date rather than a filter on the truncated month, so the index is used.
+            ranges = Q()
+            for month in partial:
+                ranges |= Q(exp_date__gte=month, exp_date__lt=add_months(month, 1))
+            edges = expenses.filter(ranges).order_by().annotate(month=TruncMonth('exp_date'))
+            rows += edges.values('month', 'category', 'pocket').annotate(total=Sum('base_price')).values_list(
+                'month', 'category', 'pocket', 'total')
+        return rows
+
+    def get_top_places(self):
+        rows = expense_totals_queryset(self.owner, 'place', self.date_from, self.date_to, self.pocket)
+        if self.category is not None:
+            rows = rows.filter(category=self.category)
+        rows = list(rows.order_by('-total', 'place')[:self.top_places])
+        names = dict(Place.objects.filter(pk__in=[row['place'] for row in rows]).values_list('pk', 'name'))
+        return [{'id': row['place'], 'name': names.get(row['place']), 'total': row['total']} for row in rows]
+
+    def pivot(self, months, months_column, keys_column, values, model):
+        index = {month: i for i, month in enumerate(months)}
+        columns = OrderedDict()
+        for month, key, total in zip(months_column, keys_column, values):
+            columns.setdefault(key, [ZERO] * len(months))[index[month]] += total
+        names = dict(model.objects.filter(owner=self.owner, pk__in=columns).values_list('pk', 'name'))
+        return sorted(({'id': key, 'name': names.get(key), 'totals': totals} for key, totals in columns.items()),
+                      key=lambda row: row['name'] or '')
+
+    def build(self):
+        rows = list(self.get_totals())
+        if rows:
+            months_column, categories_column, pockets_column, values = zip(*rows)
+            months = month_range(min(months_column), max(months_column))
+        else:
+            months_column = categories_column = pockets_column = values = ()
+            months = []
+
+        monthly = [ZERO] * len(months)
+        index = {month: i for i, month in enumerate(months)}
+        for month, total in zip(months_column, values):
+            monthly[index[month]] += total
+
+        return {
+            'currency': BASE_CURRENCY,
+            'months': [month.strftime('%Y-%m') for month in months],
+            'categories': self.pivot(months, months_column, categories_column, values, Category),
+            'pockets': self.pivot(months, months_column, pockets_column, values, Pocket),
+            'monthly_totals': monthly,
+            'moving_average': moving_average(monthly, self.window),
+            'month_over_month': deltas(monthly),
+            'top_places': self.get_top_places(),
+        }
@@ -0,0 +1,147 @@
+import re
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models.signals import post_save, post_delete
+from django.utils.functional import SimpleLazyObject
+from django.utils.module_loading import import_string
+
+from wydatki.models import Expense, Place, Category
+from wydatki.signals import bulk_created
+
+# Indexed models by kind, the kind is also the lowest digits of the index rowid.
+KINDS = OrderedDict([
+    ('category', Category),
+    ('place', Place),
+    ('expense', Expense),
+])
+KIND_CODES = {kind: code for code, kind in enumerate(KINDS)}
+WORD = re.compile(r'\w+', re.UNICODE)
+
+
+def kind_of(model):
+    for kind, kind_model in KINDS.items():
+        if kind_model is model:
+            return kind
+
+
+class SearchBackend(object):
+    """Finds the owner's categories, places and expenses by name, words are matched as prefixes."""
+
+    def index(self, objects):
+        pass
+
+    def remove(self, objects):
+        pass
+
+    def rebuild(self, owner=None):
+        return 0
+
+    def search(self, owner, query, limit=10):
+        """Returns {kind: [(id, name), ...]} with the newest matches of each kind first."""
+        raise NotImplementedError
+
+
+class DatabaseSearchBackend(SearchBackend):
+    """Searches the model tables directly, needs no index but scans the owner's rows."""
+
+    def search(self, owner, query, limit=10):
+        words = WORD.findall(query)
+        results = OrderedDict()
+        for kind, model in KINDS.items():
+            rows = model.objects.filter(owner=owner)
+            for word in words:
+                rows = rows.filter(name__icontains=word)
+            results[kind] = list(rows.order_by('-pk').values_list('pk', 'name')[:limit]) if words else []
+        return results
+
+
+class SQLiteFTSBackend(SearchBackend):
+    """SQLite FTS5 index, owner and kind are indexed tokens so a query only walks the owner's postings."""
+    table = 'wydatki_search'
+
+    def rowid(self, kind, pk):
+        return pk * len(KINDS) + KIND_CODES[kind]
+
+    def rows(self, kind, objects):
+        return [(self.rowid(kind, obj.pk), obj.name, kind, 'u%d' % obj.owner_id) for obj in objects]
+
+    def index(self, objects):
+        if objects:
+            with connection.cursor() as cursor:
+                cursor.executemany('INSERT OR REPLACE INTO %s (rowid, name, kind, owner) VALUES (%%s, %%s, %%s, %%s)'
+                                   % self.table, self.rows(kind_of(type(objects[0])), objects))
+
+    def remove(self, objects):
+        if objects:
+            kind = kind_of(type(objects[0]))
+            with connection.cursor() as cursor:
+                cursor.executemany('DELETE FROM %s WHERE rowid = %%s' % self.table,
+                                   [(self.rowid(kind, obj.pk),) for obj in objects])
+
+    def rebuild(self, owner=None):
+        indexed = 0
+        with transaction.atomic(), connection.cursor() as cursor:
+            if owner is None:
+                cursor.execute('DELETE FROM %s' % self.table)
+            else:
+                cursor.execute('DELETE FROM %s WHERE %s MATCH %%s' % (self.table, self.table),
+                               ['owner:u%d' % owner.pk])
+            for kind, model in KINDS.items():
+                sql = ("INSERT INTO %s (rowid, name, kind, owner) "
+                       "SELECT id * %d + %d, name, %%s, 'u' || owner_id FROM %s") % (
+                    self.table, len(KINDS), KIND_CODES[kind], model._meta.db_table)
+                params = [kind]
+                if owner is not None:
+                    sql += ' WHERE owner_id = %s'
+                    params.append(owner.pk)
+                cursor.execute(sql, params)
+                indexed += cursor.rowcount
+        return indexed
+
+    def match(self, owner, kind, words):
+        terms = ' AND '.join('"%s"*' % word for word in words)
+        return 'owner:u%d AND kind:%s AND name:(%s)' % (owner.pk, kind, terms)
+
+    def search(self, owner, query, limit=10):
+        words = WORD.findall(query)
+        results = OrderedDict((kind, []) for kind in KINDS)
+        if not words:
+            return results
+        with connection.cursor() as cursor:
+            for kind in KINDS:
+                cursor.execute('SELECT rowid, name FROM %s WHERE %s MATCH %%s ORDER BY rowid DESC LIMIT %%s'
+                               % (self.table, self.table), [self.match(owner, kind, words), limit])
+                results[kind] = [(rowid // len(KINDS), name) for rowid, name in cursor.fetchall()]
+        return results
+
+
+def get_backend():
+    path = getattr(settings, 'WYDATKI_SEARCH_BACKEND', None)
+    if path is None:
+        # The FTS5 table is only created on SQLite builds that have the extension.
+        fts = connection.vendor == 'sqlite' and SQLiteFTSBackend.table in connection.introspection.table_names()
+        path = 'wydatki.search.SQLiteFTSBackend' if fts else 'wydatki.search.DatabaseSearchBackend'
+    return import_string(path)()
+
+
+backend = SimpleLazyObject(get_backend)
+
+
+def index_saved(sender, instance, **kwargs):
+    backend.index([instance])
+
+
+def index_created(sender, instances, **kwargs):
+    backend.index(instances)
+
+
+def remove_deleted(sender, instance, **kwargs):
+    backend.remove([instance])
+
+
+for model in KINDS.values():
+    post_save.connect(index_saved, sender=model, dispatch_uid='search_index')
+    bulk_created.connect(index_created, sender=model, dispatch_uid='search_index')
+    post_delete.connect(remove_deleted, sender=model, dispatch_uid='search_index')
@@ -0,0 +1,21 @@
+from django.db import connection, transaction
+from django.dispatch import Signal
+
+# Sent before and after QuerySet.bulk_create(), which skips pre_save and post_save, with the instances.
+bulk_creating = Signal(providing_args=['instances'])
+bulk_created = Signal(providing_args=['instances'])
+
+
+def bulk_create(model, objects, batch_size=None):
+    """bulk_create() between bulk_creating and bulk_created, with primary keys set on the instances."""
+    with transaction.atomic():
+        bulk_creating.send(sender=model, instances=objects)
+        model.objects.bulk_create(objects, batch_size)
+        if objects and objects[0].pk is None and connection.vendor == 'sqlite':
+            # SQLite does not return the new ids, but it holds the write lock until commit,
+            # so the newest rows are the ones just inserted, in insertion order.
+            pks = model.objects.order_by('-pk').values_list('pk', flat=True)[:len(objects)]
+            for obj, pk in zip(objects, reversed(list(pks))):
+                obj.pk = pk
+        bulk_created.send(sender=model, instances=objects)
+    return objects
@@ -0,0 +1,118 @@
+import random
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.db import transaction
+
+from wydatki.aggregates import rebuild_totals, rebuild_pocket_spends, reconcile_pockets
+from wydatki.cache import bump_version
+from wydatki.models import (BASE_CURRENCY, Expense, Category, Pocket, Place, Reminder, Income, IncomeSource,
+                            RecurringExpense, ExchangeRate)
+from wydatki.rates import RATES_OWNER, convert_stored
+from wydatki.search import backend as search_backend
+
+# Category name, typical price and the expense names used for it.
+CATEGORIES = (
+    ('Jedzenie', 40, ('Zakupy spożywcze', 'Piekarnia', 'Warzywa', 'Obiad', 'Kawa')),
+    ('Transport', 60, ('Paliwo', 'Bilet miesięczny', 'Taksówka', 'Parking')),
+    ('Mieszkanie', 900, ('Czynsz', 'Prąd', 'Gaz', 'Internet', 'Woda')),
+    ('Zdrowie', 80, ('Apteka', 'Lekarz', 'Dentysta')),
+    ('Rozrywka', 50, ('Kino', 'Koncert', 'Książka', 'Gra')),
+    ('Ubrania', 150, ('Buty', 'Kurtka', 'Koszula')),
+    ('Dom', 120, ('Środki czystości', 'Naczynia', 'Narzędzia')),
+    ('Edukacja', 200, ('Kurs', 'Podręcznik', 'Szkolenie')),
+    ('Prezenty', 100, ('Prezent urodzinowy', 'Kwiaty')),
+    ('Podróże', 400, ('Hotel', 'Bilet lotniczy', 'Wycieczka')),
+)
+POCKETS = (('Portfel', 'PLN'), ('Konto osobiste', 'PLN'), ('Karta kredytowa', 'PLN'), ('Oszczędności', 'PLN'),
+           ('Konto w euro', 'EUR'), ('Konto w dolarach', 'USD'))
+# Starting rates of the random walk the missing daily rates are generated with.
+RATES = {'EUR': 4.3, 'USD': 3.9}
+PLACE_WORDS = ('Sklep', 'Market', 'Apteka', 'Stacja', 'Restauracja', 'Kawiarnia', 'Salon', 'Bar', 'Kiosk')
+PLACE_NAMES = ('Pod Lipami', 'Centrum', 'Osiedlowy', 'Stary Rynek', 'Nowy', 'Rogatka', 'Zielony', 'Przystań')
+INCOME_SOURCES = (('Pensja', 'etat', 6500), ('Zlecenia', 'umowa zlecenie', 1200), ('Odsetki', 'lokata', 40))
+
+
+def create_rates(first_day, last_day, rand):
+    """Fills the days without a rate between first_day and last_day, returns the number of rates created."""
+    rates = []
+    for currency, rate in sorted(RATES.items()):
+        existing = set(ExchangeRate.objects.filter(currency=currency, day__gte=first_day, day__lte=last_day)
+                       .values_list('day', flat=True))
+        for i in range((last_day - first_day).days + 1):
+            rate *= 1 + rand.gauss(0, 0.004)
+            day = first_day + timedelta(days=i)
+            if day not in existing:
+                rates.append(ExchangeRate(currency=currency, day=day, rate=Decimal('%.6f' % rate)))
+    ExchangeRate.objects.bulk_create(rates, batch_size=500)
+    bump_version(RATES_OWNER, 'rates')
+    return len(rates)
+
+
+def create_user(username, expenses, incomes, years=5, places=60, batch_size=10000, seed=None, stdout=None):
+    """Creates a user with a realistic budget: categories, pockets in several currencies, places and
+    ``expenses`` expenses and ``incomes`` incomes spread over the last ``years`` years.
+
+    Rows are written with plain bulk inserts, the base currency prices, running totals, pocket balances
+    and search index are computed once at the end.
+    """
+    rand = random.Random(seed)
+    today = date.today()
+    first_day = today - timedelta(days=365 * years)
+    days = (today - first_day).days
+
+    create_rates(first_day, today, rand)
+    with transaction.atomic():
+        user = User.objects.create_user(username, password=username)
+        categories = [Category.objects.create(name=name, owner=user) for name, price, names in CATEGORIES]
+        pockets = [Pocket.objects.create(name=name, currency=currency, limit=0, funds=100000, owner=user)
+                   for name, currency in POCKETS]
+        Place.objects.bulk_create([
+            Place(name='%s %s %d' % (rand.choice(PLACE_WORDS), rand.choice(PLACE_NAMES), i + 1), owner=user)
+            for i in range(places)])
+        place_ids = list(Place.objects.filter(owner=user).values_list('pk', flat=True))
+        sources = [IncomeSource.objects.create(name=name, type_of_income=kind, permanent=True, amount=amount,
+                                               frequency=IncomeSource.MONTHLY, starts_on=first_day,
+                                               materialized_until=today, owner=user)
+                   for name, kind, amount in INCOME_SOURCES]
+        for i in range(10):
+            remind_date = today + timedelta(days=rand.randint(1, 60))
+            Reminder.objects.create(name='Rachunek %d' % (i + 1), remind_date=remind_date,
+                                    as_before=remind_date - timedelta(days=3), message='Zapłać rachunek',
+                                    importance=rand.choice(Reminder.PRIORITIES)[0], owner=user)
+        RecurringExpense.objects.create(name='Czynsz', category=categories[2], price=900, pocket=pockets[1],
+                                        place_id=place_ids[0], frequency=RecurringExpense.MONTHLY,
+                                        starts_on=first_day, materialized_until=today, owner=user)
+
+    def expense(i):
+        category = rand.randrange(len(CATEGORIES))
+        name, price, names = CATEGORIES[category]
+        pocket = rand.choice(pockets)
+        price = Decimal('%.2f' % (rand.lognormvariate(0, 0.6) * price / RATES.get(pocket.currency, 1)))
+        return Expense(name=rand.choice(names), exp_date=first_day + timedelta(days=rand.randrange(days)),
+                       category=categories[category], pocket=pocket, place_id=rand.choice(place_ids),
+                       price=price, currency=pocket.currency, base_price=price, owner=user)
+
+    def income(i):
+        source = rand.choice(sources)
+        amount = Decimal('%.2f' % (rand.uniform(0.8, 1.2) * float(source.amount)))
+        return Income(name=source.name, source=source, income_date=first_day + timedelta(days=rand.randrange(days)),
+                      amount=amount, currency=BASE_CURRENCY, base_amount=amount, owner=user)
+
+    for model, count, build in ((Expense, expenses, expense), (Income, incomes, income)):
+        for start in range(0, count, batch_size):
+            with transaction.atomic():
+                model.objects.bulk_create([build(i) for i in range(start, min(start + batch_size, count))])
+            if stdout:
+                stdout.write('%s: %d/%d %s' % (username, min(start + batch_size, count), count,
+                                               model._meta.verbose_name_plural))
+
+    for currency in RATES:
+        convert_stored(Expense, currency, owner=user)
+    rebuild_totals(user)
+    rebuild_pocket_spends(user)
+    reconcile_pockets(user, fix=True)
+    search_backend.rebuild(user)
+    bump_version(user.pk)
+    return user
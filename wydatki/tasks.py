@@ -0,0 +1,148 @@
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connections
+from django.utils import timezone
+
+from wydatki.jobs import worker_name
+from wydatki.models import Job
+
+logger = logging.getLogger(__name__)
+
+# The state of a task is a Job row of kind TASK_PREFIX + kind, shared by all processes. Workers of
+# run_jobs only claim the kinds in wydatki.jobs.HANDLERS, so they leave these rows alone.
+TASK_PREFIX = 'task:'
+# How long the state of a task and its result file are kept.
+TASK_TIMEOUT = 24 * 3600
+FINISHED = ('done', 'failed')
+STATUSES = {Job.PENDING: 'pending', Job.RUNNING: 'running', Job.DONE: 'done', Job.FAILED: 'failed'}
+
+
+class QueueFull(Exception):
+    pass
+
+
+class TaskLost(Exception):
+    """The state of a submitted task is gone, e.g. removed by remove_expired."""
+
+
+def get(task_id, owner=None):
+    """State of the task, None when it is unknown, expired or belongs to someone else than ``owner``."""
+    job = Job.objects.filter(pk=task_id, kind__startswith=TASK_PREFIX).first()
+    if job is None or (owner is not None and job.owner_id != owner.pk):
+        return None
+    return {'id': job.pk, 'owner_id': job.owner_id, 'kind': job.kind[len(TASK_PREFIX):],
+            'status': STATUSES[job.status], 'done': job.progress, 'total': job.total,
+            'result': json.loads(job.result) if job.result else None, 'error': job.error or None}
+
+
+def _update(task_id, **changes):
+    Job.objects.filter(pk=task_id).update(**changes)
+
+
+def result_path(name):
+    return os.path.join(settings.WYDATKI_TASK_DIR, name)
+
+
+def remove_expired():
+    """Deletes the state of tasks and the result files older than TASK_TIMEOUT."""
+    Job.objects.filter(kind__startswith=TASK_PREFIX,
+                       created__lt=timezone.now() - timedelta(seconds=TASK_TIMEOUT)).delete()
+    if not os.path.isdir(settings.WYDATKI_TASK_DIR):
+        return
+    expired = time.time() - TASK_TIMEOUT
+    for name in os.listdir(settings.WYDATKI_TASK_DIR):
+        path = result_path(name)
+        if os.path.getmtime(path) < expired:
+            os.remove(path)
+
+
+class Progress(object):
+    """Passed to the task function as its first argument, stores how far it got at most every ``interval`` s."""
+
+    def __init__(self, task_id, interval=0.5):
+        self.task_id = task_id
+        self.interval = interval
+        self.last = 0.0
+
+    def __call__(self, done, total=None):
+        now = time.monotonic()
+        if now - self.last >= self.interval:
+            self.last = now
+            _update(self.task_id, progress=done, total=total, locked_at=timezone.now())
+
+
+class TaskPool(object):
+    """Runs slow work (exports, reports, imports) on WYDATKI_TASK_WORKERS threads of each process.
+
+    At most WYDATKI_TASK_QUEUE tasks run or wait at a time, submit() raises QueueFull above that, so
+    heavy requests can't take the threads serving the rest of the site. The state of a task is kept
+    in the Job table, so the browser can poll it from any process. With WYDATKI_TASKS_EAGER the work
+    runs in the submitting thread, tests need it since the pool threads have their own database connections.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.executor = None
+        self.pending = 0
+
+    def submit(self, owner, kind, func, *args):
+        """Runs func(progress, *args) in the background and returns the task id."""
+        eager = getattr(settings, 'WYDATKI_TASKS_EAGER', False)
+        if not eager:
+            with self.lock:
+                if self.pending >= settings.WYDATKI_TASK_QUEUE:
+                    raise QueueFull
+                self.pending += 1
+                if self.executor is None:
+                    self.executor = ThreadPoolExecutor(settings.WYDATKI_TASK_WORKERS, thread_name_prefix='wydatki-task')
+        try:
+            task_id = Job.objects.create(kind=TASK_PREFIX + kind, owner=owner, max_attempts=1).pk
+        except Exception:
+            if not eager:
+                with self.lock:
+                    self.pending -= 1
+            raise
+        if eager:
+            self.run(task_id, func, args)
+        else:
+            self.executor.submit(self.run_pooled, task_id, func, args)
+        return task_id
+
+    def run(self, task_id, func, args):
+        _update(task_id, status=Job.RUNNING, attempts=1, locked_by=worker_name(), locked_at=timezone.now())
+        try:
+            result = func(Progress(task_id), *args)
+        except Exception as e:
+            logger.exception('Task %s failed', task_id)
+            _update(task_id, status=Job.FAILED, error=str(e), finished=timezone.now())
+        else:
+            _update(task_id, status=Job.DONE, result=json.dumps(result, cls=DjangoJSONEncoder),
+                    finished=timezone.now())
+
+    def run_pooled(self, task_id, func, args):
+        try:
+            self.run(task_id, func, args)
+        finally:
+            connections.close_all()
+            with self.lock:
+                self.pending -= 1
+
+    def wait(self, task_id, timeout):
+        """State of the task once it finished or ``timeout`` seconds passed."""
+        deadline = time.monotonic() + timeout
+        while True:
+            state = get(task_id)
+            if state is None or state['status'] in FINISHED or time.monotonic() >= deadline:
+                return state
+            time.sleep(0.1)
+
+
+pool = TaskPool()
@@ -1,3 +1,1351 @@
-from django.test import TestCase
+import base64
+import io
+import os
+import pstats
+import smtplib
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+from decimal import Decimal
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.models import Permission, User
+from django.core import mail
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.db import connection, close_old_connections, transaction, OperationalError
+from django.db.models import Sum
+from django.test import Client, RequestFactory, TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from guardian.models import UserObjectPermission
+
+import json
+
+from wydatki import deletion, filters, jobs, metrics, rates, search, tasks, views
+from wydatki.aggregates import rebuild_totals, rebuild_pocket_spends, reconcile_pockets, expense_sum, income_sum
+from wydatki.cache import bump_version, cached, data_version, stats
+from wydatki.cache_backends import LRULocMemCache
+from wydatki.forecast import CashFlowForecast
+from wydatki.forms import ExpenseForm, OwnerChoiceField, PocketForm
+from wydatki.importers import TransactionImporter
+from wydatki.recurrence import occurrences, projected, materialize
+from wydatki.reports import SpendingReport, ZERO
+from wydatki.reminders import deliver_batch, deliver_due
+from wydatki.signals import bulk_create
+from wydatki.synthetic import create_user
+from wydatki.models import (Expense, Category, Pocket, Place, ExpenseTotal, IncomeTotal, Income, IncomeSource, PocketSpend,
+                            LimitBreach, Reminder, RecurringExpense, Job, ExchangeRate)
+
+
+class CategoryListViewTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user('jan', password='haslo12345')
+        self.pocket = Pocket.objects.create(name='Portfel', limit=1000, funds=1000, owner=self.user)
+        self.place = Place.objects.create(name='Sklep', owner=self.user)
+        self.client.login(username='jan', password='haslo12345')
+
+    def add_categories(self, count):
+        for i in range(count):
+            category = Category.objects.create(name='Kategoria %02d' % i, owner=self.user)
+            Expense.objects.create(name='Zakupy', category=category, price=Decimal('12.50'),
+                                   pocket=self.pocket, place=self.place, owner=self.user)
+
+    def get_query_count(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('category-list'))
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_query_count_does_not_depend_on_category_count(self):
+        self.add_categories(1)
+        few = self.get_query_count()
+        self.add_categories(30)
+        self.assertEqual(self.get_query_count(), few)
+
+    def test_category_totals(self):
+        self.add_categories(2)
+        Expense.objects.create(name='Obiad', category=Category.objects.get(name='Kategoria 00'),
+                               price=Decimal('7.50'), pocket=self.pocket, place=self.place, owner=self.user)
+        response = self.client.get(reverse('category-list'))
+        totals = {c.name: c.expense_sum for c in response.context['object_list']}
+        self.assertEqual(totals, {'Kategoria 00': Decimal('20.00'), 'Kategoria 01': Decimal('12.50')})
+
+
+class ExpenseTotalTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user('jan', password='haslo12345')
+        self.category = Category.objects.create(name='Jedzenie', owner=self.user)
+        self.pocket = Pocket.objects.create(name='Portfel', limit=1000, funds=1000, owner=self.user)
+        self.other_pocket = Pocket.objects.create(name='Konto', limit=1000, funds=1000, owner=self.user)
+        self.place = Place.objects.create(name='Sklep', owner=self.user)
+
+    def totals(self):
+        return sorted(ExpenseTotal.objects.values_list('pocket__name', 'month', 'total', 'count'))
+
+    def test_totals_follow_writes(self):
+        expense = Expense.objects.create(name='Zakupy', category=self.category, price=Decimal('10.00'),
+                                         exp_date=date(2017, 11, 5), pocket=self.pocket, place=self.place,
+                                         owner=self.user)
+        Expense.objects.create(name='Obiad', category=self.category, price=Decimal('5.00'),
+                               exp_date=date(2017, 11, 20), pocket=self.pocket, place=self.place, owner=self.user)
+        self.assertEqual(self.totals(), [('Portfel', date(2017, 11, 1), Decimal('15.00'), 2)])
+
+        expense.pocket, expense.price, expense.exp_date = self.other_pocket, Decimal('12.00'), date(2017, 12, 1)
+        expense.save()
+        self.assertEqual(self.totals(), [('Konto', date(2017, 12, 1), Decimal('12.00'), 1),
+                                         ('Portfel', date(2017, 11, 1), Decimal('5.00'), 1)])
+
+        expense.delete()
+        self.assertEqual(self.totals(), [('Konto', date(2017, 12, 1), Decimal('0.00'), 0),
+                                         ('Portfel', date(2017, 11, 1), Decimal('5.00'), 1)])
+
+    def test_rebuild(self):
+        Expense.objects.create(name='Zakupy', category=self.category, price=Decimal('10.00'),
+                               exp_date=date(2017, 11, 5), pocket=self.pocket, place=self.place, owner=self.user)
+        maintained = self.totals()
+        ExpenseTotal.objects.update(total=0)
+        self.assertEqual(rebuild_totals(self.user), (1, 0))
+        self.assertEqual(self.totals(), maintained)
+
+
+class OwnerPermissionTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user('jan', password='haslo12345')
+        self.other = User.objects.create_user('anna', password='haslo12345')
+        self.pocket = Pocket.objects.create(name='Portfel', limit=1000, funds=1000, owner=self.user)
+
+    def test_owner_can_view(self):
+        self.client.login(username='jan', password='haslo12345')
+        response = self.client.get(reverse('pocket-detail', args=[self.pocket.pk]))
+        self.assertEqual(response.status_code, 200)
+
+    def test_other_user_is_denied(self):
+        self.client.login(username='anna', password='haslo12345')
+        for name in ('pocket-detail', 'pocket-update', 'pocket-delete'):
+            response = self.client.get(reverse(name, args=[self.pocket.pk]))
+            self.assertEqual(response.status_code, 403)
+        self.assertTrue(Pocket.objects.filter(pk=self.pocket.pk).exists())
+
+    def test_no_object_permission_rows(self):
+        self.assertFalse(UserObjectPermission.objects.exists())
+
+
+class ExpenseListPaginationTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user('jan', password='haslo12345')
+        category = Category.objects.create(name='Jedzenie', owner=self.user)
+        pocket = Pocket.objects.create(name='Portfel', limit=1000, funds=1000, owner=self.user)
+        place = Place.objects.create(name='Sklep', owner=self.user)
+        for i in range(30):
+            Expense.objects.create(name='Wydatek %02d' % i, category=category, price=1, pocket=pocket,
+                                   place=place, exp_date=date(2017, 1, 1 + i // 2), owner=self.user)
+        self.client.login(username='jan', password='haslo12345')
+
+    def get_page(self, cursor=None):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('expense-list'), {'cursor': cursor} if cursor else {})
+        self.assertEqual(response.status_code, 200)
+        return response.context['page_obj'], len(queries)
+
+    def names(self, page):
+        return [e.name for e in page]
+
+    def test_pages_follow_date_and_id(self):
+        first, first_queries = self.get_page()
+        self.assertEqual(self.names(first), ['Wydatek %02d' % i for i in range(10)])
+        self.assertFalse(first.has_previous())
+        second, second_queries = self.get_page(first.next_cursor)
+        third, third_queries = self.get_page(second.next_cursor)
+        self.assertEqual(self.names(third), ['Wydatek %02d' % i for i in range(20, 30)])
+        self.assertFalse(third.has_next())
+        # The first page also fills the filter choice cache.
+        self.assertEqual(third_queries, second_queries)
+        self.assertLessEqual(third_queries, first_queries)
+
+        back, _ = self.get_page(third.previous_cursor)
+        self.assertEqual(self.names(back), self.names(second))
+        back, _ = self.get_page(back.previous_cursor)
+        self.assertEqual(self.names(back), self.names(first))
+        self.assertFalse(back.has_previous())
+
+    def test_approximate_count(self):
+        response = self.client.get(reverse('expense-list'))
+        self.assertEqual(response.context['paginator'].count, 30)
+
+    def test_invalid_cursor(self):
+        response = self.client.get(reverse('expense-list'), {'cursor': 'abc'})
+        self.assertEqual(response.status_code, 404)
+
+
+class QueryBudgetTests(TestCase):
+    """Each view must stay within its query budget no matter how many rows it renders."""
+    budgets = {
+        # The filter bar adds one query per choice list.
+        ('expense-list', ()): 8,
+        ('income-list', ()): 6,
+        ('category-list', ()): 5,
+        ('pocket-list', ()): 6,
+        ('expense-detail', ('expense',)): 3,
+        ('income-detail', ('income',)): 3,
+    }
+
+    def setUp(self):
+        self.user = User.objects.create_user('jan', password='haslo12345')
+        source = IncomeSource.objects.create(name='Praca', type_of_income='etat', permanent=True, owner=self.user)
+        for i in range(12):
+            pocket = Pocket.objects.create(name='Portfel %02d' % i, limit=0.5, funds=1000, owner=self.user)
+            category = Category.objects.create(name='Kategoria %02d' % i, owner=self.user)
+            place = Place.objects.create(name='Sklep %02d' % i, owner=self.user)
+            self.expense = Expense.objects.create(name='Zakupy', category=category, price=1, pocket=pocket,
+                                                  place=place, owner=self.user)
+            self.income = Income.objects.create(name='Pensja', source=source, amount=100, owner=self.user)
+        self.client.login(username='jan', password='haslo12345')
+
+    def assertQueryBudget(self, url, budget):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertLessEqual(len(queries), budget, '%s ran %d queries:\n%s' % (
+            url, len(queries), '\n'.join(query['sql'] for query in queries)))
+
+    def test_views_stay_within_budget(self):
+        for (name, args), budget in self.budgets.items():
+            url = reverse(name, args=[getattr(self, arg).pk for arg in args])
+            with self.subTest(url=url):
+                self.assertQueryBudget(url, budget)
+
+
+class TransactionImporterTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user('jan', password='haslo12345')
+        Category.objects.create(name='Jedzenie', owner=self.user)
+
+    def test_csv_import(self):
+        lines = [
+            'date;name;amount;category;place\n',
+            '2017-11-05;Zakupy;-12,50;Jedzenie;Biedronka\n',
+            '06.11.2017;Obiad;-7.50;Jedzenie;Bar\n',
+            '2017-11-10;Pensja;3000.00;;\n',
+            'wczoraj;Błąd;-1;;\n',
+        ]
+        result = TransactionImporter(self.user, batch_size=1).run(lines, 'csv')
+        self.assertEqual((result.expenses, result.incomes), (2, 1))
+        self.assertEqual(len(result.errors), 1)
+        self.assertEqual(Category.objects.filter(owner=self.user).count(), 1)
+        self.assertEqual(sorted(Place.objects.values_list('name', flat=True)), ['Bar', 'Biedronka'])
+        self.assertEqual(expense_sum(self.user), Decimal('20.00'))
+        self.assertEqual(income_sum(self.user), Decimal('3000.00'))
+
+    def test_csv_without_delimiter(self):
+        result = TransactionImporter(self.user).run([], 'csv')
+        self.assertEqual((result.rows, result.errors), (0, []))
+        result = TransactionImporter(self.user).run(['amount\n', '-5.00\n', '0\n'], 'csv')
+        self.assertEqual((result.rows, len(result.errors)), (0, 2))
+        result = TransactionImporter(self.user).run(['date,name,amount\n', '2017-11-05,Nic,0.00\n'], 'csv')
+        self.assertEqual((result.rows, result.errors), (0, ['1: Zero amount']))
+
+    def test_amounts_out_of_range(self):
+        lines = ['date;name;amount\n'] + ['2017-11-05;Wpis;%s\n' % amount
+                                          for amount in ('NaN', '-Infinity', '1e12', '-0,001', '-1e50', '-9999999,99')]
+        result = TransactionImporter(self.user).run(lines, 'csv')
+        self.assertEqual(result.expenses, 1)
+        self.assertEqual([error.split(':')[0] for error in result.errors], ['1', '2', '3', '4', '5'])
+
+    def test_ofx_import(self):
+        lines = [
+            '<OFX><BANKTRANLIST>\n',
+            '<STMTTRN><TRNTYPE>DEBIT<DTPOSTED>20171105120000<TRNAMT>-12.50<NAME>Biedronka</STMTTRN>\n',
+            '<STMTTRN>\n', '<DTPOSTED>20171110\n', '<TRNAMT>3000.00\n', '<MEMO>Pensja\n', '</STMTTRN>\n',
+            '</BANKTRANLIST></OFX>\n',
+        ]
+        result = TransactionImporter(self.user).run(lines, 'ofx')
+        self.assertEqual((result.expenses, result.incomes, result.errors), (1, 1, []))
+        self.assertEqual(Expense.objects.get().exp_date, date(2017, 11, 5))
+        self.assertEqual(Income.objects.get().name, 'Pensja')
+
+
+class ExportTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user('jan', password='haslo12345')
+        self.category = Category.objects.create(name='Jedzenie', owner=self.user)
+        other = Category.objects.create(name='Paliwo', owner=self.user)
+        pocket = Pocket.objects.create(name='Portfel', limit=1000, funds=1000, owner=self.user)
+        place = Place.objects.create(name='Sklep', owner=self.user)
+        for i in range(7):
+            Expense.objects.create(name='Wydatek %d' % i, category=self.category if i % 2 else other,
+                                   price=Decimal('1.50'), pocket=pocket, place=place,
+                                   exp_date=date(2017, 1, 7 - i), owner=self.user)
+        self.client.login(username='jan', password='haslo12345')
+
+    def export(self, file_format, **params):
+        response = self.client.get(reverse('expense-export', args=[file_format]), params)
+        self.assertEqual(response.status_code, 200)
+        return b''.join(response.streaming_content).decode()
+
+    def test_csv_export_in_chunks(self):
+        views.ExpenseExportView.chunk_size = 2
+        self.addCleanup(setattr, views.ExpenseExportView, 'chunk_size', 2000)
+        lines = self.export('csv').splitlines()
+        self.assertEqual(lines[0], 'date,name,price,currency,category,place,pocket')
+        self.assertEqual(lines[1], '2017-01-01,Wydatek 6,1.50,PLN,Paliwo,Sklep,Portfel')
+        self.assertEqual(len(lines), 8)
+
+    def test_jsonl_export_with_filters(self):
+        rows = [json.loads(line) for line in self.export(
+            'jsonl', category=self.category.pk, date_from='2017-01-03').splitlines()]
+        self.assertEqual([row['name'] for row in rows], ['Wydatek 3', 'Wydatek 1'])
+        self.assertEqual(rows[0]['price'], '1.50')
+
+    def test_invalid_filter(self):
+        response = self.client.get(reverse('expense-export', args=['csv']), {'date_from': 'wczoraj'})
+        self.assertEqual(response.status_code, 400)
+
+
+@override_settings(WYDATKI_TASKS_EAGER=True)
+class SpendingReportTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user('jan', password='haslo12345')
+        food = Category.objects.create(name='Jedzenie', owner=self.user)
+        fuel = Category.objects.create(name='Paliwo', owner=self.user)
+        pocket = Pocket.objects.create(name='Portfel', limit=1000, funds=1000, owner=self.user)
+        shop = Place.objects.create(name='Sklep', owner=self.user)
+        station = Place.objects.create(name='Stacja', owner=self.user)
+        for exp_date, category, place, price in ((date(2017, 1, 5), food, shop, 10), (date(2017, 1, 9), fuel, station, 50),
+                                                 (date(2017, 3, 2), food, shop, 40)):
+            Expense.objects.create(name='Wydatek', category=category, price=price, pocket=pocket, place=place,
+                                   exp_date=exp_date, owner=self.user)
+        self.client.login(username='jan', password='haslo12345')
+
+    def test_json_report(self):
+        response = self.client.get(reverse('report-json'))
+        self.assertEqual(response.status_code, 200)
+        report = json.loads(response.content.decode())
+        self.assertEqual(report['months'], ['2017-01', '2017-02', '2017-03'])
+        self.assertEqual([(c['name'], c['totals']) for c in report['categories']],
+                         [('Jedzenie', ['10.00', '0.00', '40.00']), ('Paliwo', ['50.00', '0.00', '0.00'])])
+        self.assertEqual(report['monthly_totals'], ['60.00', '0.00', '40.00'])
+        self.assertEqual(report['moving_average'], ['60.00', '30.00', '33.33'])
+        self.assertEqual(report['month_over_month'], [None, '-60.00', '40.00'])
+        self.assertEqual([(p['name'], p['total']) for p in report['top_places']], [('Sklep', '50.00'), ('Stacja', '50.00')])
+
+    def test_report_page(self):
+        response = self.client.get(reverse('report'), {'date_from': '2017-03-01'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['report']['months'], ['2017-03'])
+
+    def test_partial_months(self):
+        report = SpendingReport(self.user, date_from=date(2017, 1, 6), date_to=date(2017, 3, 31)).build()
+        self.assertEqual(report['monthly_totals'], [Decimal('50.00'), ZERO, Decimal('40.00')])
+        report = SpendingReport(self.user, date_from=date(2017, 1, 6), date_to=date(2017, 1, 8)).build()
+        self.assertEqual(report['monthly_totals'], [])
+        report = SpendingReport(self.user, date_from=date(2017, 1, 1), date_to=date(2017, 3, 1)).build()
+        self.assertEqual(report['monthly_totals'], [Decimal('60.00')])
+
+
+class CacheTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('jan', password='haslo12345')
+        self.calls = 0
+
+    def compute(self):
+        self.calls += 1
+        return self.calls
+
+    def test_writes_invalidate_owner_cache(self):
+        self.assertEqual(cached(self.user.pk, 'raport', self.compute), 1)
+        self.assertEqual(cached(self.user.pk, 'raport', self.compute), 1)
+        Category.objects.create(name='Jedzenie', owner=self.user)
+        self.assertEqual(cached(self.user.pk, 'raport', self.compute), 2)
+        self.assertEqual((stats()['hits'], stats()['misses']), (1, 2))
+
+    def test_lru_eviction(self):
+        lru = LRULocMemCache('test-lru', {'OPTIONS': {'MAX_ENTRIES': 3, 'CULL_FREQUENCY': 3}})
+        for key in 'abc':
+            lru.set(key, key)
+        lru.get('a')
+        lru.set('d', 'd')
+        self.assertEqual([key for key in 'abcd' if lru.get(key)], ['a', 'c', 'd'])
+
+    def test_admin_page(self):
+        User.objects.create_superuser('admin', 'admin@example.com', 'haslo12345')
+        self.client.login(username='admin', password='haslo12345')
+        response = self.client.get(reverse('cache-stats'))
+        self.assertContains(response, 'Hit ratio')
+
+
+class PocketBalanceTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user('jan', password='haslo12345')
+        self.category = Category.objects.create(name='Jedzenie', owner=self.user)
+        self.place = Place.objects.create(name='Sklep', owner=self.user)
+        self.pocket = Pocket.objects.create(name='Portfel', limit=1000, funds=100, owner=self.user)
+        self.other_pocket = Pocket.objects.create(name='Konto', limit=1000, funds=500, owner=self.user)
+
+    def balances(self):
+        return list(Pocket.objects.order_by('name').values_list('name', 'funds', 'spent'))
+
+    def test_balances_follow_writes(self):
+        expense = Expense.objects.create(name='Zakupy', category=self.category, price=Decimal('30.00'),
+                                         pocket=self.pocket, place=self.place, owner=self.user)
+        expense.price = Decimal('40.00')
+        expense.save()
+        self.assertEqual(self.balances(), [('Konto', Decimal('500.00'), Decimal('0.00')),
+                                           ('Portfel', Decimal('60.00'), Decimal('40.00'))])
+        expense.pocket = self.other_pocket
+        expense.save()
+        self.assertEqual(self.balances(), [('Konto', Decimal('460.00'), Decimal('40.00')),
+                                           ('Portfel', Decimal('100.00'), Decimal('0.00'))])
+        expense.delete()
+        self.assertEqual(self.balances(), [('Konto', Decimal('500.00'), Decimal('0.00')),
+                                           ('Portfel', Decimal('100.00'), Decimal('0.00'))])
+
+    def test_reconcile(self):
+        Expense.objects.create(name='Zakupy', category=self.category, price=Decimal('30.00'),
+                               pocket=self.pocket, place=self.place, owner=self.user)
+        self.assertEqual(reconcile_pockets(self.user), [])
+        Pocket.objects.filter(pk=self.pocket.pk).update(spent=0, funds=100)
+        self.assertEqual(reconcile_pockets(self.user, fix=True),
+                         [(self.pocket.pk, 'Portfel', Decimal('0.00'), Decimal('30.00'))])
+        self.assertEqual(self.balances()[1], ('Portfel', Decimal('70.00'), Decimal('30.00')))
+
+
+class CacheCommitTests(TransactionTestCase):
+
+    def test_version_is_bumped_again_on_commit(self):
+        user = User.objects.create_user('jan', password='haslo12345')
+        with transaction.atomic():
+            Category.objects.create(name='Jedzenie', owner=user)
+            # What another connection computes now is based on data without the category.
+            cached(user.pk, 'categories', lambda: 0)
+        self.assertEqual(cached(user.pk, 'categories', lambda: 1), 1)
+
+
+class PocketBalanceConcurrencyTests(TransactionTestCase):
+
+    def test_parallel_writers(self):
+        user = User.objects.create_user('jan', password='haslo12345')
+        category = Category.objects.create(name='Jedzenie', owner=user)
+        place = Place.objects.create(name='Sklep', owner=user)
+        pocket = Pocket.objects.create(name='Portfel', limit=1000, funds=1000, owner=user)
+        errors = []
+
+        def retried(func):
+            for attempt in range(50):
+                try:
+                    return func()
+                except OperationalError:
+                    # SQLite allows one writer at a time, retry when the database is locked.
+                    time.sleep(0.01)
+            raise AssertionError('Database still locked after 50 attempts')
+
+        def add_expense():
+            Expense.objects.create(name='Zakupy', category=category, price=Decimal('1.00'), pocket=pocket,
+                                   place=place, owner=user)
+
+        def edit_pocket():
+            # What PocketUpdateView does: the form is filled from the pocket as read before the save.
+            edited = Pocket.objects.get(pk=pocket.pk)
+            form = PocketForm({'name': edited.name, 'currency': edited.currency, 'limit': edited.limit,
+                               'funds': edited.funds + 1}, instance=edited)
+            self.assertTrue(form.is_valid(), form.errors)
+            form.save()
+
+        def writer(func):
+            try:
+                for i in range(10):
+                    retried(func)
+            except Exception as e:
+                errors.append(e)
+            finally:
+                close_old_connections()
+
+        threads = [threading.Thread(target=writer, args=[add_expense]) for i in range(5)]
+        threads.append(threading.Thread(target=writer, args=[edit_pocket]))
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+        pocket.refresh_from_db()
+        self.assertEqual((pocket.funds, pocket.spent), (Decimal('960.00'), Decimal('50.00')))
+        self.assertEqual(Expense.objects.count(), 50)
+
+        # An expense charged between reading the pocket and saving it is kept.
+        add_expense()
+        pocket.name, pocket.funds = 'Gotówka', pocket.funds + 100
+        pocket.save()
+        pocket.refresh_from_db()
+        self.assertEqual((pocket.name, pocket.funds, pocket.spent), ('Gotówka', Decimal('1059.00'), Decimal('51.00')))
+
+
+class PocketLimitTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user('jan', password='haslo12345')
+        self.category = Category.objects.create(name='Jedzenie', owner=self.user)
+        self.place = Place.objects.create(name='Sklep', owner=self.user)
+        self.pocket = Pocket.objects.create(name='Portfel', limit=100, funds=1000, owner=self.user)
+
+    def add(self, price, exp_date=date(2017, 11, 5)):
+        return Expense.objects.create(name='Zakupy', category=self.category, price=Decimal(price),
+                                      exp_date=exp_date, pocket=self.pocket, place=self.place, owner=self.user)
+
+    def breaches(self):
+        return list(LimitBreach.objects.order_by('id').values_list('month', 'limit', 'spent'))
+
+    def test_breach_recorded_once_per_crossing(self):
+        self.add('60.00')
+        self.assertEqual(self.breaches(), [])
+        expense = self.add('50.00')
+        self.add('10.00')
+        self.add('80.00', date(2017, 12, 1))
+        self.assertEqual(self.breaches(), [(date(2017, 11, 1), Decimal('100.00'), Decimal('110.00'))])
+        expense.price = Decimal('30.00')
+        expense.save()
+        expense.price = Decimal('45.00')
+        expense.save()
+        self.assertEqual(len(self.breaches()), 2)
+        self.assertEqual(PocketSpend.objects.get(month=date(2017, 11, 1)).total, Decimal('115.00'))
+
+    def test_bulk_import_and_rebuild(self):
+        TransactionImporter(self.user, pocket='Portfel').run(
+            ['date,name,amount', '2017-11-05,Zakupy,-70.00', '2017-11-06,Zakupy,-40.00'])
+        self.assertEqual(self.breaches(), [(date(2017, 11, 1), Decimal('100.00'), Decimal('110.00'))])
+        spends = list(PocketSpend.objects.values_list('pocket', 'month', 'total', 'count'))
+        PocketSpend.objects.all().delete()
+        self.assertEqual(rebuild_pocket_spends(self.user), 1)
+        self.assertEqual(list(PocketSpend.objects.values_list('pocket', 'month', 'total', 'count')), spends)
+
+
+class ReminderDeliveryTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user('jan', 'jan@example.com', 'haslo12345')
+        self.today = date(2017, 11, 5)
+
+    def remind(self, name, remind_date, as_before):
+        return Reminder.objects.create(name=name, remind_date=remind_date, as_before=as_before, message='Zapłać',
+                                       importance='W', owner=self.user)
+
+    def statuses(self):
+        return dict(Reminder.objects.values_list('name', 'status'))
+
+    def test_delivers_due_reminders_once(self):
+        for i in range(5):
+            self.remind('Rachunek %d' % i, date(2017, 11, 1 + i), date(2017, 11, 30))
+        self.remind('Jutro', date(2017, 11, 6), date(2017, 11, 30))
+        self.remind('Po terminie', date(2017, 10, 1), date(2017, 10, 31))
+        self.assertEqual(deliver_due(self.today, batch_size=2), (5, 0, 1))
+        self.assertEqual(len(mail.outbox), 5)
+        self.assertEqual(mail.outbox[0].to, ['jan@example.com'])
+        self.assertEqual(self.statuses()['Jutro'], Reminder.PENDING)
+        self.assertEqual(self.statuses()['Po terminie'], Reminder.EXPIRED)
+        self.assertEqual(deliver_due(self.today), (0, 0, 0))
+        self.assertEqual(len(mail.outbox), 5)
+
+    def test_failed_send_is_retried(self):
+        class BrokenConnection(object):
+            def send_messages(self, messages):
+                raise IOError('SMTP down')
+
+        self.remind('Rachunek', date(2017, 11, 1), date(2017, 11, 30))
+        with self.assertRaises(IOError):
+            deliver_batch(self.today, mail_connection=BrokenConnection())
+        self.assertEqual(self.statuses(), {'Rachunek': Reminder.PENDING})
+        self.assertEqual(deliver_batch(self.today), (1, 0, 0))
+        self.assertEqual(self.statuses(), {'Rachunek': Reminder.SENT})
+
+    def test_refused_recipient_does_not_block_the_batch(self):
+        class RefusingConnection(object):
+            def __init__(self, fail_after=None):
+                self.sent, self.fail_after = [], fail_after
+
+            def send_messages(self, messages):
+                if messages[0].to == ['zly@example.com']:
+                    raise smtplib.SMTPRecipientsRefused({'zly@example.com': (550, b'No such user')})
+                if len(self.sent) == self.fail_after:
+                    raise IOError('SMTP down')
+                self.sent += messages
+
+        self.remind('Rachunek 1', date(2017, 11, 1), date(2017, 11, 30))
+        Reminder.objects.create(name='Obcy', remind_date=date(2017, 11, 2), as_before=date(2017, 11, 30),
+                                message='Zapłać', importance='W',
+                                owner=User.objects.create_user('anna', 'zly@example.com', 'haslo12345'))
+        self.remind('Rachunek 2', date(2017, 11, 3), date(2017, 11, 30))
+        with self.assertLogs('wydatki.reminders', 'WARNING'):
+            self.assertEqual(deliver_batch(self.today, mail_connection=RefusingConnection()), (2, 1, 0))
+        self.assertEqual(self.statuses(), {'Rachunek 1': Reminder.SENT, 'Obcy': Reminder.FAILED,
+                                           'Rachunek 2': Reminder.SENT})
+
+        # The reminders sent before a transient error are kept.
+        self.remind('Rachunek 3', date(2017, 11, 4), date(2017, 11, 30))
+        self.remind('Rachunek 4', date(2017, 11, 5), date(2017, 11, 30))
+        with self.assertRaises(IOError):
+            deliver_batch(self.today, mail_connection=RefusingConnection(fail_after=1))
+        self.assertEqual((self.statuses()['Rachunek 3'], self.statuses()['Rachunek 4']),
+                         (Reminder.SENT, Reminder.PENDING))
+        self.assertEqual(deliver_batch(self.today, mail_connection=RefusingConnection()), (1, 0, 0))
+
+
+class RecurrenceTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user('jan', password='haslo12345')
+        self.pocket = Pocket.objects.create(name='Portfel', limit=0, funds=10000, owner=self.user)
+        self.rent = RecurringExpense.objects.create(
+            name='Czynsz', price=Decimal('1500.00'), frequency=RecurringExpense.MONTHLY, starts_on=date(2017, 1, 31),
+            category=Category.objects.create(name='Dom', owner=self.user), pocket=self.pocket,
+            place=Place.objects.create(name='Spółdzielnia', owner=self.user), owner=self.user)
+        self.salary = IncomeSource.objects.create(
+            name='Pensja', type_of_income='etat', permanent=True, amount=Decimal('5000.00'),
+            frequency=IncomeSource.MONTHLY, starts_on=date(2017, 1, 10), owner=self.user)
+
+    def test_occurrences(self):
+        self.assertEqual(list(occurrences(self.rent, date(2017, 2, 1), date(2017, 5, 31))),
+                         [date(2017, 2, 28), date(2017, 3, 31), date(2017, 4, 30), date(2017, 5, 31)])
+        weekly = RecurringExpense(frequency=RecurringExpense.WEEKLY, interval=2, starts_on=date(2017, 1, 2),
+                                  ends_on=date(2017, 2, 1))
+        self.assertEqual(list(occurrences(weekly)), [date(2017, 1, 2), date(2017, 1, 16), date(2017, 1, 30)])
+        self.assertEqual(list(occurrences(RecurringExpense(frequency='', starts_on=date(2017, 1, 1)))), [])
+        self.assertEqual(list(occurrences(RecurringExpense(frequency='M', interval=0, starts_on=date(2017, 1, 1)),
+                                          date(2017, 2, 1))), [])
+
+    def test_projection_creates_no_rows(self):
+        with self.assertNumQueries(2):
+            rows = list(projected(self.user, date(2017, 1, 1), date(2036, 12, 31)))
+        self.assertEqual(len(rows), 2 * 20 * 12)
+        self.assertEqual(sum(row.amount for row in rows if isinstance(row, Income)), Decimal('1200000.00'))
+        self.assertFalse(Expense.objects.exists())
+
+    def test_materialize_is_idempotent(self):
+        self.assertEqual(materialize(date(2017, 3, 31), batch_size=2), 6)
+        self.assertEqual(materialize(date(2017, 3, 31)), 0)
+        self.assertEqual(list(Expense.objects.order_by('exp_date').values_list('exp_date', flat=True)),
+                         [date(2017, 1, 31), date(2017, 2, 28), date(2017, 3, 31)])
+        self.assertEqual(income_sum(self.user), Decimal('15000.00'))
+        self.pocket.refresh_from_db()
+        self.assertEqual(self.pocket.spent, Decimal('4500.00'))
+        self.assertEqual([row.exp_date for row in projected(self.user, date(2017, 1, 1), date(2017, 4, 30))
+                          if isinstance(row, Expense)], [date(2017, 4, 30)])
+        self.assertEqual(materialize(date(2017, 4, 30)), 2)
+
+    def test_views(self):
+        self.client.login(username='jan', password='haslo12345')
+        response = self.client.get(reverse('recurring-expense-list'))
+        self.assertContains(response, 'Czynsz')
+        self.assertIsNotNone(response.context['object_list'][0].next_date)
+        response = self.client.post(reverse('recurring-expense-add'), {
+            'name': 'Internet', 'category': self.rent.category_id, 'price': '60.00', 'pocket': self.pocket.pk,
+            'place': self.rent.place_id, 'frequency': 'M', 'interval': 1, 'starts_on': '2017-01-15'})
+        self.assertRedirects(response, reverse('recurring-expense-list'))
+        response = self.client.get(reverse('income-source-detail', args=[self.salary.pk]))
+        self.assertEqual(len(response.context['upcoming']), 5)
+
+    def test_zero_interval_is_rejected(self):
+        self.client.login(username='jan', password='haslo12345')
+        response = self.client.post(reverse('recurring-expense-add'), {
+            'name': 'Internet', 'category': self.rent.category_id, 'price': '60.00', 'pocket': self.pocket.pk,
+            'place': self.rent.place_id, 'frequency': 'M', 'interval': 0, 'starts_on': '2017-01-15'})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('interval', response.context['form'].errors)
+        response = self.client.post(reverse('api-batch', args=['incomesources']), json.dumps([{
+            'name': 'Zlecenia', 'type_of_income': 'umowa', 'permanent': False, 'amount': '100.00', 'currency': 'PLN',
+            'frequency': 'M', 'interval': 0, 'starts_on': '2017-01-01'}]), content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(list(json.loads(response.content.decode())['errors']['0']), ['interval'])
+        self.assertEqual(IncomeSource.objects.count(), 1)
+
+
+class ForecastTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user('jan', password='haslo12345')
+        self.pocket = Pocket.objects.create(name='Portfel', limit=0, funds=1000, owner=self.user)
+        category = Category.objects.create(name='Jedzenie', owner=self.user)
+        place = Place.objects.create(name='Sklep', owner=self.user)
+        for exp_date, price in ((date(2015, 1, 10), 100), (date(2016, 1, 10), 200), (date(2016, 12, 5), 60),
+                                (date(2017, 1, 5), 500)):
+            Expense.objects.create(name='Zakupy', category=category, price=price, exp_date=exp_date,
+                                   pocket=self.pocket, place=place, owner=self.user)
+        IncomeSource.objects.create(name='Pensja', type_of_income='etat', permanent=True, amount=5000,
+                                    frequency=IncomeSource.MONTHLY, starts_on=date(2017, 1, 10), owner=self.user)
+        bonus = IncomeSource.objects.create(name='Premia', type_of_income='etat', permanent=True, owner=self.user)
+        Income.objects.create(name='Premia', source=bonus, amount=1200, income_date=date(2016, 6, 1), owner=self.user)
+
+    def test_seasonal_forecast(self):
+        forecast = CashFlowForecast(self.user, 12, today=date(2017, 1, 15)).build()
+        self.assertEqual(forecast['months'][0], '2017-02')
+        self.assertEqual(forecast['months'][-1], '2018-01')
+        self.assertEqual(forecast['spend'][-2:], [Decimal('30.00'), Decimal('150.00')])
+        self.assertEqual(forecast['pockets'][0]['balance'][-2:], [Decimal('110.00'), Decimal('-40.00')])
+        self.assertEqual(forecast['categories'][0]['name'], 'Jedzenie')
+        self.assertEqual(forecast['incomes'], [Decimal('5100.00')] * 12)
+        self.assertEqual(forecast['net'][-1], Decimal('4950.00'))
+
+    def test_forecast_view_is_cached(self):
+        self.client.login(username='jan', password='haslo12345')
+        response = self.client.get(reverse('forecast-json'), {'months': 24})
+        self.assertEqual(len(json.loads(response.content.decode())['months']), 24)
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse('forecast'), {'months': 24})
+        self.assertFalse(any('wydatki_expensetotal' in query['sql'] for query in queries))
+        self.assertEqual(self.client.get(reverse('forecast'), {'months': 500}).status_code, 400)
+
+
+class ApiTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user('jan', password='haslo12345')
+        self.other = User.objects.create_user('anna', password='haslo12345')
+        self.category = Category.objects.create(name='Jedzenie', owner=self.user)
+        self.place = Place.objects.create(name='Sklep', owner=self.user)
+        self.pocket = Pocket.objects.create(name='Portfel', limit=0, funds=1000, owner=self.user)
+        for day in range(1, 6):
+            Expense.objects.create(name='Zakupy %d' % day, category=self.category, price=10, exp_date=date(2017, 11, day),
+                                   pocket=self.pocket, place=self.place, owner=self.user)
+        Category.objects.create(name='Obca', owner=self.other)
+        self.client.login(username='jan', password='haslo12345')
+
+    def post_batch(self, resource, objects, client=None):
+        return (client or self.client).post(reverse('api-batch', args=[resource]), json.dumps(objects),
+                                            content_type='application/json')
+
+    def test_cursor_pagination_and_fields(self):
+        names, cursor = [], None
+        while True:
+            params = {'fields': 'name,price', 'limit': 2}
+            if cursor:
+                params['cursor'] = cursor
+            page = json.loads(self.client.get(reverse('api-list', args=['expenses']), params).content.decode())
+            names += [row['name'] for row in page['results']]
+            self.assertEqual(set(page['results'][0]), {'name', 'price'})
+            cursor = page['next']
+            if not cursor:
+                break
+        self.assertEqual(names, ['Zakupy %d' % day for day in range(1, 6)])
+        categories = json.loads(self.client.get(reverse('api-list', args=['categories'])).content.decode())
+        self.assertEqual([row['name'] for row in categories['results']], ['Jedzenie'])
+        self.assertEqual(self.client.get(reverse('api-list', args=['expenses']), {'fields': 'owner'}).status_code, 400)
+        self.assertEqual(self.client.get(reverse('api-list', args=['users'])).status_code, 404)
+
+    def test_etag(self):
+        url = reverse('api-detail', args=['pockets', self.pocket.pk])
+        response = self.client.get(url)
+        self.assertEqual(json.loads(response.content.decode())['spent'], '50.00')
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+        self.post_batch('pockets', [{'id': self.pocket.pk, 'funds': '500.00'}])
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 200)
+
+    def test_batch(self):
+        objects = [{'name': 'Chleb', 'exp_date': '2017-11-06', 'category': self.category.pk, 'price': '4.50',
+                    'pocket': self.pocket.pk, 'place': self.place.pk} for i in range(3)]
+        first = Expense.objects.order_by('id').first()
+        objects.append({'id': first.pk, 'price': '20.00'})
+        response = self.post_batch('expenses', {'objects': objects})
+        self.assertEqual(response.status_code, 201)
+        result = json.loads(response.content.decode())
+        self.assertEqual((result['created'], result['updated']), (3, 1))
+        self.pocket.refresh_from_db()
+        self.assertEqual(self.pocket.spent, Decimal('73.50'))
+        self.assertEqual(expense_sum(self.user), Decimal('73.50'))
+
+        foreign = Category.objects.get(name='Obca')
+        response = self.post_batch('expenses', [dict(objects[0], category=foreign.pk), objects[1]])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(list(json.loads(response.content.decode())['errors']), ['0'])
+        self.assertEqual(Expense.objects.count(), 8)
+        self.assertEqual(self.post_batch('places', [{'name': 'x'}] * 1001).status_code, 413)
+        response = self.post_batch('places', [{'id': first.place_id, 'name': 'x'}, {'id': 'abc'}, {'id': [1]},
+                                              {'id': str(first.place_id)}])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(sorted(json.loads(response.content.decode())['errors']), ['1', '2', '3'])
+
+    def test_authentication(self):
+        self.client.logout()
+        url = reverse('api-list', args=['places'])
+        self.assertEqual(self.client.get(url).status_code, 401)
+        credentials = 'Basic ' + base64.b64encode(b'jan:haslo12345').decode()
+        self.assertEqual(self.client.get(url, HTTP_AUTHORIZATION=credentials).status_code, 200)
+        self.assertEqual(self.client.get(url, HTTP_AUTHORIZATION='Basic ' + base64.b64encode(b'jan:x').decode())
+                         .status_code, 401)
+        session = Client(enforce_csrf_checks=True)
+        session.login(username='jan', password='haslo12345')
+        self.assertEqual(self.post_batch('places', [{'name': 'Kiosk'}], session).status_code, 403)
+
+
+class SearchTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user('jan', password='haslo12345')
+        self.other = User.objects.create_user('anna', password='haslo12345')
+        self.category = Category.objects.create(name='Żywność', owner=self.user)
+        self.place = Place.objects.create(name='Sklep osiedlowy', owner=self.user)
+        self.pocket = Pocket.objects.create(name='Portfel', limit=0, funds=1000, owner=self.user)
+        self.expense = Expense.objects.create(name='Zakupy spożywcze', category=self.category, price=10,
+                                              pocket=self.pocket, place=self.place, owner=self.user)
+        Category.objects.create(name='Zakupy', owner=self.other)
+
+    def names(self, query, backend=search.backend):
+        return {kind: [name for pk, name in rows] for kind, rows in backend.search(self.user, query).items()}
+
+    def test_index_follows_writes(self):
+        self.assertEqual(self.names('zak spoz'), {'category': [], 'place': [], 'expense': ['Zakupy spożywcze']})
+        self.assertEqual(self.names('zyw')['category'], ['Żywność'])
+        self.expense.name = 'Obiad'
+        self.expense.save()
+        self.assertEqual(self.names('zak')['expense'], [])
+        self.assertEqual(self.names('obi')['expense'], ['Obiad'])
+        self.place.delete()
+        self.assertEqual(self.names('obi')['expense'], [])
+        self.assertEqual(self.names('skl')['place'], [])
+
+    def test_bulk_import_and_rebuild(self):
+        TransactionImporter(self.user).run(['date,name,amount,place', '2017-11-05,Kino,-20.00,Multikino'])
+        results = search.backend.search(self.user, 'kin')
+        self.assertEqual([name for pk, name in results['expense']], ['Kino'])
+        self.assertEqual(Expense.objects.get(pk=results['expense'][0][0]).name, 'Kino')
+        with connection.cursor() as cursor:
+            cursor.execute('DELETE FROM wydatki_search')
+        self.assertEqual(search.backend.rebuild(self.user), 6)
+        self.assertEqual(self.names('kin'), {'category': [], 'place': [], 'expense': ['Kino']})
+        self.assertEqual(self.names('mul')['place'], ['Multikino'])
+        self.assertEqual(self.names('zak', search.DatabaseSearchBackend()), self.names('zak'))
+
+    def test_search_views(self):
+        self.client.login(username='jan', password='haslo12345')
+        response = self.client.get(reverse('search-json'), {'q': 'zak'})
+        self.assertEqual(json.loads(response.content.decode())['expense'],
+                         [{'id': self.expense.pk, 'name': 'Zakupy spożywcze'}])
+        response = self.client.get(reverse('search'), {'q': 'sklep'})
+        self.assertEqual(response.context['results']['place'], [(self.place.pk, 'Sklep osiedlowy')])
+        self.assertContains(response, 'Sklep osiedlowy')
+
+
+class ListFilterTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user('jan', password='haslo12345')
+        self.pocket = Pocket.objects.create(name='Portfel', limit=0, funds=1000, owner=self.user)
+        Pocket.objects.create(name='Oszczędności', limit=0, funds=0, owner=self.user)
+        self.food = Category.objects.create(name='Jedzenie', owner=self.user)
+        self.fun = Category.objects.create(name='Rozrywka', owner=self.user)
+        self.place = Place.objects.create(name='Sklep', owner=self.user)
+        for i, (category, price) in enumerate([(self.food, 30), (self.fun, 50), (self.food, 10), (self.food, 70)]):
+            Expense.objects.create(name='Wydatek %d' % i, exp_date=date(2017, 11, i + 1), category=category,
+                                   price=price, pocket=self.pocket, place=self.place, owner=self.user)
+        self.client.login(username='jan', password='haslo12345')
+
+    def names(self, url, **params):
+        response = self.client.get(reverse(url), params)
+        self.assertEqual(response.status_code, 200)
+        return [obj.name for obj in response.context['object_list']]
+
+    def test_truncated_text_filter(self):
+        filters.ExpenseListFilterForm.text_matches = 3
+        self.addCleanup(delattr, filters.ExpenseListFilterForm, 'text_matches')
+        response = self.client.get(reverse('expense-list'), {'q': 'wyd'})
+        self.assertContains(response, 'Wyszukiwanie zwróciło więcej niż 3 wyników')
+        self.assertEqual([obj.name for obj in response.context['object_list']], ['Wydatek 1', 'Wydatek 2', 'Wydatek 3'])
+
+    def test_expense_filters(self):
+        self.assertEqual(self.names('expense-list', category=self.food.pk, sort='-exp_date'),
+                         ['Wydatek 3', 'Wydatek 2', 'Wydatek 0'])
+        self.assertEqual(self.names('expense-list', date_from='2017-11-02', date_to='2017-11-03'),
+                         ['Wydatek 1', 'Wydatek 2'])
+        self.assertEqual(self.names('expense-list', sort='price', amount_min=20, amount_max=60),
+                         ['Wydatek 0', 'Wydatek 1'])
+        self.assertEqual(self.names('expense-list', q='wyd', place=self.place.pk), ['Wydatek 0', 'Wydatek 1',
+                                                                                   'Wydatek 2', 'Wydatek 3'])
+        response = self.client.get(reverse('expense-list'), {'category': self.food.pk})
+        self.assertNotContains(response, 'Wyszukiwanie zwróciło więcej')
+        self.assertIsNone(response.context['paginator'].count)
+        self.assertNotIn('sum', response.context)
+
+    def test_unindexed_combinations_are_rejected(self):
+        for params in ({'sort': 'price', 'category': self.food.pk}, {'amount_min': 10},
+                       {'sort': 'price', 'date_from': '2017-11-01'}, {'category': self.food.pk, 'pocket': self.pocket.pk},
+                       {'sort': 'name'}, {'category': Category.objects.create(name='Obca', owner=User.objects.create_user(
+                           'anna')).pk}):
+            with self.subTest(params=params):
+                self.assertEqual(self.client.get(reverse('expense-list'), params).status_code, 400)
+
+    def test_every_allowed_combination_has_an_index(self):
+        form = filters.ExpenseListFilterForm(self.user, {'category': self.food.pk, 'sort': '-exp_date'})
+        self.assertTrue(form.is_valid())
+        self.assertEqual(filters.supporting_index(Expense, ['category'], 'exp_date'), 'expense_owner_category_idx')
+        self.assertEqual(filters.supporting_index(Expense, [], 'price'), 'expense_owner_price_idx')
+        self.assertIsNone(filters.supporting_index(Expense, ['category', 'pocket'], 'exp_date'))
+
+    def test_name_lists_and_pagination_links(self):
+        self.assertEqual(self.names('pocket-list', q='Port'), ['Portfel'])
+        self.assertEqual(self.names('category-list', sort='-name'), ['Rozrywka', 'Jedzenie'])
+        for i in range(10):
+            Expense.objects.create(name='Obiad', exp_date=date(2017, 12, 1), category=self.food, price=5,
+                                   pocket=self.pocket, place=self.place, owner=self.user)
+        response = self.client.get(reverse('expense-list'), {'category': self.food.pk})
+        self.assertContains(response, '?category=%d&cursor=' % self.food.pk)
+
+
+class InstrumentationTests(TestCase):
+
+    def setUp(self):
+        metrics.registry.reset()
+        self.user = User.objects.create_user('jan', password='haslo12345')
+        self.client.login(username='jan', password='haslo12345')
+
+    def test_requests_are_recorded_by_view(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse('category-list'))
+        stats = metrics.registry.views['category-list', 'GET']
+        self.assertEqual((stats.requests, dict(stats.statuses)), (1, {200: 1}))
+        self.assertEqual(stats.queries, len(queries))
+        self.assertGreater(stats.template_seconds, 0)
+        self.assertGreaterEqual(stats.seconds, stats.sql_seconds + stats.template_seconds)
+
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'wydatki_requests_total{view="category-list",method="GET",status="200"} 1')
+        self.assertContains(response, 'wydatki_request_duration_seconds_count{view="category-list",method="GET"} 1')
+        response = self.client.get(reverse('metrics'), REMOTE_ADDR='10.0.0.1')
+        self.assertEqual(response.status_code, 403)
+
+    def test_server_timing_and_profiling(self):
+        with self.settings(WYDATKI_SERVER_TIMING=True, WYDATKI_PROFILE_DIR=tempfile.mkdtemp()):
+            response = self.client.get(reverse('category-list'), HTTP_X_PROFILE='1')
+            self.assertRegex(response['Server-Timing'], r'^app;dur=[\d.]+, db;dur=[\d.]+;desc="\d+ queries", tpl')
+            dump = os.path.join(settings.WYDATKI_PROFILE_DIR, response['X-Profile'])
+            self.assertTrue(pstats.Stats(dump).total_calls)
+            response = self.client.get(reverse('category-list'), HTTP_X_PROFILE='1', REMOTE_ADDR='10.0.0.1')
+            self.assertNotIn('X-Profile', response)
+
+
+class BenchmarkTests(TestCase):
+
+    def test_generated_user_is_consistent(self):
+        user = create_user('demo-1', 300, 20, seed=1)
+        self.assertEqual(Expense.objects.filter(owner=user).count(), 300)
+        self.assertEqual(income_sum(user), Income.objects.filter(owner=user).aggregate(total=Sum('amount'))['total'])
+        self.assertEqual(expense_sum(user),
+                         Expense.objects.filter(owner=user).aggregate(total=Sum('base_price'))['total'])
+        expense = Expense.objects.filter(owner=user, currency='EUR').first()
+        self.assertEqual(expense.base_price, rates.to_base(expense.price, 'EUR', expense.exp_date))
+        self.assertEqual(reconcile_pockets(user), [])
+        self.assertTrue(search.backend.search(user, 'kaw')['expense'] or search.backend.search(user, 'obi')['expense'])
+
+    def test_benchmark_writes_results_and_compares(self):
+        output = os.path.join(tempfile.mkdtemp(), 'bench.json')
+        call_command('benchmark', sizes=[50], repeat=2, urls=['expense-list', 'expense-detail'], output=output,
+                     stdout=io.StringIO())
+        with open(output) as f:
+            results = json.load(f)['results']['50']
+        self.assertEqual(set(results), {'expense-list', 'expense-detail'})
+        self.assertEqual(results['expense-list']['status'], 200)
+        self.assertGreater(results['expense-list']['queries'], 0)
+
+        for result in results.values():
+            result['p50_ms'], result['queries'] = 0.001, 0
+        with open(output, 'w') as f:
+            json.dump({'results': {'50': results}}, f)
+        with self.assertRaisesRegex(CommandError, r'expense-list @ 50: \d+ -> \d+ queries'):
+            call_command('benchmark', sizes=[50], repeat=2, urls=['expense-list'], baseline=output,
+                         stdout=io.StringIO())
+
+
+class FormChoiceTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user('jan', password='haslo12345')
+        self.other = User.objects.create_user('anna', password='haslo12345')
+        self.category = Category.objects.create(name='Jedzenie', owner=self.user)
+        self.pocket = Pocket.objects.create(name='Portfel', limit=0, funds=1000, owner=self.user)
+        self.place = Place.objects.create(name='Sklep', owner=self.user)
+        Category.objects.create(name='Obca', owner=self.other)
+        self.client.login(username='jan', password='haslo12345')
+
+    def choices(self, form, name):
+        return [label for value, label in form.fields[name].choices if value]
+
+    def test_choices_are_cached_until_a_choice_model_changes(self):
+        self.assertEqual(self.choices(ExpenseForm(user_id=self.user.pk), 'category'), ['Jedzenie'])
+        with self.assertNumQueries(0):
+            form = ExpenseForm(user_id=self.user.pk)
+            str(form['category']), str(form['pocket']), str(form['place'])
+        Expense.objects.create(name='Obiad', category=self.category, price=10, pocket=self.pocket, place=self.place,
+                               owner=self.user)
+        with self.assertNumQueries(0):
+            self.choices(ExpenseForm(user_id=self.user.pk), 'category')
+        Category.objects.create(name='Auto', owner=self.user)
+        self.assertEqual(self.choices(ExpenseForm(user_id=self.user.pk), 'category'), ['Auto', 'Jedzenie'])
+
+        form = ExpenseForm({'name': 'Obiad', 'exp_date': '2017-11-01', 'category': Category.objects.get(
+            name='Obca').pk, 'price': 10, 'pocket': self.pocket.pk, 'place': self.place.pk}, user_id=self.user.pk)
+        self.assertEqual(list(form.errors), ['category'])
+
+    def test_typeahead_for_long_lists(self):
+        Place.objects.bulk_create([Place(name='Sklep %03d' % i, owner=self.user) for i in range(OwnerChoiceField.limit)])
+        Place.objects.create(name='Zielony Market', owner=self.user)
+        expense = Expense.objects.create(name='Obiad', category=self.category, price=10, pocket=self.pocket,
+                                         place=Place.objects.get(name='Zielony Market'), owner=self.user)
+        response = self.client.get(reverse('expense-update', args=[expense.pk]))
+        self.assertContains(response, 'data-url="%s"' % reverse('choice-json', args=['place']))
+        self.assertContains(response, 'value="Zielony Market"')
+        self.assertNotContains(response, 'Sklep 001')
+        self.assertContains(response, 'Portfel</option>')
+
+        response = self.client.get(reverse('choice-json', args=['place']), {'q': 'ziel'})
+        self.assertEqual(json.loads(response.content.decode())['results'],
+                         [{'id': expense.place_id, 'name': 'Zielony Market'}])
+        response = self.client.get(reverse('choice-json', args=['pocket']), {'q': 'Port'})
+        self.assertEqual(json.loads(response.content.decode())['results'], [{'id': self.pocket.pk, 'name': 'Portfel'}])
+        response = self.client.post(reverse('expense-update', args=[expense.pk]), {
+            'name': 'Obiad', 'exp_date': '2017-11-01', 'category': self.category.pk, 'price': 12,
+            'pocket': self.pocket.pk, 'place': Place.objects.get(name='Sklep 001').pk})
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(Expense.objects.get(pk=expense.pk).place.name, 'Sklep 001')
+
+
+@override_settings(WYDATKI_TASKS_EAGER=True, WYDATKI_TASK_DIR=tempfile.mkdtemp())
+class TaskTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user('jan', password='haslo12345')
+        category = Category.objects.create(name='Jedzenie', owner=self.user)
+        pocket = Pocket.objects.create(name='Portfel', limit=0, funds=1000, owner=self.user)
+        place = Place.objects.create(name='Sklep', owner=self.user)
+        for i in range(5):
+            Expense.objects.create(name='Wydatek %d' % i, category=category, price=Decimal('2.00'), pocket=pocket,
+                                   place=place, exp_date=date(2017, 1, 1 + i), owner=self.user)
+        self.client.login(username='jan', password='haslo12345')
+
+    def test_background_export(self):
+        response = self.client.get(reverse('expense-export', args=['csv']), {'background': '1'})
+        self.assertEqual(response.status_code, 302)
+        download = self.client.get(response.url)
+        self.assertEqual(download['Content-Disposition'], 'attachment; filename="expenses.csv"')
+        streamed = self.client.get(reverse('expense-export', args=['csv']))
+        self.assertEqual(b''.join(download.streaming_content), b''.join(streamed.streaming_content))
+
+        User.objects.create_user('anna', password='haslo12345')
+        self.client.login(username='anna', password='haslo12345')
+        self.assertEqual(self.client.get(response.url).status_code, 404)
+
+    def test_import_runs_as_task(self):
+        upload = io.BytesIO('date;name;amount\n2017-11-05;Zakupy;-12,50\n'.encode('cp1250'))
+        upload.name = 'wyciag.csv'
+        response = self.client.post(reverse('import'), {'file': upload, 'file_format': 'csv', 'encoding': 'cp1250'})
+        self.assertContains(response, 'Zaimportowane wydatki: 1')
+        self.assertFalse([name for name in os.listdir(settings.WYDATKI_TASK_DIR) if name.endswith('.import')])
+
+    def test_task_state_is_a_job(self):
+        task_id = tasks.pool.submit(self.user, 'report', lambda progress: {'value': 42})
+        self.assertEqual(Job.objects.get(pk=task_id).status, Job.DONE)
+        self.assertEqual(tasks.get(task_id, self.user)['result'], {'value': 42})
+        self.assertIsNone(jobs.claim('worker'))
+
+        Job.objects.filter(pk=task_id).update(created=timezone.now() - timedelta(seconds=tasks.TASK_TIMEOUT + 1))
+        tasks.remove_expired()
+        self.assertIsNone(tasks.get(task_id, self.user))
+
+    def test_lost_task(self):
+        def work(progress):
+            Job.objects.filter(pk=progress.task_id).delete()
+
+        view = views.TaskMixin()
+        view.request = RequestFactory().get(reverse('report'))
+        view.request.user = self.user
+        with self.assertRaises(tasks.TaskLost):
+            view.run_task('report', work)
+
+
+class TaskPoolTests(TransactionTestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user('jan', password='haslo12345')
+        self.client.login(username='jan', password='haslo12345')
+
+    @override_settings(WYDATKI_TASKS_EAGER=False, WYDATKI_TASK_WORKERS=1, WYDATKI_TASK_QUEUE=1, WYDATKI_TASK_WAIT=0)
+    def test_pool_is_bounded(self):
+        started, release = threading.Event(), threading.Event()
+
+        def work(progress, value):
+            progress(1, 2)
+            started.set()
+            release.wait(5)
+            return {'value': value}
+
+        task_id = tasks.pool.submit(self.user, 'report', work, 42)
+        self.assertTrue(started.wait(5))
+        with self.assertRaises(tasks.QueueFull):
+            tasks.pool.submit(self.user, 'report', work, 43)
+        response = self.client.get(reverse('report-json'))
+        self.assertEqual(response.status_code, 503)
+
+        response = self.client.get(reverse('task', args=[task_id]))
+        self.assertContains(response, 'W toku: 1 z 2 wierszy')
+        response = self.client.get(reverse('task-json', args=[task_id]))
+        self.assertEqual(json.loads(response.content.decode())['status'], 'running')
+
+        release.set()
+        task = tasks.pool.wait(task_id, 5)
+        self.assertEqual((task['status'], task['result']), ('done', {'value': 42}))
+
+
+def flaky_handler(progress, owner, fail):
+    if Job.objects.filter(owner=owner, status=Job.RUNNING, attempts__lte=fail).exists():
+        raise ValueError('nieudana próba')
+    progress(1, 1)
+
+
+@override_settings(WYDATKI_JOB_RETRY_DELAY=0)
+class JobTests(TestCase):
+
+    def setUp(self):
+        self.user = create_user('demo-1', 30, 5, seed=1)
+        self.other = create_user('demo-2', 10, 2, seed=2)
+        jobs.HANDLERS['flaky'] = 'wydatki.tests.flaky_handler'
+        self.addCleanup(jobs.HANDLERS.pop, 'flaky')
+
+    def test_account_is_deleted_in_the_background(self):
+        self.client.login(username='demo-1', password='demo-1')
+        response = self.client.post(reverse('user-delete', args=[self.other.pk]))
+        self.assertEqual(response.status_code, 403)
+        response = self.client.post(reverse('user-delete', args=[self.user.pk]))
+        self.assertRedirects(response, reverse('login'))
+        self.assertFalse(User.objects.get(pk=self.user.pk).is_active)
+        self.assertEqual(Expense.objects.filter(owner=self.user).count(), 30)
+
+        call_command('run_jobs', once=True, stdout=io.StringIO())
+        job = Job.objects.get()
+        self.assertEqual((job.status, job.owner, job.progress), (Job.DONE, None, job.total))
+        self.assertFalse(User.objects.filter(pk=self.user.pk).exists())
+        self.assertEqual(Expense.objects.count(), 10)
+        self.assertEqual(reconcile_pockets(self.other), [])
+
+    def test_chunked_delete(self):
+        calls = []
+        deleted = deletion.delete_in_chunks(Expense.objects.filter(owner=self.user), 7, calls.append)
+        self.assertEqual((deleted, calls), (30, [7, 14, 21, 28, 30]))
+        self.assertEqual(Expense.objects.filter(owner=self.other).count(), 10)
+
+    def test_retries_and_per_owner_limit(self):
+        first = jobs.enqueue('flaky', owner=self.user, fail=1)
+        second = jobs.enqueue('flaky', owner=self.user, fail=0)
+        third = jobs.enqueue('flaky', owner=self.other, max_attempts=1, fail=1)
+        claimed = jobs.claim('a'), jobs.claim('b')
+        self.assertEqual(claimed, (first, third))
+        self.assertIsNone(jobs.claim('c'))
+        # The owner already runs first, second waits for it.
+        second.refresh_from_db()
+        self.assertEqual((second.status, second.locked_by, second.attempts), (Job.PENDING, '', 0))
+
+        with self.assertLogs('wydatki.jobs', 'ERROR'):
+            self.assertFalse(jobs.run(claimed[0]))
+            self.assertFalse(jobs.run(claimed[1]))
+        first.refresh_from_db()
+        self.assertEqual((first.status, first.attempts, first.error), (Job.PENDING, 1, "ValueError('nieudana próba',)"))
+        self.assertEqual(Job.objects.get(pk=third.pk).status, Job.FAILED)
+
+        self.assertEqual(jobs.work('a'), (2, 0))
+        self.assertEqual(Job.objects.get(pk=second.pk).status, Job.DONE)
+        self.assertEqual(set(Job.objects.values_list('status', flat=True)), {Job.DONE, Job.FAILED})
+
+    def test_stale_jobs_are_requeued(self):
+        job = jobs.enqueue('flaky', owner=self.user, fail=0)
+        jobs.claim('a')
+        Job.objects.filter(pk=job.pk).update(locked_at=timezone.now() - timedelta(hours=1))
+        self.assertEqual(jobs.requeue_stale(), 1)
+        self.assertEqual(jobs.claim('b').locked_by, 'b')
+
+
+class ChunkedDeleteTests(TestCase):
+
+    def setUp(self):
+        self.user = create_user('demo-1', 80, 12, seed=3)
+        self.client.login(username='demo-1', password='demo-1')
+
+    def assertDerivedDataConsistent(self):
+        def snapshot():
+            return (set(ExpenseTotal.objects.filter(owner=self.user, count__gt=0).values_list(
+                        'pocket', 'category', 'month', 'total', 'count')),
+                    set(IncomeTotal.objects.filter(owner=self.user, count__gt=0).values_list(
+                        'source', 'month', 'total', 'count')),
+                    set(PocketSpend.objects.filter(pocket__owner=self.user, count__gt=0).values_list(
+                        'pocket', 'month', 'total', 'count')))
+        kept = snapshot()
+        rebuild_totals(self.user)
+        rebuild_pocket_spends(self.user)
+        self.assertEqual(kept, snapshot())
+        self.assertEqual(reconcile_pockets(self.user), [])
+
+    def test_delete_in_chunks(self):
+        place = Place.objects.filter(owner=self.user, expense__isnull=False).first()
+        expenses = list(Expense.objects.filter(place=place).values_list('pk', flat=True))
+        UserObjectPermission.objects.create(user=self.user, content_object=Expense.objects.get(pk=expenses[0]),
+                                            permission=Permission.objects.get(codename='view_expense'))
+        deletion.delete_object(place, chunk_size=2)
+        self.assertFalse(Expense.objects.filter(pk__in=expenses).exists())
+        self.assertFalse(UserObjectPermission.objects.exists())
+        self.assertDerivedDataConsistent()
+
+        pocket = Pocket.objects.filter(owner=self.user)[0]
+        for i in range(2):
+            response = self.client.post(reverse('pocket-delete', args=[pocket.pk]))
+            self.assertRedirects(response, reverse('pocket-list'))
+        self.assertTrue(Pocket.objects.filter(pk=pocket.pk).exists())
+        source = IncomeSource.objects.filter(owner=self.user)[0]
+        self.client.post(reverse('income-source-delete', args=[source.pk]))
+        self.assertEqual(jobs.work(), (2, 0))
+        self.assertFalse(Pocket.objects.filter(pk=pocket.pk).exists())
+        self.assertFalse(Income.objects.filter(source=source.pk).exists())
+        self.assertDerivedDataConsistent()
+
+    def test_reassign(self):
+        food, fuel = Category.objects.filter(owner=self.user).order_by('pk')[:2]
+        moved = Expense.objects.filter(category__in=[food, fuel]).count()
+        response = self.client.get(reverse('category-delete', args=[food.pk]))
+        self.assertContains(response, 'Przenieś powiązane wpisy do')
+        response = self.client.post(reverse('category-delete', args=[food.pk]), {'target': fuel.pk})
+        self.assertRedirects(response, reverse('category-list'))
+        jobs.work()
+        self.assertEqual(Expense.objects.filter(category=fuel).count(), moved)
+
+        first, second = Pocket.objects.filter(owner=self.user).order_by('pk')[:2]
+        self.client.post(reverse('pocket-delete', args=[first.pk]), {'target': second.pk})
+        jobs.work()
+        self.assertFalse(Pocket.objects.filter(pk=first.pk).exists())
+        self.assertDerivedDataConsistent()
+
+    def test_invalid_target(self):
+        other = create_user('demo-2', 5, 1, seed=4)
+        category = Category.objects.filter(owner=self.user)[0]
+        for target in (Category.objects.filter(owner=other)[0], category):
+            response = self.client.post(reverse('category-delete', args=[category.pk]), {'target': target.pk})
+            self.assertEqual(response.status_code, 200)
+            self.assertTrue(response.context['reassign_form'].errors)
+        self.assertTrue(Category.objects.filter(pk=category.pk).exists())
+
+
+@override_settings(WYDATKI_TASKS_EAGER=True)
+class CurrencyTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user('jan', password='haslo12345')
+        self.pln = Pocket.objects.create(name='Portfel', limit=0, funds=1000, owner=self.user)
+        self.eur = Pocket.objects.create(name='Euro', currency='EUR', limit=0, funds=100, owner=self.user)
+        self.category = Category.objects.create(name='Podróże', owner=self.user)
+        self.place = Place.objects.create(name='Hotel', owner=self.user)
+        self.source = IncomeSource.objects.create(name='Zlecenia', type_of_income='umowa', permanent=False,
+                                                  owner=self.user)
+        rates.store_rates([('EUR', date(2017, 1, 1), Decimal('4.2')), ('EUR', date(2017, 2, 1), Decimal('4.3')),
+                           ('USD', date(2017, 1, 1), Decimal('3.9'))])
+        self.client.login(username='jan', password='haslo12345')
+
+    def add_expense(self, pocket, exp_date, price):
+        return Expense.objects.create(name='Nocleg', exp_date=exp_date, price=price, category=self.category,
+                                      pocket=pocket, place=self.place, owner=self.user)
+
+    def test_amounts_are_converted_on_save(self):
+        expense = self.add_expense(self.eur, date(2017, 1, 20), Decimal('10.00'))
+        self.assertEqual((expense.currency, expense.base_price), ('EUR', Decimal('42.00')))
+        bulk_create(Expense, [Expense(name='Nocleg', exp_date=date(2017, 2, 3), price=Decimal('10.00'),
+                                      category=self.category, pocket=self.eur, place=self.place, owner=self.user)])
+        self.add_expense(self.pln, date(2017, 2, 3), Decimal('5.00'))
+        Income.objects.create(name='Faktura', source=self.source, amount=Decimal('100.00'), currency='USD',
+                              income_date=date(2017, 3, 1), owner=self.user)
+
+        self.assertEqual(expense_sum(self.user), Decimal('90.00'))
+        self.assertEqual(income_sum(self.user), Decimal('390.00'))
+        self.eur.refresh_from_db()
+        self.assertEqual((self.eur.spent, self.eur.funds), (Decimal('20.00'), Decimal('80.00')))
+        self.assertEqual(PocketSpend.objects.get(pocket=self.eur, month=date(2017, 2, 1)).total, Decimal('10.00'))
+
+        with self.assertRaises(rates.MissingRate):
+            self.add_expense(self.eur, date(2016, 12, 31), Decimal('1.00'))
+        form = ExpenseForm({'name': 'Nocleg', 'exp_date': '2016-12-31', 'category': self.category.pk,
+                            'price': '1.00', 'pocket': self.eur.pk, 'place': self.place.pk}, user_id=self.user)
+        self.assertIn('Brak kursu EUR', str(form.errors))
+
+    def test_loading_rates_converts_stored_amounts(self):
+        self.add_expense(self.eur, date(2017, 2, 10), Decimal('10.00'))
+        self.add_expense(self.eur, date(2017, 1, 10), Decimal('10.00'))
+        path = os.path.join(tempfile.mkdtemp(), 'rates.csv')
+        with open(path, 'w') as f:
+            f.write('date,currency,rate\n2017-02-01,EUR,"4,5"\n2017-03-01,EUR,4.6\n')
+        call_command('load_rates', path, stdout=io.StringIO())
+
+        self.assertEqual(ExchangeRate.objects.get(currency='EUR', day=date(2017, 2, 1)).rate, Decimal('4.5'))
+        self.assertEqual(rates.rate_cache.rate('EUR', date(2017, 2, 28)), Decimal('4.5'))
+        self.assertEqual(sorted(Expense.objects.values_list('base_price', flat=True)),
+                         [Decimal('42.00'), Decimal('45.00')])
+        response = self.client.get(reverse('report-json'))
+        self.assertEqual(response.json()['currency'], 'PLN')
+        self.assertEqual(response.json()['monthly_totals'], ['42.00', '45.00'])
+        self.assertEqual(response.json()['top_places'][0]['total'], '87.00')
+
+        with open(path, 'w') as f:
+            f.write('date,currency,rate\n2017-02-01,CHF,4.1\n')
+        with self.assertRaises(CommandError):
+            call_command('load_rates', path, stdout=io.StringIO())
+
+    def test_rates_drop_cached_data_of_currency_holders(self):
+        other = User.objects.create_user('anna', password='haslo12345')
+        Pocket.objects.create(name='Portfel', limit=0, funds=100, owner=other)
+        versions = data_version(self.user.pk), data_version(other.pk)
+        rates.store_rates([('EUR', date(2017, 3, 1), Decimal('4.4'))])
+        # jan's euro pocket has no expenses, but the forecast converts its funds at the new rate.
+        self.assertNotEqual(data_version(self.user.pk), versions[0])
+        self.assertEqual(data_version(other.pk), versions[1])
+
+    def test_import_reports_rows_without_rate(self):
+        result = TransactionImporter(self.user).run([
+            'date,name,amount,pocket,currency', '2017-01-05,Hotel,-10.00,Euro,', '2016-12-05,Hotel,-10.00,Euro,',
+            '2016-12-06,Faktura,50.00,,USD', '2016-12-07,Zakupy,-5.00,Portfel,'])
+        self.assertEqual((result.expenses, result.incomes), (2, 0))
+        self.assertEqual([error.split(':')[0] for error in result.errors], ['2', '3'])
+        self.assertEqual(expense_sum(self.user), Decimal('47.00'))
+
+    def test_currency_without_rates(self):
+        ExchangeRate.objects.filter(currency='USD').delete()
+        bump_version(rates.RATES_OWNER, 'rates')
+        rates.rate_cache.refresh(force=True)
+        response = self.client.post(reverse('pocket-add'), {'name': 'Dolary', 'currency': 'USD', 'limit': '0',
+                                                             'funds': '10'})
+        self.assertContains(response, 'Brak kursu USD')
+        self.assertFalse(Pocket.objects.filter(name='Dolary').exists())
+
+        Pocket.objects.create(name='Dolary', currency='USD', limit=0, funds=10, owner=self.user)
+        pockets = {pocket['name']: pocket for pocket in self.client.get(reverse('forecast-json')).json()['pockets']}
+        self.assertIsNone(pockets['Euro']['missing_rate'])
+        self.assertEqual((pockets['Dolary']['funds'], pockets['Dolary']['balance']), ('10.00', None))
+        self.assertIn('Brak kursu USD', pockets['Dolary']['missing_rate'])
+
+    def test_pocket_currency_is_kept_with_expenses(self):
+        self.add_expense(self.eur, date(2017, 1, 20), Decimal('10.00'))
+        response = self.client.post(reverse('pocket-update', args=[self.eur.pk]),
+                                    {'name': 'Euro', 'currency': 'USD', 'limit': '0', 'funds': '90'})
+        self.assertRedirects(response, reverse('pocket-list'))
+        pocket = Pocket.objects.get(pk=self.eur.pk)
+        self.assertEqual((pocket.currency, pocket.funds), ('EUR', Decimal('90.00')))
+        pocket.currency = 'USD'
+        with self.assertRaises(ValidationError):
+            pocket.full_clean()
+
+        response = self.client.post(reverse('pocket-delete', args=[self.eur.pk]), {'target': self.pln.pk})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.context['reassign_form'].errors)
@@ -1,6 +1,6 @@
 from django.conf.urls import url
 
-from . import views
+from . import api, views
 
 urlpatterns = [
     url(r'^$', views.MainView.as_view(), name='index'),
@@ -11,6 +11,7 @@ urlpatterns = [
     url(r'^list/reminders/$', views.ReminderListView.as_view(), name='reminder-list'),
     url(r'^list/incomes/$', views.IncomeListView.as_view(), name='income-list'),
     url(r'^list/incomessources/$', views.IncomeSourceListView.as_view(), name='income-source-list'),
+    url(r'^list/recurringexpenses/$', views.RecurringExpenseListView.as_view(), name='recurring-expense-list'),
 
     url(r'^add/expense/$', views.ExpenseCreateView.as_view(), name='expense-add'),
     url(r'^add/category/$', views.CategoryCreateView.as_view(), name='category-add'),
@@ -19,6 +20,25 @@ urlpatterns = [
     url(r'^add/reminder/$', views.ReminderCreateView.as_view(), name='reminder-add'),
     url(r'^add/income/$', views.IncomeCreateView.as_view(), name='income-add'),
     url(r'^add/incomesource/$', views.IncomeSourceCreateView.as_view(), name='income-source-add'),
+    url(r'^add/recurringexpense/$', views.RecurringExpenseCreateView.as_view(), name='recurring-expense-add'),
+    url(r'^import/$', views.ImportView.as_view(), name='import'),
+    url(r'^export/expenses\.(?P<file_format>csv|jsonl)$', views.ExpenseExportView.as_view(), name='expense-export'),
+    url(r'^export/incomes\.(?P<file_format>csv|jsonl)$', views.IncomeExportView.as_view(), name='income-export'),
+    url(r'^report/$', views.ReportView.as_view(), name='report'),
+    url(r'^report/json/$', views.ReportJSONView.as_view(), name='report-json'),
+    url(r'^forecast/$', views.ForecastView.as_view(), name='forecast'),
+    url(r'^forecast/json/$', views.ForecastJSONView.as_view(), name='forecast-json'),
+    url(r'^search/$', views.SearchView.as_view(), name='search'),
+    url(r'^search/json/$', views.SearchJSONView.as_view(), name='search-json'),
+    url(r'^choices/(?P<name>category|pocket|place|source)/json/$', views.ChoiceJSONView.as_view(),
+        name='choice-json'),
+    url(r'^tasks/(?P<task_id>\d+)/$', views.TaskView.as_view(), name='task'),
+    url(r'^tasks/(?P<task_id>\d+)/json/$', views.TaskJSONView.as_view(), name='task-json'),
+    url(r'^tasks/(?P<task_id>\d+)/download/$', views.TaskDownloadView.as_view(), name='task-download'),
+
+    url(r'^api/(?P<resource>\w+)/$', api.ApiListView.as_view(), name='api-list'),
+    url(r'^api/(?P<resource>\w+)/batch/$', api.ApiBatchView.as_view(), name='api-batch'),
+    url(r'^api/(?P<resource>\w+)/(?P<pk>\d+)/$', api.ApiDetailView.as_view(), name='api-detail'),
 
     url(r'^expense/(?P<pk>\d+)/$', views.ExpenseDetailView.as_view(), name='expense-detail'),
     url(r'^category/(?P<pk>\d+)/$', views.CategoryDetailView.as_view(), name='category-detail'),
@@ -35,6 +55,8 @@ urlpatterns = [
     url(r'^update/reminder/(?P<pk>\d+)/$', views.ReminderUpdateView.as_view(), name='reminder-update'),
     url(r'^update/income/(?P<pk>\d+)/$', views.IncomeUpdateView.as_view(), name='income-update'),
     url(r'^update/incomesource/(?P<pk>\d+)/$', views.IncomeSourceUpdateView.as_view(), name='income-source-update'),
+    url(r'^update/recurringexpense/(?P<pk>\d+)/$', views.RecurringExpenseUpdateView.as_view(),
+        name='recurring-expense-update'),
     url(r'^update/profile/(?P<pk>\d+)/$', views.edit_user, name='profile-update'),
     
     url(r'^delete/expense/(?P<pk>\d+)/$', views.ExpenseDeleteView.as_view(), name='expense-delete'),
@@ -44,4 +66,6 @@ urlpatterns = [
     url(r'^delete/reminder/(?P<pk>\d+)/$', views.ReminderDeleteView.as_view(), name='reminder-delete'),
     url(r'^delete/income/(?P<pk>\d+)/$', views.IncomeDeleteView.as_view(), name='income-delete'),
     url(r'^delete/incomesource/(?P<pk>\d+)/$', views.IncomeSourceDeleteView.as_view(), name='income-source-delete'),
+    url(r'^delete/recurringexpense/(?P<pk>\d+)/$', views.RecurringExpenseDeleteView.as_view(),
+        name='recurring-expense-delete'),
 ]
@@ -1,55 +1,113 @@
+from datetime import date
+from itertools import islice
+import json
 import logging
-logging.basicConfig(level=logging.DEBUG)
+import os
+import uuid
 
-from django.db.models import Sum
-from django.db import IntegrityError
-from django.contrib.auth import authenticate, login
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Prefetch
+from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.models import User
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.contrib.auth.forms import UserCreationForm
 from django.core.exceptions import PermissionDenied
 from django.forms.models import inlineformset_factory
+from django.http import FileResponse, Http404, HttpResponseBadRequest, JsonResponse, StreamingHttpResponse
 from django.shortcuts import render, HttpResponse, HttpResponseRedirect
-from django.views.generic.base import TemplateView
+from django.views.generic.base import TemplateView, View
 from django.views.generic.edit import CreateView, UpdateView, DeleteView, FormView
 from django.views.generic.list import ListView
 from django.views.generic.detail import DetailView
 from django.urls import reverse, reverse_lazy
 from django.utils.decorators import method_decorator
 
-from guardian.mixins import PermissionRequiredMixin
-from guardian.shortcuts import assign_perm
+from wydatki.models import (Expense, Category, Pocket, Place, Reminder, Income, IncomeSource, Profile, PocketSpend,
+                            LimitBreach, RecurringExpense, Job)
+from .aggregates import expense_totals, expense_sum, income_sum, expense_count, income_count
+from . import jobs, tasks
+from .cache import cached, peek
+from .exporters import iterate_in_chunks, WRITERS
+from .forecast import CashFlowForecast
+from .forms import (UserForm, ExpenseForm, IncomeForm, ImportForm, ExpenseFilterForm, RecurringExpenseForm,
+                    ForecastForm, ReassignForm, PocketForm, IncomeSourceForm, CHOICE_MODELS)
+from .filters import (name_prefix, FilteredListMixin, ExpenseListFilterForm, IncomeListFilterForm, CategoryListFilterForm,
+                      PocketListFilterForm, PlaceListFilterForm, ReminderListFilterForm, IncomeSourceListFilterForm,
+                      RecurringExpenseListFilterForm)
+from .importers import TransactionImporter
+from .mixins import OwnerPermissionRequiredMixin
+from .pagination import KeysetPaginationMixin
+from .recurrence import occurrences, pending_from
+from .reports import SpendingReport
+from .search import backend as search_backend, kind_of
+
+logger = logging.getLogger(__name__)
+
+
+class ChunkedDeleteMixin(object):
+    """Deletes the object through wydatki.deletion in a delete_object job run by the run_jobs worker: the rows
+    referencing it are moved to the object chosen in a ReassignForm with one UPDATE, or deleted in chunks
+    instead of by the collector."""
+    reassign_name = None
+
+    def get_reassign_form(self):
+        data = self.request.POST if self.request.method == 'POST' else None
+        return ReassignForm(self.object, self.reassign_name, data)
 
-from wydatki.models import Expense, Category, Pocket, Place, Reminder, Income, IncomeSource, Profile
-from .forms import UserForm, ExpenseForm, IncomeForm
+    def get_context_data(self, **kwargs):
+        context = super(ChunkedDeleteMixin, self).get_context_data(**kwargs)
+        context.setdefault('reassign_form', self.get_reassign_form())
+        return context
+
+    def delete(self, request, *args, **kwargs):
+        self.object = self.get_object()
+        form = self.get_reassign_form()
+        if not form.is_valid():
+            return self.render_to_response(self.get_context_data(reassign_form=form))
+        target = form.cleaned_data['target']
+        payload = {'model': self.object._meta.label_lower, 'pk': self.object.pk,
+                   'target': target.pk if target is not None else None}
+        with transaction.atomic():
+            queued = Job.objects.filter(kind='delete_object', owner=request.user, payload=json.dumps(payload),
+                                        status__in=(Job.PENDING, Job.RUNNING))
+            if not queued.exists():
+                jobs.enqueue('delete_object', owner=request.user, **payload)
+        return HttpResponseRedirect(self.get_success_url())
 
 
 class MainView(LoginRequiredMixin, TemplateView):
     template_name = "base_main.html"
     
 
-class ExpenseListView(LoginRequiredMixin, ListView):
+class ExpenseListView(LoginRequiredMixin, FilteredListMixin, KeysetPaginationMixin, ListView):
     model = Expense
     paginate_by = 10
+    filter_form_class = ExpenseListFilterForm
 
     def get_queryset(self):
-        return Expense.objects.filter(owner=self.request.user).order_by('exp_date')
-    
+        return self.filter_form.filter(
+            Expense.objects.filter(owner=self.request.user).select_related('category', 'place', 'pocket').only(
+                'name', 'exp_date', 'price', 'currency', 'category__name', 'place__name', 'pocket__name'))
+
+    def get_approximate_count(self):
+        # The running totals only cover the unfiltered list, filtered pages are shown without a count.
+        if not self.filter_form.is_filtered:
+            return expense_count(self.request.user)
 
     def get_context_data(self, **kwargs):
         context = super(ExpenseListView, self).get_context_data(**kwargs)
-        sum_value = self.get_queryset().aggregate(Sum('price'))
-        if sum_value['price__sum'] != None:
-            context['sum'] = float(sum_value['price__sum'])
+        sum_value = None if self.filter_form.is_filtered else expense_sum(self.request.user)
+        if sum_value != None:
+            context['sum'] = float(sum_value)
         return context
         
 
 
-class ExpenseDetailView(PermissionRequiredMixin, DetailView):
-    model = Expense
+class ExpenseDetailView(OwnerPermissionRequiredMixin, DetailView):
+    queryset = Expense.objects.select_related('category', 'pocket', 'place', 'reminder')
     permission_required = 'wydatki.view_expense'
-    return_403 = True
 
 
 class ExpenseCreateView(LoginRequiredMixin, CreateView):
@@ -71,48 +129,49 @@ class ExpenseCreateView(LoginRequiredMixin, CreateView):
         return super(ExpenseCreateView, self).form_valid(form)
 
 
-class ExpenseUpdateView(PermissionRequiredMixin, UpdateView):
+class ExpenseUpdateView(OwnerPermissionRequiredMixin, UpdateView):
     model = Expense
-    fields = ['name', 'exp_date', 'category', 'price', 'pocket', 'place'] # 'reminder'
+    form_class = ExpenseForm
     template_name_suffix='_update_form'
     permission_required = 'wydatki.change_expense'
-    return_403 = True
-    
+
+    def get_form_kwargs(self):
+        kwargs = super(ExpenseUpdateView, self).get_form_kwargs()
+        kwargs['user_id'] = self.request.user.pk
+        return kwargs
+
     def get_success_url(self):              # change to expense-detail
         return reverse('expense-list')
 
 
-class ExpenseDeleteView(PermissionRequiredMixin, DeleteView):
+class ExpenseDeleteView(OwnerPermissionRequiredMixin, DeleteView):
     model = Expense
     template_name='wydatki/confirm_delete.html'
     success_url = reverse_lazy('expense-list')
     permission_required = 'wydatki.delete_expense'
-    return_403 = True
 
 
-class CategoryListView(LoginRequiredMixin, ListView):
+class CategoryListView(LoginRequiredMixin, FilteredListMixin, ListView):
     model = Category
     paginate_by = 10
+    filter_form_class = CategoryListFilterForm
 
     def get_queryset(self):
-        return Category.objects.filter(owner=self.request.user).order_by('name')
+        return self.filter_form.filter(Category.objects.filter(owner=self.request.user))
 
     def get_context_data(self, **kwargs):
         context = super(CategoryListView, self).get_context_data(**kwargs)
-        context['amount'] = self.get_queryset().count()
-        category_expenses = {}
-        for cat in self.get_queryset():
-            cat_exp_sum = Expense.objects.filter(category=cat).aggregate(Sum('price'))
-            if cat_exp_sum['price__sum'] != None:
-                category_expenses[str(cat)] = cat_exp_sum['price__sum']
+        context['amount'] = context['paginator'].count
+        category_expenses = expense_totals(self.request.user, group_by='category')
+        for cat in context['object_list']:
+            cat.expense_sum = category_expenses.get(cat.pk)
         context['category_expenses'] = category_expenses
         return context
 
 
-class CategoryDetailView(PermissionRequiredMixin, DetailView):
+class CategoryDetailView(OwnerPermissionRequiredMixin, DetailView):
     model = Category
     permission_required = 'wydatki.view_category'
-    return_403 = True
 
 
 class CategoryCreateView(LoginRequiredMixin, CreateView):
@@ -131,48 +190,51 @@ class CategoryCreateView(LoginRequiredMixin, CreateView):
         return super(CategoryCreateView, self).form_valid(form)
 
 
-class CategoryUpdateView(PermissionRequiredMixin, UpdateView):
+class CategoryUpdateView(OwnerPermissionRequiredMixin, UpdateView):
     model = Category
     fields = ['name']
     success_url = reverse_lazy('category-list')
     template_name_suffix='_update_form'
     permission_required = 'wydatki.change_category'
-    return_403 = True
 
 
 
-class CategoryDeleteView(PermissionRequiredMixin, DeleteView):
+class CategoryDeleteView(OwnerPermissionRequiredMixin, ChunkedDeleteMixin, DeleteView):
     model = Category
     template_name='wydatki/confirm_delete.html'
     permission_required = 'wydatki.delete_category'
-    return_403 = True
+    reassign_name = 'category'
 
     def get_success_url(self):
         return reverse('category-list')
 
 
-class PocketListView(LoginRequiredMixin, ListView):
+class PocketListView(LoginRequiredMixin, FilteredListMixin, ListView):
     model = Pocket
     paginate_by = 10
+    filter_form_class = PocketListFilterForm
 
     def get_queryset(self):
-        return Pocket.objects.filter(owner=self.request.user).order_by('name')
+        month = date.today().replace(day=1)
+        return self.filter_form.filter(Pocket.objects.filter(owner=self.request.user)).prefetch_related(
+            Prefetch('spends', queryset=PocketSpend.objects.filter(month=month), to_attr='month_spends'),
+            Prefetch('breaches', queryset=LimitBreach.objects.filter(month=month).order_by('-created'),
+                     to_attr='month_breaches'))
 
     def get_context_data(self, **kwargs):
         context = super(PocketListView, self).get_context_data(**kwargs)
-        context['amount'] = self.get_queryset().count()
+        context['amount'] = context['paginator'].count
         return context
 
 
-class PocketDetailView(PermissionRequiredMixin, DetailView):
-    model = Pocket
+class PocketDetailView(OwnerPermissionRequiredMixin, DetailView):
+    queryset = Pocket.objects.select_related('owner')
     permission_required = 'wydatki.view_pocket'
-    return_403 = True
 
 
 class PocketCreateView(LoginRequiredMixin, CreateView):
     model = Pocket
-    fields = ['name', 'limit', 'funds']
+    form_class = PocketForm
     
     def get_success_url(self):
         return reverse('pocket-list')
@@ -186,42 +248,41 @@ class PocketCreateView(LoginRequiredMixin, CreateView):
         except IntegrityError as e:
             return HttpResponse('<h1>' + str(e.__cause__) +  '</h1>')
 
-class PocketUpdateView(PermissionRequiredMixin, UpdateView):
+class PocketUpdateView(OwnerPermissionRequiredMixin, UpdateView):
     model = Pocket
-    fields = ['name', 'limit', 'funds']
+    form_class = PocketForm
     template_name_suffix='_update_form'
     permission_required = 'wydatki.change_pocket'
-    return_403 = True
     
     def get_success_url(self):
         return reverse('pocket-list')
 
 
-class PocketDeleteView(PermissionRequiredMixin, DeleteView):
+class PocketDeleteView(OwnerPermissionRequiredMixin, ChunkedDeleteMixin, DeleteView):
     model = Pocket
     template_name='wydatki/confirm_delete.html'
     success_url = reverse_lazy('pocket-list')
     permission_required = 'wydatki.delete_pocket'
-    return_403 = True
+    reassign_name = 'pocket'
 
 
-class PlaceListView(LoginRequiredMixin, ListView):
+class PlaceListView(LoginRequiredMixin, FilteredListMixin, ListView):
     model = Place
     paginate_by = 10
+    filter_form_class = PlaceListFilterForm
 
     def get_queryset(self):
-        return Place.objects.filter(owner=self.request.user).order_by('name')
+        return self.filter_form.filter(Place.objects.filter(owner=self.request.user))
 
     def get_context_data(self, **kwargs):
         context = super(PlaceListView, self).get_context_data(**kwargs)
-        context['amount'] = self.get_queryset().count()
+        context['amount'] = context['paginator'].count
         return context
 
 
-class PlaceDetailView(PermissionRequiredMixin, DetailView):
+class PlaceDetailView(OwnerPermissionRequiredMixin, DetailView):
     model = Place
     permission_required = 'wydatki.view_place'
-    return_403 = True
 
 
 class PlaceCreateView(LoginRequiredMixin, CreateView):
@@ -238,42 +299,41 @@ class PlaceCreateView(LoginRequiredMixin, CreateView):
         return super(PlaceCreateView, self).form_valid(form)
 
 
-class PlaceUpdateView(PermissionRequiredMixin, UpdateView):
+class PlaceUpdateView(OwnerPermissionRequiredMixin, UpdateView):
     model = Place
     fields = ['name']
     template_name_suffix='_update_form'
     permission_required = 'wydatki.change_place'
-    return_403 = True
 
     def get_success_url(self):
         return reverse('place-list')
 
 
-class PlaceDeleteView(PermissionRequiredMixin, DeleteView):
+class PlaceDeleteView(OwnerPermissionRequiredMixin, ChunkedDeleteMixin, DeleteView):
     model = Place
     template_name='wydatki/confirm_delete.html'
     success_url = reverse_lazy('place-list')
     permission_required = 'wydatki.delete_place'
-    return_403 = True
+    reassign_name = 'place'
 
 
-class ReminderListView(LoginRequiredMixin, ListView):
+class ReminderListView(LoginRequiredMixin, FilteredListMixin, ListView):
     model = Reminder
     paginate_by = 10
+    filter_form_class = ReminderListFilterForm
 
     def get_queryset(self):
-        return Reminder.objects.filter(owner=self.request.user).order_by('-remind_date')
+        return self.filter_form.filter(Reminder.objects.filter(owner=self.request.user))
 
     def get_context_data(self, **kwargs):
         context = super(ReminderListView, self).get_context_data(**kwargs)
-        context['amount'] = self.get_queryset().count()
+        context['amount'] = context['paginator'].count
         return context
 
 
-class ReminderDetailView(PermissionRequiredMixin, DetailView):
+class ReminderDetailView(OwnerPermissionRequiredMixin, DetailView):
     model = Reminder
     permission_required = 'wydatki.view_reminder'
-    return_403 = True
 
 
 class ReminderCreateView(LoginRequiredMixin, CreateView):
@@ -290,44 +350,52 @@ class ReminderCreateView(LoginRequiredMixin, CreateView):
         return super(ReminderCreateView, self).form_valid(form)
 
 
-class ReminderUpdateView(PermissionRequiredMixin, UpdateView):
+class ReminderUpdateView(OwnerPermissionRequiredMixin, UpdateView):
     model = Reminder
     fields = ['name', 'remind_date', 'as_before', 'message', 'importance']
     template_name_suffix='_update_form'
     permission_required = 'wydatki.change_reminder'
-    return_403 = True
 
     def get_success_url(self):
         return reverse('reminder-list')
 
+    def form_valid(self, form):
+        if 'remind_date' in form.changed_data or 'as_before' in form.changed_data:
+            form.instance.status, form.instance.sent_at = Reminder.PENDING, None
+        return super(ReminderUpdateView, self).form_valid(form)
+
 
-class ReminderDeleteView(PermissionRequiredMixin, DeleteView):
+class ReminderDeleteView(OwnerPermissionRequiredMixin, DeleteView):
     model = Reminder
     template_name='wydatki/confirm_delete.html'
     success_url = reverse_lazy('reminder-list')
     permission_required = 'wydatki.delete_reminder'
-    return_403 = True
 
 
-class IncomeListView(LoginRequiredMixin, ListView):
+class IncomeListView(LoginRequiredMixin, FilteredListMixin, KeysetPaginationMixin, ListView):
     model = Income
     paginate_by = 10
+    filter_form_class = IncomeListFilterForm
 
     def get_queryset(self):
-        return Income.objects.filter(owner=self.request.user).order_by('source')
+        return self.filter_form.filter(Income.objects.filter(owner=self.request.user).select_related('source').only(
+            'name', 'amount', 'currency', 'income_date', 'source__name', 'source__type_of_income'))
+
+    def get_approximate_count(self):
+        if not self.filter_form.is_filtered:
+            return income_count(self.request.user)
 
     def get_context_data(self, **kwargs):
         context = super(IncomeListView, self).get_context_data(**kwargs)
-        sum_value = self.get_queryset().aggregate(Sum('amount'))
-        if sum_value['amount__sum'] != None:
-            context['sum'] = float(sum_value['amount__sum'])
+        sum_value = None if self.filter_form.is_filtered else income_sum(self.request.user)
+        if sum_value != None:
+            context['sum'] = float(sum_value)
         return context
 
 
-class IncomeDetailView(PermissionRequiredMixin, DetailView):
-    model = Income
+class IncomeDetailView(OwnerPermissionRequiredMixin, DetailView):
+    queryset = Income.objects.select_related('source')
     permission_required = 'wydatki.view_income'
-    return_403 = True
 
 
 class IncomeCreateView(LoginRequiredMixin, CreateView):
@@ -340,7 +408,7 @@ class IncomeCreateView(LoginRequiredMixin, CreateView):
     def get_form_kwargs(self):
         kwargs = super(IncomeCreateView, self).get_form_kwargs()
         kwargs['user_id'] = self.request.user.pk
-        logging.debug(kwargs)
+        logger.debug(kwargs)
         return kwargs
 
     def form_valid(self, form):
@@ -350,48 +418,56 @@ class IncomeCreateView(LoginRequiredMixin, CreateView):
         return super(IncomeCreateView, self).form_valid(form)
 
 
-class IncomeUpdateView(PermissionRequiredMixin, UpdateView):
+class IncomeUpdateView(OwnerPermissionRequiredMixin, UpdateView):
     model = Income
-    fields = ['name', 'source', 'amount', 'income_date']
+    form_class = IncomeForm
     template_name_suffix='_update_form'
     permission_required = 'wydatki.change_income'
-    return_403 = True
+
+    def get_form_kwargs(self):
+        kwargs = super(IncomeUpdateView, self).get_form_kwargs()
+        kwargs['user_id'] = self.request.user.pk
+        return kwargs
 
     def get_success_url(self):
         return reverse('income-list')
 
 
-class IncomeDeleteView(PermissionRequiredMixin, DeleteView):
+class IncomeDeleteView(OwnerPermissionRequiredMixin, DeleteView):
     model = Income
     template_name='wydatki/confirm_delete.html'
     success_url = reverse_lazy('income-list')
     permission_required = 'wydatki.delete_income'
-    return_403 = True
 
 
 
-class IncomeSourceListView(LoginRequiredMixin, ListView):
+class IncomeSourceListView(LoginRequiredMixin, FilteredListMixin, ListView):
     model = IncomeSource
     paginate_by = 10
+    filter_form_class = IncomeSourceListFilterForm
 
     def get_queryset(self):
-        return IncomeSource.objects.filter(owner=self.request.user).order_by('name')
+        return self.filter_form.filter(IncomeSource.objects.filter(owner=self.request.user))
 
     def get_context_data(self, **kwargs):
         context = super(IncomeSourceListView, self).get_context_data(**kwargs)
-        context['amount'] = self.get_queryset().count()
+        context['amount'] = context['paginator'].count
         return context
 
 
-class IncomeSourceDetailView(PermissionRequiredMixin, DetailView):
+class IncomeSourceDetailView(OwnerPermissionRequiredMixin, DetailView):
     model = IncomeSource
     permission_required = 'wydatki.view_incomesource'
-    return_403 = True
+
+    def get_context_data(self, **kwargs):
+        context = super(IncomeSourceDetailView, self).get_context_data(**kwargs)
+        context['upcoming'] = list(islice(occurrences(self.object, pending_from(self.object, date.today())), 5))
+        return context
 
 
 class IncomeSourceCreateView(LoginRequiredMixin, CreateView):
     model = IncomeSource
-    fields = ['name', 'type_of_income', 'permanent']
+    form_class = IncomeSourceForm
 
     def get_success_url(self):
         return reverse('income-source-list')
@@ -403,23 +479,361 @@ class IncomeSourceCreateView(LoginRequiredMixin, CreateView):
         return super(IncomeSourceCreateView, self).form_valid(form)
 
 
-class IncomeSourceUpdateView(PermissionRequiredMixin, UpdateView):
+class IncomeSourceUpdateView(OwnerPermissionRequiredMixin, UpdateView):
     model = IncomeSource
-    fields = ['name', 'type_of_income', 'permanent']
+    form_class = IncomeSourceForm
     template_name_suffix='_update_form'
     permission_required = 'wydatki.change_incomesource'
-    return_403 = True
 
     def get_success_url(self):
         return reverse('income-source-list')
 
 
-class IncomeSourceDeleteView(PermissionRequiredMixin, DeleteView):
+class IncomeSourceDeleteView(OwnerPermissionRequiredMixin, ChunkedDeleteMixin, DeleteView):
     model = IncomeSource
     template_name='wydatki/confirm_delete.html'
     success_url = reverse_lazy('income-source-list')
     permission_required = 'wydatki.delete_incomesource'
-    return_403 = True
+    reassign_name = 'source'
+
+
+class RecurringExpenseListView(LoginRequiredMixin, FilteredListMixin, ListView):
+    model = RecurringExpense
+    paginate_by = 10
+    filter_form_class = RecurringExpenseListFilterForm
+
+    def get_queryset(self):
+        return self.filter_form.filter(RecurringExpense.objects.filter(owner=self.request.user).select_related('pocket'))
+
+    def get_context_data(self, **kwargs):
+        context = super(RecurringExpenseListView, self).get_context_data(**kwargs)
+        context['amount'] = context['paginator'].count
+        today = date.today()
+        for rule in context['object_list']:
+            rule.next_date = next(occurrences(rule, pending_from(rule, today)), None)
+        return context
+
+
+class RecurringExpenseCreateView(LoginRequiredMixin, CreateView):
+    form_class = RecurringExpenseForm
+    template_name = 'wydatki/recurringexpense_form.html'
+
+    def get_form_kwargs(self):
+        kwargs = super(RecurringExpenseCreateView, self).get_form_kwargs()
+        kwargs['user_id'] = self.request.user.pk
+        return kwargs
+
+    def get_success_url(self):
+        return reverse('recurring-expense-list')
+
+    def form_valid(self, form):
+        self.object = form.save(commit=False)
+        self.object.owner = self.request.user
+        self.object.save()
+        return super(RecurringExpenseCreateView, self).form_valid(form)
+
+
+class RecurringExpenseUpdateView(OwnerPermissionRequiredMixin, UpdateView):
+    model = RecurringExpense
+    form_class = RecurringExpenseForm
+    template_name_suffix = '_update_form'
+    permission_required = 'wydatki.change_recurringexpense'
+
+    def get_form_kwargs(self):
+        kwargs = super(RecurringExpenseUpdateView, self).get_form_kwargs()
+        kwargs['user_id'] = self.request.user.pk
+        return kwargs
+
+    def get_success_url(self):
+        return reverse('recurring-expense-list')
+
+
+class RecurringExpenseDeleteView(OwnerPermissionRequiredMixin, DeleteView):
+    model = RecurringExpense
+    template_name = 'wydatki/confirm_delete.html'
+    success_url = reverse_lazy('recurring-expense-list')
+    permission_required = 'wydatki.delete_recurringexpense'
+
+
+class TaskMixin(object):
+    """Runs slow work on wydatki.tasks.pool and waits up to WYDATKI_TASK_WAIT seconds for it, longer tasks
+    continue in the background while the browser polls the task page. Must come after LoginRequiredMixin.
+    """
+
+    def dispatch(self, request, *args, **kwargs):
+        try:
+            return super(TaskMixin, self).dispatch(request, *args, **kwargs)
+        except tasks.QueueFull:
+            response = HttpResponse('Serwer jest zajęty, spróbuj ponownie za chwilę.', status=503)
+            response['Retry-After'] = '10'
+            return response
+        except tasks.TaskLost:
+            return HttpResponse('Zadanie zostało przerwane, spróbuj ponownie.', status=503)
+
+    def run_task(self, kind, func, *args):
+        task_id = tasks.pool.submit(self.request.user, kind, func, *args)
+        task = tasks.pool.wait(task_id, settings.WYDATKI_TASK_WAIT)
+        if task is None:
+            raise tasks.TaskLost(task_id)
+        return task
+
+    def task_response(self, task):
+        if task['status'] == 'done' and task['result'].get('url'):
+            return HttpResponseRedirect(task['result']['url'])
+        return HttpResponseRedirect(reverse('task', args=[task['id']]))
+
+
+class ImportView(LoginRequiredMixin, TaskMixin, FormView):
+    form_class = ImportForm
+    template_name = 'wydatki/import_form.html'
+
+    def form_valid(self, form):
+        # The upload is gone when the request ends, the task reads a copy.
+        os.makedirs(settings.WYDATKI_TASK_DIR, exist_ok=True)
+        path = tasks.result_path('%s.import' % uuid.uuid4().hex)
+        with open(path, 'wb') as f:
+            for chunk in form.cleaned_data['file'].chunks():
+                f.write(chunk)
+        task = self.run_task('import', self.import_file, path, form.cleaned_data['file_format'],
+                             form.cleaned_data['encoding'])
+        if task['status'] == 'done':
+            return render(self.request, 'wydatki/import_result.html', {'result': task['result']['import']})
+        return self.task_response(task)
+
+    def import_file(self, progress, path, file_format, encoding):
+        def lines(f):
+            for number, line in enumerate(f, 1):
+                if number % 1000 == 0:
+                    progress(number)
+                yield line
+
+        try:
+            with open(path, encoding=encoding, newline='') as f:
+                return {'import': TransactionImporter(self.request.user).run(lines(f), file_format).as_dict()}
+        finally:
+            os.remove(path)
+
+
+class ExportView(LoginRequiredMixin, TaskMixin, View):
+    """Streams the export, or with ?background=1 writes it to a file in a task and offers it for download."""
+    model = None
+    date_field = None
+    filter_fields = ()
+    columns = ()
+    header = ()
+    chunk_size = 2000
+
+    def get_queryset(self, filters):
+        queryset = self.model.objects.filter(owner=self.request.user)
+        if filters['date_from']:
+            queryset = queryset.filter(**{self.date_field + '__gte': filters['date_from']})
+        if filters['date_to']:
+            queryset = queryset.filter(**{self.date_field + '__lte': filters['date_to']})
+        for field in self.filter_fields:
+            if filters[field] is not None:
+                queryset = queryset.filter(**{field: filters[field]})
+        return queryset.values('id', *self.columns)
+
+    def get_filename(self, file_format):
+        return '%s.%s' % (self.model._meta.verbose_name_plural.replace(' ', ''), file_format)
+
+    def get(self, request, file_format):
+        form = ExpenseFilterForm(request.GET)
+        if not form.is_valid():
+            return HttpResponseBadRequest(form.errors.as_text())
+        if request.GET.get('background'):
+            return self.task_response(self.run_task('export', self.write_file, file_format, form.cleaned_data))
+        rows = iterate_in_chunks(self.get_queryset(form.cleaned_data), (self.date_field, 'id'), self.chunk_size)
+        lines, content_type = WRITERS[file_format]
+        response = StreamingHttpResponse(lines(rows, self.columns, self.header), content_type=content_type)
+        response['Content-Disposition'] = 'attachment; filename="%s"' % self.get_filename(file_format)
+        return response
+
+    def write_file(self, progress, file_format, filters):
+        tasks.remove_expired()
+        os.makedirs(settings.WYDATKI_TASK_DIR, exist_ok=True)
+        queryset = self.get_queryset(filters)
+        total = queryset.count()
+
+        def rows():
+            for number, row in enumerate(iterate_in_chunks(queryset, (self.date_field, 'id'), self.chunk_size), 1):
+                if number % self.chunk_size == 0:
+                    progress(number, total)
+                yield row
+
+        name = '%s.%s' % (progress.task_id, file_format)
+        lines, content_type = WRITERS[file_format]
+        with open(tasks.result_path(name), 'w', encoding='utf-8', newline='') as f:
+            f.writelines(lines(rows(), self.columns, self.header))
+        return {'file': name, 'filename': self.get_filename(file_format), 'content_type': content_type,
+                'url': reverse('task-download', args=[progress.task_id])}
+
+
+class ExpenseExportView(ExportView):
+    model = Expense
+    date_field = 'exp_date'
+    filter_fields = ('category', 'pocket')
+    columns = ('exp_date', 'name', 'price', 'currency', 'category__name', 'place__name', 'pocket__name')
+    header = ('date', 'name', 'price', 'currency', 'category', 'place', 'pocket')
+
+
+class IncomeExportView(ExportView):
+    model = Income
+    date_field = 'income_date'
+    columns = ('income_date', 'name', 'amount', 'currency', 'source__name')
+    header = ('date', 'name', 'amount', 'currency', 'source')
+
+
+class ReportView(LoginRequiredMixin, TaskMixin, TemplateView):
+    template_name = 'wydatki/report.html'
+
+    def get(self, request, *args, **kwargs):
+        form = ExpenseFilterForm(request.GET)
+        if not form.is_valid():
+            return HttpResponseBadRequest(form.errors.as_text())
+        filters = form.cleaned_data
+        name = 'report:%r' % sorted(filters.items())
+        self.report = peek(request.user.pk, name)
+        if self.report is None:
+            task = self.run_task('report', self.build, name, filters)
+            if task['status'] != 'done':
+                return self.task_response(task)
+            self.report = cached(request.user.pk, name, SpendingReport(request.user, **filters).build)
+        return super(ReportView, self).get(request, *args, **kwargs)
+
+    def build(self, progress, name, filters):
+        cached(self.request.user.pk, name, SpendingReport(self.request.user, **filters).build)
+        return {'url': self.request.get_full_path()}
+
+    def get_context_data(self, **kwargs):
+        context = super(ReportView, self).get_context_data(**kwargs)
+        context['report'] = self.report
+        return context
+
+
+class ReportJSONView(ReportView):
+
+    def render_to_response(self, context, **response_kwargs):
+        return JsonResponse(context['report'])
+
+    def task_response(self, task):
+        return JsonResponse({'task': task['id'], 'status': task['status'],
+                             'url': reverse('task-json', args=[task['id']])}, status=202)
+
+
+class ForecastView(LoginRequiredMixin, TemplateView):
+    template_name = 'wydatki/forecast.html'
+
+    def get(self, request, *args, **kwargs):
+        form = ForecastForm(request.GET)
+        if not form.is_valid():
+            return HttpResponseBadRequest(form.errors.as_text())
+        months, today = form.cleaned_data['months'] or 12, date.today()
+        # The forecast starts next month, so the key changes with the month as well as with the data.
+        self.forecast = cached(request.user.pk, 'forecast:%s:%d' % (today.strftime('%Y-%m'), months),
+                               CashFlowForecast(request.user, months, today=today).build)
+        return super(ForecastView, self).get(request, *args, **kwargs)
+
+    def get_context_data(self, **kwargs):
+        context = super(ForecastView, self).get_context_data(**kwargs)
+        context['forecast'] = self.forecast
+        return context
+
+
+class ForecastJSONView(ForecastView):
+
+    def render_to_response(self, context, **response_kwargs):
+        return JsonResponse(context['forecast'])
+
+
+class TaskView(LoginRequiredMixin, TemplateView):
+    """Progress of a background task, the page reloads itself until the task finishes."""
+    template_name = 'wydatki/task.html'
+
+    def get(self, request, *args, **kwargs):
+        self.task = tasks.get(kwargs['task_id'], request.user)
+        if self.task is None:
+            raise Http404
+        if self.task['status'] == 'done':
+            if self.task['kind'] == 'import':
+                return render(request, 'wydatki/import_result.html', {'result': self.task['result']['import']})
+            return HttpResponseRedirect(self.task['result']['url'])
+        return super(TaskView, self).get(request, *args, **kwargs)
+
+    def get_context_data(self, **kwargs):
+        context = super(TaskView, self).get_context_data(**kwargs)
+        context['task'] = self.task
+        if self.task['total']:
+            context['percent'] = 100 * self.task['done'] // self.task['total']
+        return context
+
+
+class TaskJSONView(LoginRequiredMixin, View):
+
+    def get(self, request, task_id):
+        task = tasks.get(task_id, request.user)
+        if task is None:
+            raise Http404
+        data = {key: task[key] for key in ('id', 'kind', 'status', 'done', 'total', 'error')}
+        if task['status'] == 'done' and task['result'].get('url'):
+            data['url'] = task['result']['url']
+        return JsonResponse(data)
+
+
+class TaskDownloadView(LoginRequiredMixin, View):
+
+    def get(self, request, task_id):
+        task = tasks.get(task_id, request.user)
+        if task is None or task['status'] != 'done' or 'file' not in task['result']:
+            raise Http404
+        try:
+            f = open(tasks.result_path(task['result']['file']), 'rb')
+        except FileNotFoundError:
+            raise Http404
+        response = FileResponse(f, content_type=task['result']['content_type'])
+        response['Content-Disposition'] = 'attachment; filename="%s"' % task['result']['filename']
+        return response
+
+
+class SearchView(LoginRequiredMixin, TemplateView):
+    template_name = 'wydatki/search.html'
+    limit = 20
+
+    def get_results(self):
+        return search_backend.search(self.request.user, self.request.GET.get('q', ''), self.limit)
+
+    def get_context_data(self, **kwargs):
+        context = super(SearchView, self).get_context_data(**kwargs)
+        results = self.get_results()
+        expenses = Expense.objects.select_related('category', 'place').in_bulk([pk for pk, name in results['expense']])
+        context.update(query=self.request.GET.get('q', ''), results=results,
+                       expenses=[expenses[pk] for pk, name in results['expense'] if pk in expenses])
+        return context
+
+
+class SearchJSONView(SearchView):
+    """Typeahead suggestions, ids and names straight from the index."""
+    limit = 5
+
+    def get(self, request, *args, **kwargs):
+        return JsonResponse({kind: [{'id': pk, 'name': name} for pk, name in rows]
+                             for kind, rows in self.get_results().items()})
+
+
+class ChoiceJSONView(LoginRequiredMixin, View):
+    """Completions for the typeahead widget of an OwnerChoiceField, searched by name."""
+    limit = 20
+
+    def get(self, request, name):
+        model, query = CHOICE_MODELS[name], request.GET.get('q', '').strip()
+        if not query:
+            return JsonResponse({'results': []})
+        if kind_of(model) is not None:
+            rows = search_backend.search(request.user, query, self.limit)[kind_of(model)]
+        else:
+            objects = name_prefix(model.objects.filter(owner=request.user), query).order_by('name')[:self.limit]
+            rows = [(obj.pk, str(obj)) for obj in objects]
+        return JsonResponse({'results': [{'id': pk, 'name': name} for pk, name in rows]})
 
 
 class UserDetailView(DetailView):
@@ -441,11 +855,28 @@ class UserCreateView(FormView):
         return super().form_valid(form)
 
 
-class ProfileDeleteView(DeleteView):
+class ProfileDeleteView(LoginRequiredMixin, DeleteView):
+    """Deactivates the account and leaves deleting its data to the run_jobs worker."""
     model = User
     template_name = 'wydatki/confirm_delete.html'
     success_url = reverse_lazy('login')
 
+    def get_object(self, queryset=None):
+        obj = super(ProfileDeleteView, self).get_object(queryset)
+        if obj != self.request.user:
+            raise PermissionDenied
+        return obj
+
+    def delete(self, request, *args, **kwargs):
+        user = self.get_object()
+        with transaction.atomic():
+            User.objects.filter(pk=user.pk).update(is_active=False)
+            queued = Job.objects.filter(kind='delete_account', owner=user, status__in=(Job.PENDING, Job.RUNNING))
+            if not queued.exists():
+                jobs.enqueue('delete_account', owner=user)
+        logout(request)
+        return HttpResponseRedirect(self.success_url)
+
 
 @login_required()
 def edit_user(request, pk):